@@ -1,15 +1,206 @@
-from timeit import Timer
+"""
+Benchmark suite for the simulation models and the data layer
+
+Every benchmark is timed after a warmup run, repeated to get percentiles, and run once more under tracemalloc
+for its peak memory. Results can be saved as a JSON baseline and later runs compared against it.
+
+Usage:
+    python benchmarking.py run                          # default sizes, print results
+    python benchmarking.py run --full --save base.json  # include 10k-scenario sweeps, save a baseline
+    python benchmarking.py compare base.json            # run again and flag regressions against base.json
+    python benchmarking.py compare base.json --results new.json --threshold 0.2
+    python benchmarking.py list
+    python benchmarking.py imports                      # check housing_sim's import time budget
+    python benchmarking.py service --requests 5000      # load test the scenario service on localhost
+    python benchmarking.py precision                    # drift and memory of single precision results
+"""
+import argparse
+import asyncio
+import datetime as dt
+import fnmatch
+import json
+import os
+import pkgutil
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
 import numpy as np
+import pandas as pd
+
+import housing_sim.cache
+import housing_sim.precision
 import housing_sim.utils
+from housing_sim.housing.apartment import Apartment
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.mortgage import FixedRateMortgageBatch
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage, DownPayableFixedRateMortgage
+
+START_DATE = dt.date(2019, 1, 1)
+LOAN_PERIOD_MONTHS = 360
+PURCHASE_PRICE = 300000
+DOWN_PAYMENT_PCT = 0.2
+
+DEFAULT_WARMUP = 1
+DEFAULT_REPEATS = 7
+MIN_REPEATS = 3
+DEFAULT_MAX_SECONDS = 10.0  # stop repeating a case after this long, once it has MIN_REPEATS samples
+DEFAULT_THRESHOLD = 0.10  # a case regresses if its median is this much slower than the baseline
+DEFAULT_METRIC = 'median'
+
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    """
+    A named piece of code timed at several sizes
+
+    Attributes:
+        name (str): e.g. 'mortgage.get_data'
+        setup (callable): setup(size) -> zero-argument callable that runs the code being timed once
+        sizes (tuple of ints): sizes run by default
+        full_sizes (tuple of ints): extra, slower sizes only run with --full
+        quick_sizes (tuple of ints): sizes run with --quick
+    """
+
+    def __init__(self, name, setup, sizes, full_sizes=(), quick_sizes=None):
+        self.name = name
+        self.setup = setup
+        self.sizes = tuple(sizes)
+        self.full_sizes = tuple(full_sizes)
+        self.quick_sizes = tuple(quick_sizes) if quick_sizes is not None else self.sizes[:1]
+
+    def sizes_for(self, mode):
+        if mode == 'quick':
+            return self.quick_sizes
+        if mode == 'full':
+            return self.sizes + self.full_sizes
+        return self.sizes
+
+
+def benchmark(name, sizes, full_sizes=(), quick_sizes=None):
+    """
+    Register a setup function as a benchmark, see Benchmark
+    """
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, setup, sizes, full_sizes, quick_sizes))
+        return setup
+    return register
+
+
+def case_name(name, size):
+    return "{}[{}]".format(name, size)
+
+
+def measure(func, warmup=DEFAULT_WARMUP, repeats=DEFAULT_REPEATS, max_seconds=DEFAULT_MAX_SECONDS):
+    """
+    Time {func}
+
+    Args:
+        func (callable): zero-argument callable
+        warmup (int): untimed calls first, to fill caches and trigger lazy imports
+        repeats (int): timed calls
+        max_seconds (float): stop early once this much time has been spent and at least MIN_REPEATS calls are timed
+
+    Returns: dict of timing percentiles in seconds and peak traced memory in bytes
+    """
+    for _ in range(warmup):
+        func()
+
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeats and (len(times) < MIN_REPEATS or time.perf_counter() - started < max_seconds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Tracing slows everything down, so peak memory gets its own untimed call
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times = np.array(times)
+    return {
+        'repeats': len(times),
+        'min': float(times.min()),
+        'median': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'max': float(times.max()),
+        'mean': float(times.mean()),
+        'stdev': float(times.std()),
+        'peak_bytes': int(peak_bytes),
+    }
+
+
+# Benchmarks
+#
+# Model benchmarks run with the shared schedule cache turned off (see run), and build new model objects on every
+# call, so they time the computation rather than a cache lookup.
+
+def _rates(size):
+    return np.linspace(0.03, 0.06, size)
+
+
+@benchmark('mortgage.get_data', sizes=(1, 100, 1000), full_sizes=(10000,))
+def _mortgage_get_data(size):
+    rates = _rates(size)
+
+    def run():
+        for rate in rates:
+            SimpleFixedRateMortgage(rate, PURCHASE_PRICE, DOWN_PAYMENT_PCT, START_DATE, LOAN_PERIOD_MONTHS).get_data()
+    return run
+
+
+@benchmark('mortgage_batch.get_data', sizes=(1, 100, 10000))
+def _mortgage_batch_get_data(size):
+    rates = _rates(size)
+
+    def run():
+        FixedRateMortgageBatch(rates, PURCHASE_PRICE, DOWN_PAYMENT_PCT, LOAN_PERIOD_MONTHS).get_data()
+    return run
+
 
-def stopwatch(f, trials):
-    def wrapper(*args, **kwargs):
-        t = Timer(lambda : f(*args, **kwargs))
-        return t.timeit(number=trials)
-    return wrapper
+@benchmark('down_payable._amortize', sizes=(1, 100, 1000), full_sizes=(10000,))
+def _down_payable_amortize(size):
+    mortgages = [
+        DownPayableFixedRateMortgage(rate, PURCHASE_PRICE, DOWN_PAYMENT_PCT, START_DATE, LOAN_PERIOD_MONTHS, extra_payment=200)
+        for rate in _rates(size)
+    ]
 
-number_rows = 360
-data_row_format = {
+    def run():
+        for mortgage in mortgages:
+            mortgage._amortize()
+    return run
+
+
+@benchmark('simple_home.get_data', sizes=(1, 100), full_sizes=(1000, 10000))
+def _simple_home_get_data(size):
+    rates = _rates(size)
+
+    def run():
+        for rate in rates:
+            mortgage = SimpleFixedRateMortgage(rate, PURCHASE_PRICE, DOWN_PAYMENT_PCT, START_DATE, LOAN_PERIOD_MONTHS)
+            SimpleHome(PURCHASE_PRICE, mortgage).get_data()
+    return run
+
+
+@benchmark('apartment.get_data', sizes=(1, 100, 1000), full_sizes=(10000,))
+def _apartment_get_data(size):
+    rents = np.linspace(1000, 3000, size)
+
+    def run():
+        for rent in rents:
+            Apartment(rent, START_DATE, LOAN_PERIOD_MONTHS).get_data()
+    return run
+
+
+BLANK_ROW_FORMAT = {
     'date': np.datetime64('nat'),
     'month': 0,
     'principal': np.nan,
@@ -19,12 +210,489 @@ data_row_format = {
     'balance': np.nan
 }
 
-# Test blank row allocations
-trials = 1000
 
-print('START: TRIALS={}'.format(trials))
-print('================================')
-print('Timed blank df by rows')
-timed_blank_df_by_rows = stopwatch(housing_sim.utils.allocate_empty_df, trials)(number_rows, data_row_format)
-print(timed_blank_df_by_rows)
+@benchmark('allocate_empty_df', sizes=(12, 360, 10000), quick_sizes=(360,))
+def _allocate_empty_df(size):
+    return lambda: housing_sim.utils.allocate_empty_df(size, BLANK_ROW_FORMAT)
+
+
+@benchmark('blank_monthly_df', sizes=(12, 360, 10000), quick_sizes=(360,))
+def _blank_monthly_df(size):
+    return lambda: housing_sim.utils.blank_monthly_df(START_DATE, size, BLANK_ROW_FORMAT)
+
+
+@benchmark('fit_to_array', sizes=(12, 360, 10000), quick_sizes=(360,))
+def _fit_to_array(size):
+    from utils import fit_to_array
+    schedule = [100, 0, 0, 250]
+    return lambda: fit_to_array(schedule, size)
+
+
+# Quandl benchmarks never touch the network: a synthetic fetch stands in for quandl.get, so 'uncached' times the
+# store's write path plus whatever overhead cached_quandl_get adds, and 'cached' the read path.
+
+QUANDL_SERIES_MONTHS = 240
+
+
+def _synthetic_fetch(code, *args, start_date=None, end_date=None, **kwargs):
+    dates = pd.date_range('2000-01-31', periods=QUANDL_SERIES_MONTHS, freq='ME', name='Date')
+    frame = pd.DataFrame({'Value': np.linspace(100000, 300000, QUANDL_SERIES_MONTHS)}, index=dates)
+    if start_date is not None:
+        frame = frame[frame.index >= pd.Timestamp(start_date)]
+    if end_date is not None:
+        frame = frame[frame.index <= pd.Timestamp(end_date)]
+    return frame
+
+
+def _quandl_codes(size):
+    import utils
+    return [utils.get_quandl_code('Z', 10000 + i, 'ZHVISF') for i in range(size)]
+
+
+# Series stores opened by the benchmarks and the directories holding them, closed and removed when the suite finishes
+_temporary_stores = []
+_temporary_directories = []
+
+
+def _temporary_directory():
+    """
+    A new directory that is removed when the suite finishes
+    """
+    directory = tempfile.TemporaryDirectory()
+    _temporary_directories.append(directory)
+    return directory.name
+
+
+def _set_series_store(store):
+    """
+    utils.set_series_store, if utils can be imported
+
+    Returns: the store that was replaced
+    """
+    try:
+        import utils
+    except ImportError:
+        return None
+    return utils.set_series_store(store)
+
+
+@benchmark('cached_quandl_get.uncached', sizes=(1, 10, 100))
+def _cached_quandl_get_uncached(size):
+    import data_store
+    import utils
+    codes = _quandl_codes(size)
+    directory = _temporary_directory()
+    runs = iter(range(sys.maxsize))
+
+    def run():
+        # A new, empty store every call, so every request is fetched and written
+        path = os.path.join(directory, '{}.sqlite'.format(next(runs)))
+        store = data_store.SeriesStore(path)
+        utils.set_series_store(store)
+        try:
+            for code in codes:
+                utils.cached_quandl_get(code, start_date='2005-01-01', end_date='2019-12-31', fetch=_synthetic_fetch)
+        finally:
+            store.close()
+            os.remove(path)
+    return run
+
+
+@benchmark('cached_quandl_get.cached', sizes=(1, 10, 100))
+def _cached_quandl_get_cached(size):
+    import data_store
+    import utils
+    codes = _quandl_codes(size)
+    store = data_store.SeriesStore(os.path.join(_temporary_directory(), 'quandl.sqlite'))
+    _temporary_stores.append(store)
+    utils.set_series_store(store)
+    for code in codes:
+        utils.cached_quandl_get(code, start_date='2005-01-01', end_date='2019-12-31', fetch=_synthetic_fetch)
+
+    def run():
+        for code in codes:
+            utils.cached_quandl_get(code, start_date='2005-01-01', end_date='2019-12-31', refresh='never', fetch=_synthetic_fetch)
+    return run
+
+
+# Import time
+#
+# Worker processes and CLI runs import housing_sim on startup, so it must import quickly and with nothing but
+# NumPy/pandas: no data-source clients, no configuration, no secrets.
+
+def housing_sim_modules():
+    """
+    Every module and package of housing_sim, so new modules are held to the import budget too
+    """
+    import housing_sim
+    return tuple(sorted(module.name for module in pkgutil.walk_packages(housing_sim.__path__, 'housing_sim.')))
+
+
+IMPORT_MODULES = housing_sim_modules()
+FORBIDDEN_IMPORTS = ('quandl', 'constants', 'utils', 'data_store')
+IMPORT_BUDGET_MS = 50  # housing_sim's own import time, on top of importing numpy and pandas
+IMPORT_REPEATS = 5
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import numpy, pandas
+base = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+end = time.perf_counter()
+print(json.dumps({{
+    'base_ms': (base - start) * 1e3,
+    'own_ms': (end - base) * 1e3,
+    'forbidden': [module for module in {forbidden!r} if module in sys.modules],
+}}))
+"""
+
+
+def measure_imports(modules=IMPORT_MODULES, forbidden=FORBIDDEN_IMPORTS, repeats=IMPORT_REPEATS):
+    """
+    Import {modules} in fresh interpreters, as a worker process would
+
+    Returns: dict with the median 'base_ms' (numpy and pandas) and 'own_ms' (everything else), and the
+        'forbidden' modules that got imported along the way
+    """
+    probe = _IMPORT_PROBE.format(modules=tuple(modules), forbidden=tuple(forbidden))
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', probe], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output))
+    return {
+        'base_ms': float(np.median([run['base_ms'] for run in runs])),
+        'own_ms': float(np.median([run['own_ms'] for run in runs])),
+        'forbidden': sorted(set(module for run in runs for module in run['forbidden'])),
+    }
+
+
+def check_imports(budget_ms=IMPORT_BUDGET_MS, repeats=IMPORT_REPEATS):
+    """
+    Print the import times and whether they are within {budget_ms} with no forbidden imports
+
+    Returns: True if the check passed
+    """
+    result = measure_imports(repeats=repeats)
+    print('numpy + pandas:     {:>8.1f} ms'.format(result['base_ms']))
+    print('housing_sim:        {:>8.1f} ms   budget {} ms'.format(result['own_ms'], budget_ms))
+    passed = result['own_ms'] <= budget_ms and not result['forbidden']
+    if result['forbidden']:
+        print('imported modules that should load lazily: {}'.format(', '.join(result['forbidden'])))
+    print('PASS' if passed else 'FAIL')
+    return passed
+
+
+# Service load test
+
+SERVICE_REQUESTS = 2000
+SERVICE_CONCURRENCY = 64
+
+
+def _service_payload(rng):
+    return {
+        'purchase_price': float(rng.uniform(150000, 600000)),
+        'interest_rate': float(rng.uniform(0.025, 0.07)),
+        'down_payment_pct': float(rng.choice([0.05, 0.1, 0.2])),
+        'start_date': START_DATE.isoformat(),
+        'months': LOAN_PERIOD_MONTHS,
+        'base_rent': float(rng.uniform(800, 3000)),
+        'months_out': [59, 119, 359],
+    }
+
+
+async def _load_test(num_requests, concurrency, batch_window, max_batch_size):
+    from housing_sim.service import ScenarioService, ServiceClient
+
+    service = ScenarioService(port=0, batch_window=batch_window, max_batch_size=max_batch_size)
+    await service.start()
+    rng = np.random.default_rng(0)
+    payloads = [_service_payload(rng) for _ in range(num_requests)]
+    latencies = []
+
+    async def run_client(client_payloads):
+        client = ServiceClient(port=service.port)
+        try:
+            for payload in client_payloads:
+                started = time.perf_counter()
+                status, response = await client.request('POST', '/evaluate', payload)
+                assert status == 200, response
+                latencies.append(time.perf_counter() - started)
+        finally:
+            await client.close()
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*[run_client(payloads[i::concurrency]) for i in range(concurrency)])
+        seconds = time.perf_counter() - started
+        metrics = service.metrics.to_dict()
+    finally:
+        await service.close()
+
+    latencies = np.array(latencies) * 1e3
+    return {
+        'requests': num_requests,
+        'concurrency': concurrency,
+        'batch_window_ms': batch_window * 1e3,
+        'max_batch_size': max_batch_size,
+        'seconds': seconds,
+        'requests_per_second': num_requests / seconds,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p90_ms': float(np.percentile(latencies, 90)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_batch_size': metrics['mean_batch_size'],
+        'batches': metrics['batches'],
+    }
+
+
+def load_test_service(num_requests=SERVICE_REQUESTS, concurrency=SERVICE_CONCURRENCY, batch_window=None,
+                      max_batch_size=None):
+    """
+    Start housing_sim.service on a free localhost port and send it {num_requests} scenario requests from
+    {concurrency} keep-alive clients. Client-side latencies include queueing, batching and HTTP
+
+    Returns: dict of throughput, latency percentiles and batching statistics
+    """
+    from housing_sim import service
+    return asyncio.run(_load_test(
+        num_requests, concurrency,
+        service.DEFAULT_BATCH_WINDOW if batch_window is None else batch_window,
+        service.DEFAULT_MAX_BATCH_SIZE if max_batch_size is None else max_batch_size,
+    ))
+
+
+def check_service(num_requests=SERVICE_REQUESTS, concurrency=SERVICE_CONCURRENCY, batch_window=None):
+    """
+    Load test the service with micro-batching, and one scenario at a time for comparison
+
+    Returns: DataFrame with one row per configuration
+    """
+    results = [
+        load_test_service(num_requests, concurrency, batch_window),
+        load_test_service(num_requests, concurrency, batch_window, max_batch_size=1),
+    ]
+    return pd.DataFrame(results, index=['batched', 'unbatched'])
+
+
+# Reduced precision
+
+PRECISION_SCENARIOS = 1000
+PRECISION_MONTHS = 360
+
+
+def _batch_nbytes(num_scenarios, num_months, precision):
+    rng = np.random.default_rng(0)
+    with housing_sim.precision.using_precision(precision):
+        batch = FixedRateMortgageBatch(rng.uniform(0.02, 0.08, num_scenarios), rng.uniform(1e5, 1.5e6, num_scenarios),
+                                       0.2, num_months)
+        return sum(values.nbytes for values in batch.get_data().values())
+
+
+def check_precision(num_scenarios=PRECISION_SCENARIOS, num_months=PRECISION_MONTHS):
+    """
+    Print how far single precision results drift from the double precision reference, and the memory they save
+
+    Returns: True if every column is within housing_sim.precision.SINGLE_ERROR_BOUND
+    """
+    drift = housing_sim.precision.measure_drift(num_scenarios, num_months)
+    with pd.option_context('display.width', 200, 'display.max_rows', None):
+        print(drift.to_string(index=False))
+    double_bytes = _batch_nbytes(num_scenarios, num_months, 'double')
+    single_bytes = _batch_nbytes(num_scenarios, num_months, 'single')
+    print('FixedRateMortgageBatch of {} x {}: {:.1f} MB double, {:.1f} MB single ({:.0%})'.format(
+        num_scenarios, num_months, double_bytes / 2**20, single_bytes / 2**20, single_bytes / double_bytes
+    ))
+    passed = bool(drift['within_bound'].all())
+    print('PASS' if passed else 'FAIL')
+    return passed
+
+
+# Running and comparing
+
+def environment():
+    return {
+        'date': dt.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def run(mode='default', only=None, warmup=DEFAULT_WARMUP, repeats=DEFAULT_REPEATS, max_seconds=DEFAULT_MAX_SECONDS,
+        out=sys.stdout):
+    """
+    Run the benchmark suite
+
+    Args:
+        mode (str): 'quick', 'default' or 'full', which sizes to run, see Benchmark
+        only (str): glob pattern of case names to run, e.g. 'mortgage*' or '*[100]'
+        warmup, repeats, max_seconds: see measure
+        out: where to print progress, None for silence
+
+    Returns: dict with 'environment' and 'results', case name -> measurements
+    """
+    results = {}
+    previous_cache = housing_sim.cache.get_default_cache()
+    housing_sim.cache.set_default_cache(housing_sim.cache.SimulationCache(max_entries=0))
+    # The Quandl benchmarks swap in stores of their own
+    previous_store = _set_series_store(None)
+    try:
+        for bench in BENCHMARKS:
+            for size in bench.sizes_for(mode):
+                name = case_name(bench.name, size)
+                if only is not None and not fnmatch.fnmatchcase(name, only):
+                    continue
+                try:
+                    func = bench.setup(size)
+                except ImportError as error:
+                    _print(out, "{:<40} skipped: {}".format(name, error))
+                    continue
+                result = measure(func, warmup, repeats, max_seconds)
+                result.update({'benchmark': bench.name, 'size': size})
+                results[name] = result
+                _print(out, format_result(name, result))
+    finally:
+        housing_sim.cache.set_default_cache(previous_cache)
+        _set_series_store(previous_store)
+        while _temporary_stores:
+            _temporary_stores.pop().close()
+        while _temporary_directories:
+            _temporary_directories.pop().cleanup()
+    return {'environment': environment(), 'results': results}
+
+
+def format_result(name, result):
+    return "{:<40} median {:>10.3f} ms   p90 {:>10.3f} ms   peak {:>9.2f} MiB   ({} runs)".format(
+        name, result['median'] * 1e3, result['p90'] * 1e3, result['peak_bytes'] / 2**20, result['repeats'])
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, metric=DEFAULT_METRIC):
+    """
+    Compare two runs case by case
+
+    Args:
+        baseline, current (dict): results of run, or loaded from saved JSON
+        threshold (float): relative slowdown of {metric} that counts as a regression, e.g. 0.1 for 10%
+        metric (str): which measurement to compare, e.g. 'median' or 'min'
+
+    Returns: DataFrame with one row per case in both runs, and a 'status' of 'regression', 'improvement' or 'ok'
+    """
+    rows = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name][metric]
+        after = result[metric]
+        change = after / before - 1 if before > 0 else 0.0
+        if change > threshold:
+            status = 'regression'
+        elif change < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, before * 1e3, after * 1e3, change,
+                     baseline['results'][name]['peak_bytes'] / 2**20, result['peak_bytes'] / 2**20, status))
+    return pd.DataFrame(rows, columns=['case', 'baseline_ms', 'current_ms', 'change', 'baseline_peak_mib',
+                                       'current_peak_mib', 'status'])
+
+
+def save(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def _print(out, line):
+    if out is not None:
+        print(line, file=out)
+        out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation models and data layer")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_options = argparse.ArgumentParser(add_help=False)
+    sizes = run_options.add_mutually_exclusive_group()
+    sizes.add_argument('--quick', dest='mode', action='store_const', const='quick', help="smallest sizes only")
+    sizes.add_argument('--full', dest='mode', action='store_const', const='full', help="include 10k-scenario sweeps")
+    run_options.add_argument('--only', help="glob pattern of case names to run, e.g. 'mortgage*'")
+    run_options.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+    run_options.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    run_options.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS)
+    run_options.add_argument('--save', help="write the results to this JSON file")
+
+    commands.add_parser('run', parents=[run_options], help="run the suite")
+    compare_parser = commands.add_parser('compare', parents=[run_options], help="run the suite, or load --results, "
+                                         "and compare against a baseline. Exits with status 1 on regressions")
+    compare_parser.add_argument('baseline', help="JSON file saved by run --save")
+    compare_parser.add_argument('--results', help="compare this saved JSON file instead of running the suite")
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    compare_parser.add_argument('--metric', default=DEFAULT_METRIC)
+    commands.add_parser('list', parents=[run_options], help="list the cases that would run")
+    imports_parser = commands.add_parser('imports', help="check housing_sim's import time and that it imports no "
+                                         "data-source clients. Exits with status 1 on failure")
+    imports_parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    imports_parser.add_argument('--repeats', type=int, default=IMPORT_REPEATS)
+    service_parser = commands.add_parser('service', help="load test the scenario service on localhost, batched and "
+                                         "one scenario at a time")
+    service_parser.add_argument('--requests', type=int, default=SERVICE_REQUESTS)
+    service_parser.add_argument('--concurrency', type=int, default=SERVICE_CONCURRENCY)
+    service_parser.add_argument('--window-ms', type=float, default=None, help="batch window of the service")
+    precision_parser = commands.add_parser('precision', help="check single precision results against the double "
+                                           "precision reference. Exits with status 1 beyond the error bound")
+    precision_parser.add_argument('--scenarios', type=int, default=PRECISION_SCENARIOS)
+    precision_parser.add_argument('--months', type=int, default=PRECISION_MONTHS)
+
+    args = parser.parse_args(argv)
+    if args.command == 'imports':
+        return 0 if check_imports(args.budget_ms, args.repeats) else 1
+    if args.command == 'service':
+        window = None if args.window_ms is None else args.window_ms / 1e3
+        with pd.option_context('display.width', 200, 'display.float_format', '{:.2f}'.format):
+            print(check_service(args.requests, args.concurrency, window).to_string())
+        return 0
+    if args.command == 'precision':
+        return 0 if check_precision(args.scenarios, args.months) else 1
+    mode = args.mode or 'default'
+
+    if args.command == 'list':
+        for bench in BENCHMARKS:
+            for size in bench.sizes_for(mode):
+                name = case_name(bench.name, size)
+                if args.only is None or fnmatch.fnmatchcase(name, args.only):
+                    print(name)
+        return 0
+
+    if args.command == 'compare' and args.results:
+        results = load(args.results)
+    else:
+        print('START: MODE={} REPEATS={} WARMUP={}'.format(mode, args.repeats, args.warmup))
+        print('================================')
+        results = run(mode, args.only, args.warmup, args.repeats, args.max_seconds)
+    if args.save:
+        save(results, args.save)
+
+    if args.command == 'compare':
+        comparison = compare(load(args.baseline), results, args.threshold, args.metric)
+        with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:.3f}'.format):
+            print(comparison.to_string(index=False))
+        regressions = comparison[comparison['status'] == 'regression']
+        print('{} regressions beyond {:.0%} out of {} cases'.format(len(regressions), args.threshold, len(comparison)))
+        return 1 if len(regressions) else 0
+    return 0
+
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,8 @@
-import secrets # python file with api keys as variables, see below
-
-DATA_DIR = ".data" # where to store all pickle data
-QUANDL_API_KEY = secrets.QUANDL_API_KEY # I save this info in a separate file that doesn't get committed
+DATA_DIR = ".data" # where to store all cached data
+QUANDL_STORE_FILENAME = "quandl.sqlite" # local store of every Quandl series we have downloaded
+QUANDL_CACHE_MAX_AGE_DAYS = 30 # series not refreshed in this many days are stale, except for requests ending before their last stored date
+QUANDL_CACHE_EXPIRE_DAYS = 365 # series not refreshed in this many days, e.g. areas no longer analyzed, are deleted from the store when it's opened. None keeps everything
+QUANDL_REFRESH_POLICY = 'if_stale' # when to fetch new observations for stored series: never, if_stale or always
 
 AREA_STATE = 'S'
 AREA_COUNTY = 'CO'
@@ -12,3 +13,17 @@ AREA_ZIPCODE = 'Z'
 
 AUSTIN_METRO = 31
 TRAVIS_COUNTY= 3148
+
+def get_quandl_api_key():
+    """
+    Read the Quandl API key when it is needed rather than at import, so modules that never call Quandl don't
+    need the secrets file
+    """
+    import secrets # python file with api keys as variables, see below
+    return secrets.QUANDL_API_KEY # I save this info in a separate file that doesn't get committed
+
+def __getattr__(name):
+    # constants.QUANDL_API_KEY still works, read on access
+    if name == 'QUANDL_API_KEY':
+        return get_quandl_api_key()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+REFRESH_NEVER = 'never'
+REFRESH_IF_STALE = 'if_stale'
+REFRESH_ALWAYS = 'always'
+REFRESH_POLICIES = (REFRESH_NEVER, REFRESH_IF_STALE, REFRESH_ALWAYS)
+
+# Sentinels for open-ended date ranges, chosen so they sort before/after every real date
+OPEN_START = '0001-01-01'
+OPEN_END = '9999-12-31'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    code TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    col TEXT NOT NULL,
+    date TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (code, variant, date, col)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    code TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (code, variant)
+) WITHOUT ROWID;
+"""
+
+
+def to_date_str(date, default):
+    """
+    Normalize a date-like (str, date, datetime, Timestamp or None) into a sortable 'YYYY-MM-DD' string
+    """
+    if date is None:
+        return default
+    if date in (OPEN_START, OPEN_END):
+        return date
+    return pd.Timestamp(date).strftime('%Y-%m-%d')
+
+
+class SeriesStore(object):
+    """
+    Local SQLite store of time series, indexed by (code, variant, date).
+
+    Each series remembers the single contiguous date range it covers. A read for any sub-range of that is answered
+    from the store, so a 2006-2019 request is served by an earlier 2005-2019 download. Only the parts of a request
+    outside the covered range need to be fetched.
+
+    A variant separates requests for the same code that return different data, e.g. different `transform` or
+    `collapse` arguments.
+
+    Refreshing is incremental: only observations from the last stored date onwards are fetched again and appended,
+    so keeping hundreds of monthly series up to date moves a handful of rows per series.
+    """
+
+    def __init__(self, path, max_age_days=None):
+        """
+        Args:
+            path (str): the SQLite file
+            max_age_days (float): series last refreshed longer ago than this are stale. If None, series never go stale
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def coverage(self, code, variant=''):
+        """
+        The covered (start_date, end_date, fetched_at) of a series, or None if nothing is stored
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT start_date, end_date, fetched_at FROM coverage WHERE code = ? AND variant = ?", (code, variant)
+            ).fetchone()
+
+    def is_stale(self, fetched_at):
+        return self.max_age_days is not None and time.time() - fetched_at > self.max_age_days * 86400
+
+    def last_date(self, code, variant=''):
+        """
+        The last stored observation date of a series as a 'YYYY-MM-DD' string, or None
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT MAX(date) FROM observations WHERE code = ? AND variant = ?", (code, variant)
+            ).fetchone()[0]
+
+    def missing_ranges(self, code, start_date=None, end_date=None, variant='', refresh=REFRESH_IF_STALE):
+        """
+        Date ranges that need to be fetched to answer a request
+
+        Args:
+            code, start_date, end_date, variant: the request
+            refresh (str): when to re-fetch the newest part of an already stored series
+                'never': use stored data no matter how old it is
+                'if_stale': re-fetch from the last stored date onwards if the series is stale, unless the request
+                    ends before the last stored date
+                'always': always re-fetch from the last stored date onwards
+
+        Returns: list of (start, end) date strings, empty if the request can be answered from the store
+        """
+        assert refresh in REFRESH_POLICIES, "refresh must be one of {}".format(REFRESH_POLICIES)
+        start = to_date_str(start_date, OPEN_START)
+        end = to_date_str(end_date, OPEN_END)
+        covered = self.coverage(code, variant)
+        if covered is None:
+            return [(start, end)]
+
+        covered_start, covered_end, fetched_at = covered
+        missing = []
+        if start < covered_start:
+            missing.append((start, covered_start))
+        last_date = self.last_date(code, variant)
+        # A request that ends before the last stored observation is historical, newer data can't change it
+        historical = last_date is not None and end < last_date
+        if refresh == REFRESH_ALWAYS or (refresh == REFRESH_IF_STALE and self.is_stale(fetched_at) and not historical):
+            # Re-fetch the last stored observation too, it may have been revised
+            missing.append((last_date or covered_start, max(end, covered_end)))
+        elif end > covered_end:
+            missing.append((covered_end, end))
+        return missing
+
+    def read(self, code, start_date=None, end_date=None, variant=''):
+        """
+        Read a date range of a series
+
+        Returns: DataFrame indexed by 'Date' with one column per stored column
+        """
+        start = to_date_str(start_date, OPEN_START)
+        end = to_date_str(end_date, OPEN_END)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT date, col, value FROM observations "
+                "WHERE code = ? AND variant = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (code, variant, start, end)
+            ).fetchall()
+        if not rows:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'), columns=['Value'], dtype=float)
+
+        dates, columns, values = zip(*rows)
+        frame = pd.DataFrame({'Date': pd.to_datetime(np.array(dates)), 'col': columns, 'value': np.array(values, dtype=float)})
+        frame = frame.pivot(index='Date', columns='col', values='value')
+        frame.columns.name = None
+        return frame
+
+    def write(self, code, frame, start_date=None, end_date=None, variant=''):
+        """
+        Store (append or overwrite) the observations fetched for a date range and extend the series' coverage to
+        include it. Fetching up to the end of the coverage counts as a refresh.
+
+        Args:
+            code (str): series code
+            frame (DataFrame): observations indexed by date
+            start_date, end_date: the range that was requested, which may be wider than the data returned
+            variant (str): see class docstring
+        """
+        start = to_date_str(start_date, OPEN_START)
+        end = to_date_str(end_date, OPEN_END)
+        dates = frame.index.strftime('%Y-%m-%d')
+        rows = [
+            (code, variant, str(column), date, None if pd.isna(value) else float(value))
+            for column in frame.columns
+            for date, value in zip(dates, frame[column].to_numpy())
+        ]
+        now = time.time()
+        with self._lock, self._connection:
+            covered = self._connection.execute(
+                "SELECT start_date, end_date, fetched_at FROM coverage WHERE code = ? AND variant = ?", (code, variant)
+            ).fetchone()
+            fetched_at = now
+            if covered is not None:
+                if end < covered[1]:
+                    fetched_at = covered[2]
+                start = min(start, covered[0])
+                end = max(end, covered[1])
+            self._connection.executemany("INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?)", rows)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?)", (code, variant, start, end, fetched_at)
+            )
+
+    def expire(self, max_age_days):
+        """
+        Delete every series that hasn't been refreshed in {max_age_days}, e.g. areas no longer analyzed
+
+        Returns: number of series deleted
+        """
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock, self._connection:
+            stale = self._connection.execute("SELECT code, variant FROM coverage WHERE fetched_at < ?", (cutoff,)).fetchall()
+            self._connection.executemany("DELETE FROM observations WHERE code = ? AND variant = ?", stale)
+            self._connection.executemany("DELETE FROM coverage WHERE code = ? AND variant = ?", stale)
+        return len(stale)
@@ -1,2 +1,3 @@
 #!/usr/bin/env bash
-jupyter nbconvert single_home_analysis.ipynb --to=pdf --TemplateExporter.exclude_input=True
+# Render one report per scenario in reports.json, skipping reports whose inputs and code haven't changed
+python reports.py run reports.json "$@"
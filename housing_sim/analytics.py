@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+from housing_sim.panel import Panel
+
+# Vectorized market analytics over whole panels of areas.
+#
+# Every function takes a Panel, a NumPy array whose last axis is time (areas first, e.g. Panel.values), or a
+# compare_areas-style DataFrame (dates x areas), and returns the same kind of object. Nothing loops over areas.
+
+
+def _to_array(data):
+    """
+    (array with time as the last axis, function that turns a result back into the caller's type)
+    """
+    if isinstance(data, Panel):
+        return np.asarray(data.values, dtype=float), \
+            lambda values, new_dates=data.dates: Panel(values, data.areas, data.indicators, new_dates)
+    if isinstance(data, pd.DataFrame):
+        index, columns = data.index, data.columns
+        return data.to_numpy(dtype=float).T, lambda values, new_index=index: pd.DataFrame(values.T, index=new_index, columns=columns)
+    return np.asarray(data, dtype=float), lambda values, new_index=None: values
+
+
+def _dates(data):
+    assert isinstance(data, (Panel, pd.DataFrame)), "dates are required for arrays"
+    return data.dates if isinstance(data, Panel) else data.index.values
+
+
+def first_valid(values):
+    """
+    First non-NaN value of every series and its position along time
+
+    Returns: (values, positions), both with the time axis removed. Series without any valid value give NaN and -1
+    """
+    valid = ~np.isnan(values)
+    positions = np.argmax(valid, axis=-1)
+    first = np.take_along_axis(values, positions[..., np.newaxis], axis=-1)[..., 0]
+    has_valid = valid.any(axis=-1)
+    return np.where(has_valid, first, np.nan), np.where(has_valid, positions, -1)
+
+
+def last_valid(values):
+    """
+    Last non-NaN value of every series and its position along time, see first_valid
+    """
+    first, positions = first_valid(values[..., ::-1])
+    return first, np.where(positions >= 0, values.shape[-1] - 1 - positions, -1)
+
+
+def normalize(data):
+    """
+    Divide every series by its first valid value, so all series start at 1
+    """
+    values, wrap = _to_array(data)
+    return wrap(values / first_valid(values)[0][..., np.newaxis])
+
+
+def _sort_by_date(values, dates):
+    """
+    (values, dates) with the time axis in date order, so unsorted frames give the same results as sorted ones
+    """
+    dates = np.asarray(dates)
+    order = np.argsort(dates, kind='stable')
+    return values[..., order], dates[order]
+
+
+def _yearly_means(values, dates):
+    """
+    (calendar years, mean of every series in every year ignoring NaNs, with years as the last axis)
+    """
+    values, dates = _sort_by_date(values, dates)
+    years = np.asarray(dates, dtype='datetime64[Y]').astype(int) + 1970
+    unique_years, year_starts = np.unique(years, return_index=True)
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), year_starts, axis=-1)
+    counts = np.add.reduceat(valid, year_starts, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return unique_years, np.where(counts > 0, sums / counts, np.nan)
+
+
+def _wrap_years(data, wrap, values, years):
+    if isinstance(data, Panel):
+        return wrap(values, (years - 1970).astype('datetime64[Y]'))
+    return wrap(values, pd.Index(years, name='year'))
+
+
+def yearly_mean(data, dates=None):
+    """
+    Calendar-year mean of every series ignoring NaNs, like groupby(date.year).mean()
+
+    Args:
+        data: Panel, array or DataFrame, see module docstring
+        dates: dates of the time axis, required for arrays
+
+    Returns: mean of every year, with years as the time axis
+    """
+    values, wrap = _to_array(data)
+    years, means = _yearly_means(values, _dates(data) if dates is None else dates)
+    return _wrap_years(data, wrap, means, years)
+
+
+def yoy_growth(data, dates=None):
+    """
+    Year-over-year growth of the calendar-year mean, like groupby(date.year).mean().pct_change()
+
+    Args:
+        data: Panel, array or DataFrame, see module docstring
+        dates: dates of the time axis, required for arrays
+
+    Returns: growth for every year (the first year is NaN), with years as the time axis
+    """
+    values, wrap = _to_array(data)
+    years, means = _yearly_means(values, _dates(data) if dates is None else dates)
+    growth = np.full_like(means, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth[..., 1:] = means[..., 1:] / means[..., :-1] - 1
+    return _wrap_years(data, wrap, growth, years)
+
+
+def cagr(data, dates=None):
+    """
+    Compound annual growth rate from the earliest to the latest valid value of every series
+
+    Returns: Series with one value per area for a DataFrame, otherwise an array without the time axis
+    """
+    values, _ = _to_array(data)
+    values, dates = _sort_by_date(values, _dates(data) if dates is None else dates)
+    days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    first, first_position = first_valid(values)
+    last, last_position = last_valid(values)
+    years = (days[np.maximum(last_position, 0)] - days[np.maximum(first_position, 0)]) / 365.25
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = np.where(years > 0, np.power(last / first, 1 / years) - 1, np.nan)
+    if isinstance(data, pd.DataFrame):
+        return pd.Series(result, index=data.columns)
+    return result
+
+
+def rolling_returns(data, window):
+    """
+    Return over the previous {window} periods at every point in time, e.g. window=12 for monthly data gives
+    trailing 1-year returns. The first {window} periods are NaN
+    """
+    assert window >= 1, "window must be at least 1 period"
+    values, wrap = _to_array(data)
+    returns = np.full_like(values, np.nan)
+    returns[..., window:] = values[..., window:] / values[..., :-window] - 1
+    return wrap(returns)
+
+
+def percentile_rank(data, axis=None):
+    """
+    Cross-sectional percentile rank of every area at every point in time, from 0 (lowest) to 1 (highest).
+    Tied values share the average of their ranks, like rank(method='average'). NaNs are not ranked and stay NaN
+
+    Args:
+        data: Panel, array or DataFrame, see module docstring
+        axis: the areas axis of an array. Defaults to the first axis
+    """
+    values, wrap = _to_array(data)
+    axis = 0 if axis is None else axis
+    # Rank along the last axis, then move the areas back
+    ranked = np.moveaxis(values, axis, -1)
+    valid = ~np.isnan(ranked)
+    # NaNs sort last, so they never take a rank from a valid value
+    order = np.argsort(ranked, axis=-1, kind='stable')
+    ordered = np.take_along_axis(ranked, order, axis=-1)
+    positions = np.broadcast_to(np.arange(ranked.shape[-1]), ranked.shape)
+    # Every run of equal values gets the mean of its first and last position
+    run_start = np.ones(ranked.shape, dtype=bool)
+    run_start[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+    run_end = np.ones(ranked.shape, dtype=bool)
+    run_end[..., :-1] = run_start[..., 1:]
+    first = np.maximum.accumulate(np.where(run_start, positions, 0), axis=-1)
+    last = np.minimum.accumulate(np.where(run_end, positions, ranked.shape[-1])[..., ::-1], axis=-1)[..., ::-1]
+    ranks = np.empty(ranked.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2, axis=-1)
+    counts = valid.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pct = np.where(counts > 1, ranks / (counts - 1), 0.0)
+    return wrap(np.moveaxis(np.where(valid, pct, np.nan), -1, axis))
+
+
+def quantile_select(data, q=0.25, top=True, at=-1):
+    """
+    Areas whose value is in the top (or bottom) {q} quantile at one point in time, replacing hand-typed cutoffs
+
+    Args:
+        data: DataFrame, or (areas, dates) array, e.g. panel.sel(indicator='ZHVISF').values[:, 0]
+        q (float): fraction of areas to select, e.g. 0.25 for the top quartile
+        top (bool): select the highest values if True, else the lowest
+        at (int): position along time to rank at, defaults to the last date
+
+    Returns: list of area labels for a DataFrame, boolean mask over areas for an array
+    """
+    values, _ = _to_array(data)
+    current = values[..., at]
+    cutoff = np.nanquantile(current, 1 - q if top else q)
+    with np.errstate(invalid='ignore'):
+        mask = current >= cutoff if top else current <= cutoff
+    if isinstance(data, pd.DataFrame):
+        return list(data.columns[mask])
+    return mask
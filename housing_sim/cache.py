@@ -0,0 +1,242 @@
+import datetime
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from housing_sim import instrumentation
+from housing_sim.precision import DOUBLE, get_default_precision
+from housing_sim.schedule import Schedule
+
+
+def cache_key(kind, **params):
+    """
+    Canonical hash of a model's parameters
+
+    Equal parameters always give the same key, no matter how they were passed: ints and floats that compare
+    equal hash the same, dates hash by their ISO format and arrays by their values. Results stored in any
+    precision other than the default double precision get keys of their own.
+
+    Args:
+        kind (str): what is being cached, e.g. the model's class name
+        params: the parameters that fully determine the result
+
+    Returns: hex digest str
+    """
+    digest = hashlib.sha256(kind.encode())
+    for name in sorted(params):
+        digest.update(b'|' + name.encode() + b'=' + _canonical(params[name]))
+    precision = get_default_precision()
+    if precision is not DOUBLE:
+        digest.update(b'|precision=' + precision.name.encode())
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    if value is None:
+        return b'None'
+    if isinstance(value, str):
+        return b's' + value.encode()
+    if isinstance(value, (datetime.date, np.datetime64)):
+        return b'd' + str(np.datetime64(value, 'D')).encode()
+    if isinstance(value, (list, tuple, np.ndarray)):
+        arr = np.ascontiguousarray(value, dtype=float)
+        return b'a' + str(arr.shape).encode() + hashlib.sha256(arr.tobytes()).digest()
+    return b'f' + repr(float(value)).encode()
+
+
+class SimulationCache(object):
+    """
+    Process-wide cache of model schedules keyed by cache_key.
+
+    Entries are evicted least-recently-used first once there are more than {max_entries} of them or they hold
+    more than {max_bytes}. If {disk_dir} is given, every entry is also written there and memory misses fall back
+    to disk, so results survive evictions and restarts.
+
+    Concurrent get_or_compute calls for the same key compute it once, the others wait for that result.
+
+    Example:
+        >> housing_sim.cache.set_default_cache(SimulationCache(max_bytes=1e9, disk_dir='.data/schedules'))
+        >> ... run a sweep ...
+        >> housing_sim.cache.get_default_cache().stats()
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=256 * 2**20, disk_dir=None):
+        """
+        Args:
+            max_entries (int): maximum number of schedules kept in memory, 0 disables the memory tier
+            max_bytes (int): maximum memory held by the cached schedules
+            disk_dir (str): directory for the on-disk tier. If None, there is no disk tier
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        # key -> Future of a schedule being computed by get_or_compute
+        self._computing = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """
+        Get a cached schedule, or None
+        """
+        with self._lock:
+            schedule = self._entries.get(key)
+            if schedule is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                instrumentation.count('cache.hits')
+                return schedule
+
+            schedule = self._read_disk(key)
+            if schedule is not None:
+                self.disk_hits += 1
+                instrumentation.count('cache.disk_hits')
+                self._store(key, schedule)
+                return schedule
+
+            self.misses += 1
+            instrumentation.count('cache.misses')
+            return None
+
+    def put(self, key, schedule):
+        """
+        Cache a schedule
+        """
+        with self._lock:
+            self._store(key, schedule)
+            self._write_disk(key, schedule)
+
+    def get_or_compute(self, key, compute):
+        """
+        Get a cached schedule, or call {compute} and cache its result. If another thread is already computing {key},
+        wait for its result instead
+        """
+        schedule = self.get(key)
+        if schedule is not None:
+            return schedule
+
+        with self._lock:
+            # It may have been computed since the lookup
+            schedule = self._entries.get(key)
+            if schedule is not None:
+                return schedule
+            pending = self._computing.get(key)
+            computing = pending is None
+            if computing:
+                pending = self._computing[key] = Future()
+        if not computing:
+            return pending.result()
+
+        try:
+            schedule = compute()
+            self.put(key, schedule)
+        except BaseException as error:
+            with self._lock:
+                del self._computing[key]
+            pending.set_exception(error)
+            raise
+        with self._lock:
+            del self._computing[key]
+        pending.set_result(schedule)
+        return schedule
+
+    def clear(self):
+        """
+        Empty the memory tier and reset the statistics. The disk tier is left alone
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Hit/miss statistics
+
+        Returns: dict
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def _store(self, key, schedule):
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key).nbytes
+        self._entries[key] = schedule
+        self._bytes += schedule.nbytes
+        while len(self._entries) > self.max_entries or (self._bytes > self.max_bytes and len(self._entries) > 1):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + '.npz')
+
+    def _read_disk(self, key):
+        if self.disk_dir is None or not os.path.exists(self._disk_path(key)):
+            return None
+        instrumentation.count('cache.bytes_read', os.path.getsize(self._disk_path(key)))
+        with instrumentation.span('cache.disk_read'), np.load(self._disk_path(key)) as stored:
+            columns = {name: stored[name] for name in stored.files if not name.startswith('__')}
+            start_date = stored['__start_date'].astype('datetime64[D]').item()
+            return Schedule(start_date, int(stored['__num_months']), columns)
+
+    def _write_disk(self, key, schedule):
+        if self.disk_dir is None:
+            return
+        columns = {name: schedule[name] for name in schedule.columns if name not in ('date', 'month')}
+        # Write to a temporary file first so concurrent readers never see a partial file, and concurrent writers
+        # of the same key, e.g. worker processes sharing the disk tier, never write to the same file
+        tmp_path = '{}.{}.tmp.npz'.format(self._disk_path(key), os.getpid())
+        with instrumentation.span('cache.disk_write'):
+            np.savez(tmp_path, __start_date=np.datetime64(schedule.start_date, 'D'),
+                     __num_months=schedule.num_months, **columns)
+            instrumentation.count('cache.bytes_written', os.path.getsize(tmp_path))
+            os.replace(tmp_path, self._disk_path(key))
+
+
+_default_cache = SimulationCache()
+
+
+def get_default_cache():
+    """
+    The cache shared by every model in this process
+    """
+    return _default_cache
+
+
+def set_default_cache(cache):
+    """
+    Replace the cache shared by every model in this process, e.g. with one that has a disk tier.
+    Pass SimulationCache(max_entries=0) to turn caching off
+    """
+    global _default_cache
+    _default_cache = cache
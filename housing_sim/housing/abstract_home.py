@@ -1,7 +1,18 @@
 import numpy as np
 from dateutil.relativedelta import relativedelta
 
+import housing_sim.cache
+from housing_sim.parameter import Parameter
+
 class AbstractHome(object):
+    # Changing any of these after the schedule was generated brings it up to date on the next get_schedule
+    purchase_price = Parameter()
+    homeowners_insurance_rate = Parameter()
+    property_tax_rate = Parameter()
+    appreciation_rate = Parameter()
+    closing_cost_rate = Parameter()
+    title_insurance_rate = Parameter()
+
     def __init__(self, purchase_price, mortgage, start_date=None, num_months=None):
         """
         Create a Home object that handles paying a mortgage, taxes, and other costs
@@ -17,6 +28,10 @@ class AbstractHome(object):
             homeowners_insurance_rate (float): yearly insurance rate as a percentage of home value, paid monthly
             property_tax_rate (float): yearly propery tax rate as a percentage of home value, paid every January
         """
+        self.schedule = None
+        self._schedule_key = None
+        self._changed_parameters = set()
+
         self.mortgage = mortgage
         self.purchase_price = purchase_price
         self.value = purchase_price  # assume initial value of home is equal to purchase price
@@ -49,12 +64,9 @@ class AbstractHome(object):
             'total_indirect': np.nan
         }
 
-        self.data = None
-
-
-    def get_data(self):
+    def get_schedule(self):
         """
-        Get/Generate all the data
+        Get/Generate all the data as a read-only Schedule
 
         Columns:
             'date': date
@@ -65,5 +77,66 @@ class AbstractHome(object):
             'indirect': indirect costs - insurance, tax, interest, one-time & recurring fees
             'total_direct': sum of direct costs from start
             'total_indirect': sum of indirect costs from start
+
+        Equivalent homes share one schedule through the process-wide cache in housing_sim.cache.
+        If parameters changed since the schedule was generated, only the columns that depend on them are recomputed,
+        see _update_schedule
+        """
+        if self.schedule is not None and self._changed_parameters:
+            changed = self._changed_parameters
+            self._changed_parameters = set()
+            self.schedule = self._update_schedule(changed)
+            if self.schedule is not None:
+                self._schedule_key = self.cache_key()
+        if self.schedule is None:
+            # Always resolve the mortgage too, so its state matches a home computed from scratch
+            self.mortgage.get_schedule()
+            self._schedule_key = self.cache_key()
+            self.schedule = housing_sim.cache.get_default_cache().get_or_compute(self._schedule_key, self._compute_schedule)
+        return self.schedule
+
+    def _parameter_changed(self, name):
+        if self.schedule is not None:
+            self._changed_parameters.add(name)
+
+    def _update_schedule(self, changed):
+        """
+        The schedule after the parameters in {changed} were set to new values, or None to generate it from scratch.
+        Subclasses recompute only the columns that depend on {changed}
+        """
+        return None
+
+    def cache_key(self):
+        """
+        Canonical hash of every parameter that determines the schedule, including the mortgage's
+        """
+        return housing_sim.cache.cache_key(
+            type(self).__name__,
+            mortgage=self.mortgage.cache_key(),
+            purchase_price=self.purchase_price,
+            start_date=self.start_date,
+            ownership_period_months=self.ownership_period_months,
+            homeowners_insurance_rate=self.homeowners_insurance_rate,
+            property_tax_rate=self.property_tax_rate,
+            appreciation_rate=self.appreciation_rate,
+            closing_cost_rate=self.closing_cost_rate,
+            title_insurance_rate=self.title_insurance_rate,
+        )
+
+    def _compute_schedule(self):
+        pass
+
+    def get_data(self):
+        """
+        Get/Generate all the data as a new DataFrame, see get_schedule for the columns
+        """
+        return self.get_schedule().to_frame()
+
+    @property
+    def data(self):
+        """
+        DataFrame of the generated data, or None if it hasn't been generated yet
         """
-        self.data = housing_sim.utils.blank_monthly_df(self.start_date, self.loan_period_months, self.base_row_format)
+        if self.schedule is None:
+            return None
+        return self.get_schedule().to_frame()
@@ -1,10 +1,21 @@
 import numpy as np
 from dateutil.relativedelta import relativedelta
 
-import housing_sim.utils
+import housing_sim.cache
+from housing_sim import instrumentation
+from housing_sim.housing.cost_curves import rent_schedule
+from housing_sim.parameter import Parameter
+from housing_sim.schedule import Schedule
 
 class Apartment(object):
+    # Changing any of these after the schedule was generated brings it up to date on the next get_schedule
+    base_rent = Parameter()
+    yearly_increase_rate = Parameter()
+
     def __init__(self, base_rent, start_date, rent_period_months):
+        self.schedule = None
+        self._changed_parameters = set()
+
         self.start_date = start_date
         self.end_date = start_date + relativedelta(months=rent_period_months)
         self.rent_period_months = rent_period_months
@@ -17,22 +28,62 @@ class Apartment(object):
             'total_rent': np.nan,
         }
 
-        self.data = None
+    def get_schedule(self):
+        """
+        Get/Generate all the data
+
+        Columns:
+            'date': date
+            'month': number of months into rent period
+            'rent': rent paid that month, increasing year-over-year
+            'total_rent': sum of rent from start
+
+        Equivalent apartments share one schedule through the process-wide cache in housing_sim.cache.
+        Both columns depend on every parameter, so changing one regenerates (or finds) the whole schedule
+        """
+        if self.schedule is None or self._changed_parameters:
+            self._changed_parameters.clear()
+            self.schedule = housing_sim.cache.get_default_cache().get_or_compute(self.cache_key(), self._compute_schedule)
+        return self.schedule
+
+    def cache_key(self):
+        """
+        Canonical hash of every parameter that determines the schedule
+        """
+        return housing_sim.cache.cache_key(
+            type(self).__name__,
+            base_rent=self.base_rent,
+            yearly_increase_rate=self.yearly_increase_rate,
+            start_date=self.start_date,
+            rent_period_months=self.rent_period_months,
+        )
+
+    def _parameter_changed(self, name):
+        if self.schedule is not None:
+            self._changed_parameters.add(name)
+
+    def _compute_schedule(self):
+        instrumentation.count('apartment.rows', self.rent_period_months)
+        with instrumentation.span('apartment.rent'):
+            # Rent for all months, increasing year-over-year
+            rent = rent_schedule(self.base_rent, self.yearly_increase_rate, self.rent_period_months)
+
+        return Schedule(self.start_date, self.rent_period_months, {
+            'rent': rent,
+            'total_rent': np.cumsum(rent),
+        })
 
     def get_data(self):
-        if self.data is not None:
-            return self.data.copy()
-        self.data = housing_sim.utils.blank_monthly_df(self.start_date, self.rent_period_months, self.base_row_format)
-
-        # Calculate increases in rent year-over-year
-        years_passed = np.arange(0, self.rent_period_months/12)
-        rent_increase_factor = np.power(1 + self.yearly_increase_rate, years_passed)
-        # Convert yearly data into monthly data
-        rent_increase_factor = rent_increase_factor.repeat(12)
-        # Get rent for all months
-        self.data['rent'] = self.base_rent * rent_increase_factor
-
-        #Total rent
-        self.data['total_rent'] = self.data['rent'].expanding(min_periods=1).sum()
-
-        return self.data.copy()
+        """
+        Get/Generate all the data as a new DataFrame, see get_schedule for the columns
+        """
+        return self.get_schedule().to_frame()
+
+    @property
+    def data(self):
+        """
+        DataFrame of the generated data, or None if it hasn't been generated yet
+        """
+        if self.schedule is None:
+            return None
+        return self.get_schedule().to_frame()
@@ -0,0 +1,193 @@
+import numpy as np
+
+from housing_sim.housing.cost_curves import home_cost_curves, rent_schedule
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+
+# How the home side is compared against total rent, as in single_home_analysis.ipynb
+MEASURES = {
+    # Rent above indirect costs
+    'indirect': lambda curves: curves['total_indirect'],
+    # Rent above total cost of ownership
+    'out_of_pocket': lambda curves: curves['total_direct'] + curves['total_indirect'],
+    # Rent above total cost of ownership minus equity built
+    'net_loss': lambda curves: curves['total_direct'] + curves['total_indirect'] - curves['equity'],
+}
+
+HOME_PARAMS = ('purchase_price', 'interest_rate', 'down_payment_pct', 'appreciation_rate', 'homeowners_insurance_rate',
+               'property_tax_rate', 'closing_cost_rate', 'title_insurance_rate')
+RENT_PARAMS = ('base_rent', 'yearly_increase_rate')
+
+
+def home_params(home):
+    """
+    The HOME_PARAMS of a SimpleHome, for analyses that rebuild its costs from array cost curves
+
+    Cost curves amortize a plain fixed-rate annuity, so the home's mortgage must be a SimpleFixedRateMortgage without
+    extra payments. Any other mortgage would be silently replaced by one.
+
+    Returns: dict of parameter -> value
+    """
+    mortgage = home.mortgage
+    assert isinstance(mortgage, SimpleFixedRateMortgage) and not np.any(getattr(mortgage, 'extra_payment', 0)), \
+        "The home's mortgage must be a SimpleFixedRateMortgage without extra payments, not {}.".format(type(mortgage).__name__)
+    return {
+        'purchase_price': home.purchase_price,
+        'interest_rate': mortgage.interest_rate,
+        'down_payment_pct': mortgage.down_payment_pct,
+        'appreciation_rate': home.appreciation_rate,
+        'homeowners_insurance_rate': home.homeowners_insurance_rate,
+        'property_tax_rate': home.property_tax_rate,
+        'closing_cost_rate': home.closing_cost_rate,
+        'title_insurance_rate': home.title_insurance_rate,
+    }
+
+
+def home_curves(params, start_date, num_months, mortgage_price_ratio=1.0):
+    """
+    home_cost_curves for a dict of HOME_PARAMS
+
+    Args:
+        params (dict): parameter -> value or array, see home_params
+        start_date (datetime): when the home was bought
+        num_months (int): length of the mortgage and ownership period
+        mortgage_price_ratio (float): the mortgage's home_purchase_price over the home's purchase_price. The loan and
+            down payment scale with the purchase price
+
+    Returns: same as home_cost_curves
+    """
+    return home_cost_curves(
+        params['purchase_price'],
+        params['interest_rate'],
+        params['down_payment_pct'],
+        start_date,
+        num_months,
+        mortgage_price=np.asarray(params['purchase_price'], dtype=float) * mortgage_price_ratio,
+        **{name: params[name] for name in HOME_PARAMS if name not in ('purchase_price', 'interest_rate', 'down_payment_pct')}
+    )
+
+
+def mortgage_price_ratio(home):
+    """
+    The mortgage's home_purchase_price over the home's purchase_price, see home_curves
+    """
+    return home.mortgage.home_purchase_price / home.purchase_price if home.purchase_price else 1.0
+
+
+class BreakevenSolver(object):
+    """
+    Answers "when does buying beat renting?" for a SimpleHome bought with a SimpleFixedRateMortgage vs an Apartment.
+
+    Works directly on the array cost curves from housing_sim.housing.cost_curves, so no DataFrames are built.
+    Any parameter can be overridden with an array to solve a whole grid at once; overrides broadcast against
+    each other and every result has their broadcast shape.
+
+    Buying breaks even in a month when the home's cost under {measure} is at most the total rent paid so far.
+    Total rent is proportional to the base rent and every home cost is proportional to the purchase price,
+    so breakeven rent and price are exact ratios of the two curves rather than an iterative root search.
+
+    Example:
+        >> solver = BreakevenSolver(my_home, my_apartment)
+        >> solver.breakeven_month()
+        >> solver.breakeven_rent(month=59, interest_rate=np.array([0.035, 0.04, 0.045]))
+        >> solver.breakeven_price(month=np.arange(360), base_rent=1500)
+    """
+
+    def __init__(self, home, apartment, measure='net_loss'):
+        """
+        Args:
+            home (SimpleHome): the home, its mortgage must be a SimpleFixedRateMortgage without extra payments
+            apartment (Apartment): the apartment
+            measure (str): one of 'indirect', 'out_of_pocket' or 'net_loss'
+        """
+        assert measure in MEASURES, "measure must be one of {}".format(sorted(MEASURES))
+        assert home.ownership_period_months == apartment.rent_period_months, \
+            "Home and apartment must cover the same number of months."
+        self.measure = measure
+        self.start_date = home.start_date
+        self.num_months = home.ownership_period_months
+        self.mortgage_price_ratio = mortgage_price_ratio(home)
+        self.params = dict(
+            home_params(home),
+            base_rent=apartment.base_rent,
+            yearly_increase_rate=apartment.yearly_increase_rate,
+        )
+
+    def _param(self, name, overrides):
+        return overrides.get(name, self.params[name])
+
+    def home_cost(self, **overrides):
+        """
+        Cumulative cost of owning under {measure}, shape (..., months)
+        """
+        unknown = set(overrides) - set(self.params)
+        assert not unknown, "Unknown parameters: {}".format(sorted(unknown))
+        curves = home_curves(
+            {name: self._param(name, overrides) for name in HOME_PARAMS}, self.start_date, self.num_months,
+            self.mortgage_price_ratio
+        )
+        return MEASURES[self.measure](curves)
+
+    def total_rent(self, **overrides):
+        """
+        Cumulative rent paid, shape (..., months)
+        """
+        rent = rent_schedule(self._param('base_rent', overrides), self._param('yearly_increase_rate', overrides), self.num_months)
+        return np.cumsum(rent, axis=-1)
+
+    def advantage(self, **overrides):
+        """
+        How much more renting has cost than owning in every month, shape (..., months). Positive means buying is ahead
+        """
+        home_overrides = {name: value for name, value in overrides.items() if name not in RENT_PARAMS}
+        rent_overrides = {name: value for name, value in overrides.items() if name in RENT_PARAMS}
+        home_cost = self.home_cost(**home_overrides)
+        total_rent = self.total_rent(**rent_overrides)
+        return total_rent - home_cost
+
+    def breakeven_month(self, **overrides):
+        """
+        First month in which buying is at least as good as renting, or -1 if it never is
+        """
+        ahead = self.advantage(**overrides) >= 0
+        return np.where(ahead.any(axis=-1), np.argmax(ahead, axis=-1), -1)
+
+    def breakeven_rent(self, month, **overrides):
+        """
+        Base rent at which renting costs exactly as much as owning by {month}
+
+        Args:
+            month (int or np.array): month index, broadcast against the overrides
+        """
+        assert 'base_rent' not in overrides, "base_rent is what's solved for, it can't be overridden."
+        unit_rent = self.total_rent(base_rent=1.0, **{k: v for k, v in overrides.items() if k == 'yearly_increase_rate'})
+        home_cost = self.home_cost(**{k: v for k, v in overrides.items() if k not in RENT_PARAMS})
+        return _at_month(home_cost, month) / _at_month(unit_rent, month)
+
+    def breakeven_price(self, month, **overrides):
+        """
+        Purchase price at which owning costs exactly as much as renting by {month}
+
+        Returns inf where owning a more expensive home only gets cheaper, e.g. when appreciation outpaces costs.
+
+        Args:
+            month (int or np.array): month index, broadcast against the overrides
+        """
+        assert 'purchase_price' not in overrides, "purchase_price is what's solved for, it can't be overridden."
+        home_overrides = {k: v for k, v in overrides.items() if k not in RENT_PARAMS}
+        unit_cost = self.home_cost(purchase_price=1.0, **home_overrides)
+        total_rent = self.total_rent(**{k: v for k, v in overrides.items() if k in RENT_PARAMS})
+        unit_cost = _at_month(unit_cost, month)
+        total_rent = _at_month(total_rent, month)
+        with np.errstate(divide='ignore'):
+            return np.where(unit_cost > 0, total_rent / unit_cost, np.inf)
+
+
+def _at_month(curves, month):
+    """
+    Pick {month} out of (..., months) curves, broadcasting month against the leading axes
+    """
+    month = np.asarray(month)
+    shape = np.broadcast_shapes(curves.shape[:-1], month.shape)
+    curves = np.broadcast_to(curves, shape + curves.shape[-1:])
+    month = np.broadcast_to(month, shape)
+    return np.take_along_axis(curves, month[..., np.newaxis], axis=-1)[..., 0]
@@ -0,0 +1,201 @@
+import numpy as np
+
+from housing_sim import instrumentation
+from housing_sim.mortgage.amortization import amortize, fixed_payment
+from housing_sim.timeline import get_timeline
+
+# Array-level building blocks shared by the home/apartment models and the batched analyses built on them.
+# Every function broadcasts, so rates can be scalars or have a leading scenario axis.
+
+
+def property_tax_factors(start_date, num_months):
+    """
+    Fraction of the yearly property tax due each month
+
+    Taxes are paid every January. The first payment is prorated by the number of months the home
+    was owned in the previous calendar year.
+
+    Args:
+        start_date (datetime): the first month
+        num_months (int): number of months
+
+    Returns: read-only np.array of shape (num_months,), shared through MonthlyTimeline
+    """
+    return get_timeline(start_date, num_months).property_tax_factors
+
+
+def appreciation_factors(appreciation_rate, num_months):
+    """
+    Home value growth factor for every month, compounded monthly
+
+    Args:
+        appreciation_rate (float or np.array): yearly appreciation rate, e.g. 0.02
+        num_months (int): number of months
+
+    Returns: np.array of shape (..., num_months)
+    """
+    monthly_growth = 1 + np.asarray(appreciation_rate, dtype=float)[..., np.newaxis] / 12
+    return np.power(monthly_growth, np.arange(num_months))
+
+
+def rent_schedule(base_rent, yearly_increase_rate, num_months):
+    """
+    Monthly rent, increasing once a year
+
+    Args:
+        base_rent (float or np.array): rent in the first year
+        yearly_increase_rate (float or np.array): yearly increase rate, e.g. 0.02
+        num_months (int): number of months
+
+    Returns: np.array of shape (..., num_months)
+    """
+    years_passed = np.arange(num_months) // 12
+    increase_factor = np.power(1 + np.asarray(yearly_increase_rate, dtype=float)[..., np.newaxis], years_passed)
+    return np.asarray(base_rent, dtype=float)[..., np.newaxis] * increase_factor
+
+
+def homeowners_insurance_costs(home_value, homeowners_insurance_rate):
+    """
+    Homeowners insurance, a yearly rate of the home's value paid monthly
+
+    Returns: np.array of shape (..., months)
+    """
+    return home_value * homeowners_insurance_rate / 12
+
+
+def property_tax_costs(home_value, start_date, property_tax_rate):
+    """
+    Property tax, a yearly rate of the home's value paid every January, see property_tax_factors
+
+    Returns: np.array of shape (..., months)
+    """
+    return home_value * property_tax_factors(start_date, np.shape(home_value)[-1]) * property_tax_rate
+
+
+def fee_costs(purchase_price, closing_cost_rate, title_insurance_rate, shape):
+    """
+    One-time closing costs and title insurance, all paid in the first month
+
+    Args:
+        shape (tuple): shape of the result, (..., months). The rates and price broadcast against its leading axes
+
+    Returns: np.array of shape (..., months)
+    """
+    shape = np.broadcast_shapes(shape, np.shape(closing_cost_rate), np.shape(title_insurance_rate))
+    fees = np.zeros(shape)
+    fees[..., 0] = np.broadcast_to((closing_cost_rate + title_insurance_rate) * purchase_price, shape[:-1] + (1,))[..., 0]
+    return fees
+
+
+def indirect_costs(homeowners_insurance, property_tax, fees, interest):
+    """
+    Monthly indirect costs, everything paid that doesn't buy equity
+
+    Returns: np.array of shape (..., months)
+    """
+    return property_tax + homeowners_insurance + fees + interest
+
+
+def home_costs(purchase_price, down_payment_pct, principal, interest, pct_paid, start_date,
+               appreciation_rate=0.02, homeowners_insurance_rate=0.01, property_tax_rate=0.02,
+               closing_cost_rate=0.05, title_insurance_rate=0.01, down_payment=None):
+    """
+    SimpleHome's monthly and cumulative costs given an amortized mortgage
+
+    Every rate and price broadcasts against the leading axes of the mortgage arrays.
+
+    Args:
+        purchase_price (float or np.array): price of the home
+        down_payment_pct (float or np.array): the down payment percentage
+        principal, interest, pct_paid (np.array): the mortgage's columns, shape (..., months)
+        start_date (datetime): when the home was bought
+        down_payment (float or np.array): down payment in dollars. If None, purchase_price * down_payment_pct
+        the remaining rates are the same as the SimpleHome attributes of the same name
+
+    Returns: dict of (..., months) arrays
+        'home_value', 'home_ownership_pct', 'direct', 'indirect', 'total_direct', 'total_indirect', 'equity',
+        and the indirect breakdown 'homeowners_insurance', 'property_tax', 'interest', 'fees'
+    """
+    # Mortgage columns may be stored in single precision, costs and running totals are always summed in double
+    principal, interest, pct_paid = [np.asarray(arg, dtype=float) for arg in (principal, interest, pct_paid)]
+    num_months = principal.shape[-1]
+    purchase_price, down_payment_pct, appreciation_rate, homeowners_insurance_rate, property_tax_rate, \
+        closing_cost_rate, title_insurance_rate = [
+            np.asarray(arg, dtype=float)[..., np.newaxis] for arg in (
+                purchase_price, down_payment_pct, appreciation_rate, homeowners_insurance_rate,
+                property_tax_rate, closing_cost_rate, title_insurance_rate
+            )
+        ]
+    if down_payment is None:
+        down_payment = purchase_price * down_payment_pct
+    else:
+        down_payment = np.asarray(down_payment, dtype=float)[..., np.newaxis]
+
+    # Home value and ownership percentage
+    home_value = purchase_price * appreciation_factors(appreciation_rate[..., 0], num_months)
+    home_ownership_pct = down_payment_pct + (1 - down_payment_pct) * pct_paid
+
+    # Direct costs - the down payment replaces the first month's principal
+    direct = np.array(np.broadcast_to(principal, np.broadcast_shapes(np.shape(principal), down_payment.shape)))
+    direct[..., 0] = down_payment[..., 0]
+
+    # Indirect costs
+    with instrumentation.span('home_costs.indirect'):
+        homeowners_insurance = homeowners_insurance_costs(home_value, homeowners_insurance_rate)
+        property_tax = property_tax_costs(home_value, start_date, property_tax_rate)
+        fees = fee_costs(purchase_price, closing_cost_rate, title_insurance_rate, home_value.shape)
+        indirect = indirect_costs(homeowners_insurance, property_tax, fees, interest)
+
+    with instrumentation.span('home_costs.cumulative'):
+        total_direct = np.cumsum(direct, axis=-1)
+        total_indirect = np.cumsum(indirect, axis=-1)
+
+    return {
+        'home_value': home_value,
+        'home_ownership_pct': home_ownership_pct,
+        'direct': direct,
+        'indirect': indirect,
+        'total_direct': total_direct,
+        'total_indirect': total_indirect,
+        'equity': home_value * home_ownership_pct,
+        'homeowners_insurance': homeowners_insurance,
+        'property_tax': property_tax,
+        'interest': interest,
+        'fees': fees,
+    }
+
+
+def home_cost_curves(purchase_price, yearly_interest_rate, down_payment_pct, start_date, num_months,
+                     mortgage_price=None, **rates):
+    """
+    SimpleHome's costs for a home bought with a fixed-rate mortgage, without building any DataFrames
+
+    Every rate and price broadcasts, so passing arrays evaluates a whole grid of homes at once.
+
+    Args:
+        purchase_price (float or np.array): price of the home
+        yearly_interest_rate (float or np.array): mortgage interest rate
+        down_payment_pct (float or np.array): the down payment percentage
+        start_date (datetime): when the home was bought
+        num_months (int): length of the mortgage and ownership period
+        mortgage_price (float or np.array): the mortgage's home_purchase_price, which the loan and down payment are
+            taken from as in SimpleHome. If None, {purchase_price}
+        rates: any of the keyword arguments of home_costs
+
+    Returns: same as home_costs
+    """
+    if mortgage_price is None:
+        mortgage_price = purchase_price
+    purchase_price, mortgage_price, yearly_interest_rate, down_payment_pct = np.broadcast_arrays(
+        np.asarray(purchase_price, dtype=float), np.asarray(mortgage_price, dtype=float),
+        np.asarray(yearly_interest_rate, dtype=float), np.asarray(down_payment_pct, dtype=float)
+    )
+    loan_amount = mortgage_price * (1 - down_payment_pct)
+    monthly_rate = yearly_interest_rate / 12
+    principal, _, interest, _ = amortize(
+        loan_amount, monthly_rate, fixed_payment(loan_amount, monthly_rate, num_months), np.zeros(num_months)
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_paid = np.where(loan_amount[..., np.newaxis] > 0, np.cumsum(principal, axis=-1) / loan_amount[..., np.newaxis], 1.0)
+    return home_costs(purchase_price, down_payment_pct, principal, interest, pct_paid, start_date,
+                      down_payment=mortgage_price * down_payment_pct, **rates)
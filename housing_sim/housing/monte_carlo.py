@@ -0,0 +1,270 @@
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from housing_sim.housing.cost_curves import property_tax_factors
+from housing_sim.precision import PRECISIONS, get_default_precision
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class MonteCarloSimulation(object):
+    """
+    Stochastic home appreciation and rent growth for a SimpleHome (and optionally an Apartment).
+
+    Instead of the single path given by `appreciation_rate` and `yearly_increase_rate`, every path draws
+    its own monthly appreciation and yearly rent increases, either from a log-normal distribution centered
+    on those rates or by bootstrapping historical returns. The mortgage is deterministic, so it is only
+    amortized once and shared by every path.
+
+    Paths are generated in chunks of {chunk_size}. Chunk i always uses the i-th child of the seed, so results
+    are reproducible for a given (seed, chunk_size) no matter how many worker processes are used.
+
+    Example:
+        >> simulation = MonteCarloSimulation(my_home, my_apartment, appreciation_volatility=0.05)
+        >> bands = simulation.simulate_bands(100000, seed=42, max_workers=8)
+        >> bands['home_value'][50]  # median home value for every month
+    """
+
+    def __init__(self, home, apartment=None, appreciation_volatility=0.05, rent_volatility=0.02,
+                 appreciation_history=None, rent_history=None):
+        """
+        Args:
+            home (SimpleHome): the home to simulate, its rates are the mean of each distribution
+            apartment (Apartment): the apartment to simulate rent for. If None, rent is not simulated
+            appreciation_volatility (float): yearly volatility of home appreciation
+            rent_volatility (float): volatility of the yearly rent increase
+            appreciation_history (iterable of floats): historical monthly appreciation rates, e.g. 0.004.
+                If given, monthly appreciation is bootstrapped from these instead of drawn from a log-normal
+            rent_history (iterable of floats): historical yearly rent increase rates, e.g. 0.03.
+                If given, yearly rent increases are bootstrapped from these instead of drawn from a log-normal
+        """
+        self.home = home
+        self.apartment = apartment
+        self.appreciation_volatility = appreciation_volatility
+        self.rent_volatility = rent_volatility
+        self.appreciation_history = None if appreciation_history is None else np.asarray(appreciation_history, dtype=float)
+        self.rent_history = None if rent_history is None else np.asarray(rent_history, dtype=float)
+
+    def _params(self):
+        """
+        Everything a worker needs to generate paths, as plain values and arrays that pickle cheaply
+        """
+        home = self.home
+        mortgage_schedule = home.mortgage.get_schedule()
+        down_payment_pct = home.mortgage.down_payment_pct
+        num_months = home.ownership_period_months
+        params = {
+            'num_months': num_months,
+            'purchase_price': home.purchase_price,
+            'appreciation_rate': home.appreciation_rate,
+            'appreciation_volatility': self.appreciation_volatility,
+            'appreciation_history': self.appreciation_history,
+            'homeowners_insurance_rate': home.homeowners_insurance_rate,
+            'property_tax_rate': home.property_tax_rate,
+            'property_tax_factors': property_tax_factors(home.start_date, num_months),
+            'home_ownership_pct': down_payment_pct + (1 - down_payment_pct) * np.asarray(mortgage_schedule['pct_paid'], dtype=float),
+            'base_rent': None,
+            'precision': get_default_precision().name,
+        }
+        if self.apartment is not None:
+            assert self.apartment.rent_period_months == num_months, "Home and apartment must cover the same number of months."
+            params.update({
+                'base_rent': self.apartment.base_rent,
+                'yearly_increase_rate': self.apartment.yearly_increase_rate,
+                'rent_volatility': self.rent_volatility,
+                'rent_history': self.rent_history,
+            })
+        return params
+
+    def _chunks(self, num_paths, seed, chunk_size):
+        num_chunks = max(1, int(np.ceil(num_paths / chunk_size)))
+        seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+        for i, chunk_seed in enumerate(seeds):
+            start = i * chunk_size
+            yield start, min(chunk_size, num_paths - start), chunk_seed
+
+    def _run(self, params, num_paths, seed, chunk_size, max_workers, worker, handle_result):
+        """
+        Run {worker} over every chunk, inline or on a process pool, keeping at most 2 chunks per worker in flight
+        """
+        chunks = self._chunks(num_paths, seed, chunk_size)
+        if max_workers == 0 or num_paths <= chunk_size:
+            for start, size, chunk_seed in chunks:
+                handle_result(start, worker(params, size, chunk_seed))
+            return
+
+        max_workers = max_workers or os.cpu_count()
+        max_in_flight = 2 * max_workers
+        # Imported here, multiprocessing would add more to housing_sim's import time than all of its own modules
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            in_flight = {}
+            for start, size, chunk_seed in chunks:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle_result(in_flight.pop(future), future.result())
+                in_flight[pool.submit(worker, params, size, chunk_seed)] = start
+            for future in list(in_flight):
+                handle_result(in_flight.pop(future), future.result())
+
+    def simulate(self, num_paths, seed=None, chunk_size=10000, max_workers=None):
+        """
+        Simulate every path and keep all of them
+
+        Args:
+            num_paths (int): number of paths
+            seed (int): seed for reproducible results. If None, uses fresh entropy
+            chunk_size (int): number of paths generated at once
+            max_workers (int): number of worker processes, 0 to run inline and None for one per CPU
+
+        Returns: dict of (num_paths x months) arrays
+            'home_value', 'homeowners_insurance', 'property_tax', 'equity', and when an apartment was given,
+            'rent' and 'total_rent'. Stored in the default precision, see housing_sim.precision
+        """
+        results = {}
+
+        def handle_result(start, chunk):
+            for name, values in chunk.items():
+                if name not in results:
+                    results[name] = np.empty((num_paths, values.shape[1]), dtype=values.dtype)
+                results[name][start:start + len(values)] = values
+
+        self._run(self._params(), num_paths, seed, chunk_size, max_workers, _simulate_chunk, handle_result)
+        return results
+
+    def simulate_bands(self, num_paths, seed=None, chunk_size=10000, max_workers=None, percentiles=DEFAULT_PERCENTILES):
+        """
+        Simulate every path but only keep the percentile bands
+
+        Insurance, property tax and equity are fixed multiples of the home value within a month, so their
+        percentiles follow from the home value percentiles. Only home value and cumulative rent are collected, as
+        float32 memory-mapped files in a temporary directory, and the percentiles are computed a block of months at a
+        time. Memory stays around {chunk_size} paths' worth no matter how many paths are simulated.
+
+        Args:
+            same as simulate, plus
+            percentiles (iterable of floats): percentiles to compute, between 0 and 100
+
+        Returns: dict of (len(percentiles) x months) arrays, keyed like simulate, plus 'percentiles'
+        """
+        params = self._params()
+        num_months = params['num_months']
+        with tempfile.TemporaryDirectory() as directory:
+            # Held in a dict rather than closure variables, so the memory maps can be released before the directory
+            # is removed
+            paths = {'home_value': np.lib.format.open_memmap(
+                os.path.join(directory, 'home_value.npy'), mode='w+', dtype=np.float32, shape=(num_paths, num_months)
+            )}
+            if params['base_rent'] is not None:
+                paths['total_rent'] = np.lib.format.open_memmap(
+                    os.path.join(directory, 'total_rent.npy'), mode='w+', dtype=np.float32, shape=(num_paths, num_months)
+                )
+
+            def handle_result(start, chunk):
+                home_value, total_rent = chunk
+                paths['home_value'][start:start + len(home_value)] = home_value
+                if total_rent is not None:
+                    paths['total_rent'][start:start + len(total_rent)] = total_rent
+
+            self._run(params, num_paths, seed, chunk_size, max_workers, _simulate_chunk_drivers, handle_result)
+
+            home_value_bands = _blocked_percentile(paths['home_value'], percentiles, chunk_size)
+            bands = {
+                'percentiles': np.asarray(percentiles),
+                'home_value': home_value_bands,
+                'homeowners_insurance': home_value_bands * params['homeowners_insurance_rate'] / 12,
+                'property_tax': home_value_bands * params['property_tax_factors'] * params['property_tax_rate'],
+                'equity': home_value_bands * params['home_ownership_pct'],
+            }
+            if 'total_rent' in paths:
+                bands['total_rent'] = _blocked_percentile(paths['total_rent'], percentiles, chunk_size)
+            paths.clear()
+        return bands
+
+
+def percentile_bands(results, percentiles=DEFAULT_PERCENTILES):
+    """
+    Percentile bands for every metric returned by MonteCarloSimulation.simulate
+
+    Returns: dict of (len(percentiles) x months) arrays
+    """
+    return {name: np.percentile(values, percentiles, axis=0) for name, values in results.items()}
+
+
+def _blocked_percentile(values, percentiles, chunk_size):
+    """
+    np.percentile over the paths of a (paths x months) array, reading about {chunk_size} paths' worth at a time
+    """
+    num_paths, num_months = values.shape
+    block = max(1, chunk_size * num_months // max(num_paths, 1))
+    bands = np.empty((len(percentiles), num_months))
+    for start in range(0, num_months, block):
+        bands[:, start:start + block] = np.percentile(np.asarray(values[:, start:start + block]), percentiles, axis=0)
+    return bands
+
+
+def _draw_growth(rng, shape, rate, volatility, history):
+    """
+    Growth factors (1 + rate) for every period, log-normal with mean 1 + {rate} or bootstrapped from {history}
+    """
+    if history is not None:
+        return 1 + rng.choice(history, size=shape)
+    sigma = volatility
+    mu = np.log(1 + rate) - sigma ** 2 / 2
+    return np.exp(rng.normal(mu, sigma, size=shape))
+
+
+def _home_value_paths(params, rng, num_paths):
+    num_months = params['num_months']
+    growth = _draw_growth(
+        rng, (num_paths, num_months - 1),
+        params['appreciation_rate'] / 12, params['appreciation_volatility'] / np.sqrt(12), params['appreciation_history']
+    )
+    # Month 0 is the purchase price
+    log_growth = np.zeros((num_paths, num_months))
+    np.cumsum(np.log(growth), axis=1, out=log_growth[:, 1:])
+    return params['purchase_price'] * np.exp(log_growth)
+
+
+def _rent_paths(params, rng, num_paths):
+    num_months = params['num_months']
+    num_years = int(np.ceil(num_months / 12))
+    growth = _draw_growth(
+        rng, (num_paths, num_years - 1),
+        params['yearly_increase_rate'], params['rent_volatility'], params['rent_history']
+    )
+    yearly_factor = np.ones((num_paths, num_years))
+    np.cumprod(growth, axis=1, out=yearly_factor[:, 1:])
+    # Same increase applies to every month of the year
+    return params['base_rent'] * yearly_factor[:, np.arange(num_months) // 12]
+
+
+def _simulate_chunk(params, num_paths, seed):
+    rng = np.random.default_rng(seed)
+    home_value = _home_value_paths(params, rng, num_paths)
+    chunk = {
+        'home_value': home_value,
+        'homeowners_insurance': home_value * params['homeowners_insurance_rate'] / 12,
+        'property_tax': home_value * params['property_tax_factors'] * params['property_tax_rate'],
+        'equity': home_value * params['home_ownership_pct'],
+    }
+    if params['base_rent'] is not None:
+        rent = _rent_paths(params, rng, num_paths)
+        chunk['rent'] = rent
+        chunk['total_rent'] = np.cumsum(rent, axis=1)
+    store = PRECISIONS[params['precision']].store
+    return {name: store(values) for name, values in chunk.items()}
+
+
+def _simulate_chunk_drivers(params, num_paths, seed):
+    # Same draws, in the same order, as _simulate_chunk
+    rng = np.random.default_rng(seed)
+    home_value = _home_value_paths(params, rng, num_paths).astype(np.float32)
+    total_rent = None
+    if params['base_rent'] is not None:
+        total_rent = np.cumsum(_rent_paths(params, rng, num_paths), axis=1).astype(np.float32)
+    return home_value, total_rent
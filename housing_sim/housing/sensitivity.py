@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+from housing_sim.housing.breakeven import home_curves, home_params, mortgage_price_ratio
+
+# Outputs of the sensitivity analysis, all cumulative up to the chosen months
+OUTPUTS = {
+    # Everything paid so far: down payment, principal, interest, insurance, taxes and fees
+    'total_cost': lambda curves: curves['total_direct'] + curves['total_indirect'],
+    # Value of the owned share of the home
+    'equity': lambda curves: curves['equity'],
+    # Equity minus everything paid so far
+    'net_position': lambda curves: curves['equity'] - curves['total_direct'] - curves['total_indirect'],
+}
+
+DEFAULT_RELATIVE_STEP = 0.01
+DEFAULT_RELATIVE_RANGE = 0.1
+
+
+class SensitivityAnalysis(object):
+    """
+    How a SimpleHome bought with a SimpleFixedRateMortgage responds to its parameters.
+
+    Every perturbed scenario of a question is stacked into one batch and evaluated in a single vectorized pass of
+    housing_sim.housing.cost_curves, so nothing is rebuilt scenario by scenario and no DataFrames are made.
+    Results are arrays with the months as the last axis.
+
+    Parameters are the names in housing_sim.housing.breakeven.HOME_PARAMS, e.g. 'interest_rate' or
+    'property_tax_rate'. Outputs are 'total_cost', 'equity' and 'net_position', see OUTPUTS.
+
+    Example:
+        >> analysis = SensitivityAnalysis(my_home, months=[59, 119, 359])
+        >> analysis.tornado('net_position', month=59)
+        >> analysis.one_way('interest_rate', np.linspace(0.03, 0.06, 31))['total_cost']  # (31, 3)
+        >> analysis.two_way('interest_rate', rates, 'appreciation_rate', appreciation)['net_position']  # (rates, appreciation, 3)
+    """
+
+    def __init__(self, home, months=None):
+        """
+        Args:
+            home (SimpleHome): the baseline home, its mortgage must be a SimpleFixedRateMortgage without extra payments
+            months (int or iterable of ints): month indexes to report. If None, the last month
+        """
+        self.start_date = home.start_date
+        self.num_months = home.ownership_period_months
+        self.months = np.atleast_1d(self.num_months - 1 if months is None else np.asarray(months, dtype=int))
+        self.mortgage_price_ratio = mortgage_price_ratio(home)
+        self.params = home_params(home)
+
+    def evaluate(self, **overrides):
+        """
+        Every output with some parameters overridden. Overrides can be arrays and broadcast against each other
+
+        Returns: dict of output -> np.array of shape (broadcast shape of the overrides..., len(months))
+        """
+        unknown = set(overrides) - set(self.params)
+        assert not unknown, "Unknown parameters: {}".format(sorted(unknown))
+        curves = home_curves(dict(self.params, **overrides), self.start_date, self.num_months, self.mortgage_price_ratio)
+        return {name: output(curves)[..., self.months] for name, output in OUTPUTS.items()}
+
+    def baseline(self):
+        """
+        Every output for the baseline home
+
+        Returns: dict of output -> np.array of shape (len(months),)
+        """
+        return self.evaluate()
+
+    def _perturbed(self, params, low, high):
+        """
+        Evaluate one batch holding, for every parameter in turn, a scenario at its low and one at its high value
+
+        Returns: dict of output -> (lows, highs), each of shape (len(params), len(months))
+        """
+        num_params = len(params)
+        overrides = {}
+        for i, name in enumerate(params):
+            values = np.full(2 * num_params, float(self.params[name]))
+            values[2 * i] = low[i]
+            values[2 * i + 1] = high[i]
+            overrides[name] = values
+        results = self.evaluate(**overrides)
+        return {name: (values[0::2], values[1::2]) for name, values in results.items()}
+
+    def partial_effects(self, params=None, relative_step=DEFAULT_RELATIVE_STEP):
+        """
+        Partial derivative of every output with respect to every parameter, by central differences
+
+        Args:
+            params (iterable of str): parameters to differentiate by. If None, all of them
+            relative_step (float): step as a fraction of each parameter's value. Parameters that are 0 use it as an
+                absolute step
+
+        Returns: (params, dict of output -> np.array of shape (len(params), len(months)))
+        """
+        params = list(self.params if params is None else params)
+        values = np.array([float(self.params[name]) for name in params])
+        steps = np.where(values != 0, np.abs(values) * relative_step, relative_step)
+        perturbed = self._perturbed(params, values - steps, values + steps)
+        return params, {
+            name: (high - low) / (2 * steps[:, np.newaxis]) for name, (low, high) in perturbed.items()
+        }
+
+    def tornado(self, output='net_position', month=None, ranges=None, relative_range=DEFAULT_RELATIVE_RANGE):
+        """
+        Tornado-chart data: how far {output} swings when each parameter moves across its range
+
+        Args:
+            output (str): one of OUTPUTS
+            month (int): one of the analysis months. If None, the last of them
+            ranges (dict): parameter -> (low, high). Parameters not given use their value -/+ {relative_range}
+            relative_range (float): default range as a fraction of each parameter's value
+
+        Returns: DataFrame with one row per parameter, largest swing first
+            Columns: 'param', 'low_value', 'high_value', 'low', 'high', 'swing'
+        """
+        assert output in OUTPUTS, "output must be one of {}".format(sorted(OUTPUTS))
+        if month is None:
+            column = len(self.months) - 1
+        else:
+            columns = np.flatnonzero(self.months == month)
+            assert len(columns), "month {} is not one of the analysis months {}".format(month, self.months.tolist())
+            column = int(columns[0])
+        ranges = ranges or {}
+        params = list(self.params)
+        values = np.array([float(self.params[name]) for name in params])
+        low = np.array([ranges[name][0] if name in ranges else value * (1 - relative_range) for name, value in zip(params, values)])
+        high = np.array([ranges[name][1] if name in ranges else value * (1 + relative_range) for name, value in zip(params, values)])
+
+        lows, highs = self._perturbed(params, low, high)[output]
+        frame = pd.DataFrame({
+            'param': params,
+            'low_value': low,
+            'high_value': high,
+            'low': lows[:, column],
+            'high': highs[:, column],
+        })
+        frame['swing'] = (frame['high'] - frame['low']).abs()
+        return frame.sort_values('swing', ascending=False, ignore_index=True)
+
+    def one_way(self, param, values):
+        """
+        Every output as {param} sweeps across {values}
+
+        Returns: dict of output -> np.array of shape (len(values), len(months))
+        """
+        return self.evaluate(**{param: np.asarray(values, dtype=float)})
+
+    def two_way(self, param_x, values_x, param_y, values_y):
+        """
+        Every output over the grid of {param_x} x {param_y}
+
+        Returns: dict of output -> np.array of shape (len(values_x), len(values_y), len(months))
+        """
+        assert param_x != param_y, "Sweep two different parameters"
+        return self.evaluate(**{
+            param_x: np.asarray(values_x, dtype=float)[:, np.newaxis],
+            param_y: np.asarray(values_y, dtype=float)[np.newaxis, :],
+        })
@@ -1,18 +1,31 @@
 import numpy as np
-import pandas as pd
-from dateutil.relativedelta import relativedelta
 
-import housing_sim.utils
+import housing_sim.cache
+from housing_sim import instrumentation
 from housing_sim.housing.abstract_home import AbstractHome
+from housing_sim.housing.cost_curves import appreciation_factors, fee_costs, home_costs, homeowners_insurance_costs, \
+    indirect_costs, property_tax_costs
+from housing_sim.schedule import Schedule
+
+# Columns that depend on each parameter that can be updated in place. The indirect cost totals depend on all of them,
+# and the mortgage on none of them
+PARAMETER_COLUMNS = {
+    'appreciation_rate': ('home_value', 'homeowners_insurance', 'property_tax'),
+    'homeowners_insurance_rate': ('homeowners_insurance',),
+    'property_tax_rate': ('property_tax',),
+    'closing_cost_rate': ('fees',),
+    'title_insurance_rate': ('fees',),
+}
 
 
 class SimpleHome(AbstractHome):
     def __init__(self, *args, **kwargs):
         super(SimpleHome, self).__init__(*args, **kwargs)
+        self.indirect_cost_schedule = None
 
-    def get_data(self):
+    def _compute_schedule(self):
         """
-        Get/Generate all the data
+        Generate all the data
 
         Columns:
             'date': date
@@ -24,63 +37,115 @@ class SimpleHome(AbstractHome):
             'total_direct': sum of direct costs from start
             'total_indirect': sum of indirect costs from start
         """
-        if self.data is not None:
-            return self.data.copy()
-
-        # Setup
-        self.data = housing_sim.utils.blank_monthly_df(self.start_date, self.ownership_period_months, self.base_row_format)
-        self.mortgage_data = self.mortgage.get_data()
-        assert self.data.shape[0] == self.mortgage_data.shape[0], "Housing data and mortgage data must have same number of rows."
-
-        # Home value and ownership percentage
-        num_rows = self.data.shape[0]
-        appreciation_rates = np.full(num_rows, 1 + self.appreciation_rate/12)
-        home_appreciation_factor = np.power(appreciation_rates, self.data['month'])
-        self.data['home_value'] = self.purchase_price * home_appreciation_factor
-        self.data['home_ownership_pct'] = self.mortgage.down_payment_pct + (1-self.mortgage.down_payment_pct)*self.mortgage_data['pct_paid']
-
-        # Direct costs
-        self.data['direct'] = self.mortgage_data['principal'].values
-        self.data.at[0, 'direct'] = self.mortgage.home_purchase_price * self.mortgage.down_payment_pct
-
-        ### Calculate Indirect costs ###
-        self.indirect_cost_data = pd.DataFrame()
-
-        # Homeowners insurance
-        self.indirect_cost_data['homeowners_insurance'] = self.data['home_value'] * self.homeowners_insurance_rate/12
-
-        # Property Taxes
-        is_property_tax_month = self.data['date'].apply(lambda date: date.month == 1)
-        self.indirect_cost_data['property_tax'] = self.data['home_value'] * is_property_tax_month * self.property_tax_rate
-        # First year is prorated - # of months you owned the home in the previous calendar year
-        first_payment_index = np.argmax(is_property_tax_month.to_numpy() == True)
-        taxable_first_months = first_payment_index + 1
-        self.indirect_cost_data.at[first_payment_index, 'property_tax'] *= taxable_first_months/12
-
-        # Mortgage Interest
-        self.indirect_cost_data['interest'] = self.mortgage_data['interest']
-
-        # Fees
-        self.indirect_cost_data['fees'] = 0.0
-        closing_costs = self.closing_cost_rate * self.purchase_price
-        title_insurance_cost = self.title_insurance_rate * self.purchase_price
-        self.indirect_cost_data.at[0, 'fees'] = closing_costs + title_insurance_cost
-
-        self.indirect_cost_data['total'] = self.indirect_cost_data['property_tax'] + \
-                                           self.indirect_cost_data['homeowners_insurance'] + \
-                                           self.indirect_cost_data['fees'] + \
-                                           self.indirect_cost_data['interest']
+        schedule, self.indirect_cost_schedule = self._compute_schedules()
+        housing_sim.cache.get_default_cache().put(self._indirect_cost_cache_key(), self.indirect_cost_schedule)
+        return schedule
 
-
-        # Copy indirect data over to main df
-        self.data['indirect'] = self.indirect_cost_data['total'].values
-
-        ### Calculate rolling totals ###
-        self.data['total_direct'] = self.data['direct'].expanding(min_periods=1).sum()
-        self.data['total_indirect'] = self.data['indirect'].expanding(min_periods=1).sum()
-
-        return self.data.copy()
+    def _compute_schedules(self):
+        """
+        Generate the main schedule and the indirect cost breakdown together
+        """
+        mortgage_schedule = self.mortgage.get_schedule()
+        assert self.ownership_period_months == len(mortgage_schedule), "Housing data and mortgage data must have same number of rows."
+
+        instrumentation.count('home.rows', self.ownership_period_months)
+        with instrumentation.span('home.costs'):
+            costs = home_costs(
+                self.purchase_price,
+                self.mortgage.down_payment_pct,
+                mortgage_schedule['principal'],
+                mortgage_schedule['interest'],
+                mortgage_schedule['pct_paid'],
+                self.start_date,
+                appreciation_rate=self.appreciation_rate,
+                homeowners_insurance_rate=self.homeowners_insurance_rate,
+                property_tax_rate=self.property_tax_rate,
+                closing_cost_rate=self.closing_cost_rate,
+                title_insurance_rate=self.title_insurance_rate,
+                down_payment=self.mortgage.home_purchase_price * self.mortgage.down_payment_pct,
+            )
+
+        schedule = Schedule(self.start_date, self.ownership_period_months, {
+            name: costs[name] for name in
+            ('home_value', 'home_ownership_pct', 'direct', 'indirect', 'total_direct', 'total_indirect')
+        })
+        indirect_cost_schedule = Schedule(self.start_date, self.ownership_period_months, {
+            'homeowners_insurance': costs['homeowners_insurance'],
+            'property_tax': costs['property_tax'],
+            'interest': costs['interest'],
+            'fees': costs['fees'],
+            'total': costs['indirect'],
+        })
+        return schedule, indirect_cost_schedule
+
+    def _update_schedule(self, changed):
+        """
+        Recompute only the indirect costs that depend on {changed} and the running totals, sharing every other column
+        with the current schedule. The mortgage isn't touched
+        """
+        cache = housing_sim.cache.get_default_cache()
+        previous_indirect = self.indirect_cost_schedule
+        if previous_indirect is None:
+            previous_indirect = cache.get(self._indirect_cost_cache_key(self._schedule_key))
+        self.indirect_cost_schedule = None
+        if previous_indirect is None or not changed <= set(PARAMETER_COLUMNS):
+            return None
+
+        # An equivalent home may have been computed already
+        key = self.cache_key()
+        schedule = cache.get(key)
+        if schedule is not None:
+            self.indirect_cost_schedule = cache.get(self._indirect_cost_cache_key(key))
+            return schedule
+
+        columns = set(column for name in changed for column in PARAMETER_COLUMNS[name])
+        instrumentation.count('home.updated_columns', len(columns))
+        with instrumentation.span('home.update'):
+            home_value = np.asarray(self.schedule['home_value'], dtype=float)
+            if 'home_value' in columns:
+                home_value = self.purchase_price * appreciation_factors(self.appreciation_rate, self.ownership_period_months)
+            breakdown = {name: np.asarray(previous_indirect[name], dtype=float) for name in ('homeowners_insurance', 'property_tax', 'interest', 'fees')}
+            if 'homeowners_insurance' in columns:
+                breakdown['homeowners_insurance'] = homeowners_insurance_costs(home_value, self.homeowners_insurance_rate)
+            if 'property_tax' in columns:
+                breakdown['property_tax'] = property_tax_costs(home_value, self.start_date, self.property_tax_rate)
+            if 'fees' in columns:
+                breakdown['fees'] = fee_costs(
+                    self.purchase_price, self.closing_cost_rate, self.title_insurance_rate, home_value.shape
+                )
+            indirect = indirect_costs(
+                breakdown['homeowners_insurance'], breakdown['property_tax'], breakdown['fees'], breakdown['interest']
+            )
+            total_indirect = np.cumsum(indirect)
+
+        schedule = self.schedule.replace(home_value=home_value, indirect=indirect, total_indirect=total_indirect)
+        self.indirect_cost_schedule = previous_indirect.replace(total=indirect, **breakdown)
+        cache.put(key, schedule)
+        cache.put(self._indirect_cost_cache_key(key), self.indirect_cost_schedule)
+        return schedule
+
+    def _indirect_cost_cache_key(self, home_key=None):
+        return housing_sim.cache.cache_key('indirect_costs', home=self.cache_key() if home_key is None else home_key)
+
+    def get_indirect_cost_schedule(self):
+        if self._changed_parameters:
+            self.get_schedule()
+        if self.indirect_cost_schedule is None:
+            self.indirect_cost_schedule = housing_sim.cache.get_default_cache().get_or_compute(
+                self._indirect_cost_cache_key(), lambda: self._compute_schedules()[1]
+            )
+        return self.indirect_cost_schedule
 
     def get_indirect_cost_data(self):
-        self.get_data()
-        return self.indirect_cost_data.copy()
+        return self.get_indirect_cost_schedule().to_frame(['homeowners_insurance', 'property_tax', 'interest', 'fees', 'total'])
+
+    @property
+    def indirect_cost_data(self):
+        """
+        DataFrame of the indirect cost breakdown, or None if it hasn't been generated yet
+        """
+        if self._changed_parameters:
+            self.get_schedule()
+        if self.indirect_cost_schedule is None:
+            return None
+        return self.get_indirect_cost_data()
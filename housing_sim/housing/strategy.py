@@ -0,0 +1,368 @@
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+from housing_sim.housing.cost_curves import home_costs
+from housing_sim.mortgage.amortization import PAID_OFF_BALANCE, amortize, fixed_payment
+
+# total_interest: interest paid within the horizon plus refinance closing costs, lower is better
+# net_position: equity minus everything paid, plus what unspent cash earned, at the end of the horizon, higher is better
+OBJECTIVES = ('total_interest', 'net_position')
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+class SearchResult(object):
+    """
+    Outcome of a strategy search
+
+    Attributes:
+        best (DataFrame): the best strategies, best first
+        baseline (dict): outcomes of keeping the mortgage as it is, with no extra payments
+        candidates (int): strategies in the search space
+        evaluated (int): strategies that were amortized
+        pruned (int): strategies skipped because they provably couldn't beat another one
+        seconds (float): time taken
+    """
+
+    def __init__(self, best, baseline, candidates, evaluated, seconds):
+        self.best = best
+        self.baseline = baseline
+        self.candidates = candidates
+        self.evaluated = evaluated
+        self.pruned = candidates - evaluated
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "SearchResult({} candidates, {} evaluated, {} pruned, {:.2f} s)".format(
+            self.candidates, self.evaluated, self.pruned, self.seconds)
+
+
+class StrategyOptimizer(object):
+    """
+    Searches prepayment schedules and refinance offers for a SimpleHome bought with a SimpleFixedRateMortgage.
+
+    Candidates are amortized together in (candidates x months) blocks with housing_sim.mortgage.amortization, so no
+    mortgage objects are built per strategy. Extra principal counts both as paid and towards equity, unlike the
+    DownPayableFixedRateMortgage schedule, whose pct_paid only counts scheduled principal.
+
+    Every month the owner has the scheduled payment plus {budget} available. Whatever isn't paid to the lender,
+    including a lower payment after refinancing, is invested at {investment_return} and its gains count towards
+    net_position, which is what makes prepaying a trade-off rather than always best.
+
+    Candidates that are provably no better than another are pruned before they are amortized:
+        - prepayment schedules paying less, later or for shorter than another, whenever the objective can only
+          improve with more extra principal
+        - refinance offers with the same rate and term but higher closing costs, and for total_interest without
+          extra payments, offers with a higher rate and higher costs than another
+        - for total_interest, refinance months whose interest paid so far plus closing costs already exceeds the
+          best strategy found
+
+    Example:
+        >> optimizer = StrategyOptimizer(my_home, investment_return=0.05)
+        >> optimizer.search_prepayments(budget=500).best
+        >> optimizer.search_refinance(offer_grid([0.03, 0.035], [0.0, 0.01, 0.02], [180, 360])).best
+    """
+
+    def __init__(self, home, investment_return=0.0, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            home (SimpleHome): the home, its mortgage must be a SimpleFixedRateMortgage. Its ownership period is the
+                horizon over which strategies are compared
+            investment_return (float): yearly return on cash not paid to the lender, e.g. 0.05
+            chunk_size (int): candidates amortized at once
+        """
+        mortgage = home.mortgage
+        assert home.ownership_period_months <= mortgage.loan_period_months, \
+            "The ownership period can't be longer than the mortgage."
+        self.horizon = home.ownership_period_months
+        self.loan_period_months = mortgage.loan_period_months
+        self.loan_amount = float(mortgage.loan_amount)
+        self.interest_rate = float(mortgage.interest_rate)
+        self.payment = float(fixed_payment(self.loan_amount, self.interest_rate / 12, self.loan_period_months))
+        self.purchase_price = float(home.purchase_price)
+        self.down_payment_pct = float(mortgage.down_payment_pct)
+        self.down_payment = float(mortgage.home_purchase_price * mortgage.down_payment_pct)
+        self.appreciation_rate = float(home.appreciation_rate)
+        self.investment_return = investment_return
+        self.chunk_size = chunk_size
+
+        # Home costs that don't depend on the mortgage
+        no_mortgage = np.zeros(self.horizon)
+        costs = home_costs(
+            self.purchase_price, self.down_payment_pct, no_mortgage, no_mortgage, no_mortgage, home.start_date,
+            appreciation_rate=home.appreciation_rate,
+            homeowners_insurance_rate=home.homeowners_insurance_rate,
+            property_tax_rate=home.property_tax_rate,
+            closing_cost_rate=home.closing_cost_rate,
+            title_insurance_rate=home.title_insurance_rate,
+        )
+        self.final_home_value = float(costs['home_value'][-1])
+        self.other_indirect = float(
+            costs['homeowners_insurance'].sum() + costs['property_tax'].sum() + costs['fees'].sum()
+        )
+        # Growth of a dollar invested at the end of every month, up to the end of the horizon
+        self.investment_growth = np.power(1 + investment_return / 12, np.arange(self.horizon)[::-1])
+
+    def _outcomes(self, principal, extra_principal, interest, budget, closing_costs=0.0, closing_month=None):
+        """
+        Outcomes of (candidates x months) amortized mortgages at the end of the horizon
+
+        Args:
+            budget (float or np.array): extra cash available every month, on top of the original payment
+            closing_costs (float or np.array): one-time refinance costs, one per candidate
+            closing_month (np.array): month the closing costs are paid, one per candidate
+
+        Returns: dict of np.array, one value per candidate
+        """
+        paid = principal.sum(axis=-1) + extra_principal.sum(axis=-1)
+        total_interest = interest.sum(axis=-1)
+        ownership_pct = self.down_payment_pct + (1 - self.down_payment_pct) * paid / self.loan_amount
+        equity = self.final_home_value * ownership_pct
+        # As in home_costs, the down payment replaces the first month's scheduled principal. Extra principal paid that
+        # month is still paid, and counts towards equity
+        total_direct = self.down_payment + paid - principal[..., 0]
+        net_position = equity - total_direct - (self.other_indirect + total_interest + closing_costs)
+
+        if self.investment_return:
+            unspent = (self.payment + np.asarray(budget, dtype=float)) - (principal + extra_principal + interest)
+            gains = (unspent * (self.investment_growth - 1)).sum(axis=-1)
+            if closing_month is not None:
+                gains = gains - closing_costs * (self.investment_growth[closing_month] - 1)
+            net_position = net_position + gains
+
+        return {
+            'total_interest': total_interest,
+            'closing_costs': np.broadcast_to(closing_costs, total_interest.shape),
+            'net_position': net_position,
+        }
+
+    @staticmethod
+    def _score(outcomes, objective):
+        """
+        Lower is better
+        """
+        if objective == 'total_interest':
+            return outcomes['total_interest'] + outcomes['closing_costs']
+        return -outcomes['net_position']
+
+    def baseline(self):
+        """
+        Outcomes of keeping the mortgage as it is, with no extra payments
+
+        Returns: dict of floats, see _outcomes
+        """
+        principal, extra_principal, interest, _ = amortize(
+            self.loan_amount, self.interest_rate / 12, self.payment, np.zeros(self.horizon)
+        )
+        return {name: float(value) for name, value in self._outcomes(principal, extra_principal, interest, 0.0).items()}
+
+    def _more_prepayment_is_better(self, objective):
+        # Extra principal never increases interest, and for net position each prepaid dollar earns the mortgage rate
+        # and becomes equity worth at least a dollar, while investing it earns less
+        if objective == 'total_interest':
+            return True
+        return self.investment_return <= self.interest_rate and self.appreciation_rate >= 0
+
+    def search_prepayments(self, budget, amounts=None, starts=None, stops=None, objective='net_position', top=10):
+        """
+        Search extra-payment schedules that pay a constant {amount} every month from {start} until {stop}
+
+        Args:
+            budget (float): most extra principal that can be paid in a month
+            amounts (iterable of floats): extra payments to try, at most {budget}. If None, 0 to {budget} in tenths
+            starts (iterable of ints): first months to try. If None, every year of the horizon
+            stops (iterable of ints): months to stop before. If None, every year of the horizon and its end
+            objective (str): one of OBJECTIVES
+            top (int): how many of the best strategies to return
+
+        Returns: SearchResult, best strategies with columns 'amount', 'start', 'stop', 'total_interest',
+            'closing_costs', 'net_position'
+        """
+        assert objective in OBJECTIVES, "objective must be one of {}".format(OBJECTIVES)
+        started = time.perf_counter()
+        amounts = np.linspace(0, budget, 11) if amounts is None else np.asarray(amounts, dtype=float)
+        assert (amounts <= budget).all(), "Extra payments can't exceed the budget"
+        starts = np.arange(0, self.horizon, 12) if starts is None else np.asarray(starts, dtype=int)
+        stops = np.append(np.arange(12, self.horizon, 12), self.horizon) if stops is None else np.asarray(stops, dtype=int)
+
+        # Every (amount, start, stop) with something to pay, and no extra payments at all once
+        amount, start, stop = [axis.ravel() for axis in np.meshgrid(amounts[amounts > 0], starts, stops, indexing='ij')]
+        keep = start < stop
+        amount, start, stop = np.append(amount[keep], 0.0), np.append(start[keep], 0), np.append(stop[keep], 0)
+        num_candidates = len(amount)
+
+        if self._more_prepayment_is_better(objective):
+            keep = ~_dominated_steps(amount, start, stop)
+            amount, start, stop = amount[keep], start[keep], stop[keep]
+
+        months = np.arange(self.horizon)
+        outcomes = {name: np.empty(len(amount)) for name in ('total_interest', 'closing_costs', 'net_position')}
+        for begin in range(0, len(amount), self.chunk_size):
+            end = begin + self.chunk_size
+            extra = amount[begin:end, np.newaxis] * ((months >= start[begin:end, np.newaxis]) &
+                                                    (months < stop[begin:end, np.newaxis]))
+            principal, extra_principal, interest, _ = amortize(
+                self.loan_amount, self.interest_rate / 12, self.payment, extra
+            )
+            for name, values in self._outcomes(principal, extra_principal, interest, budget).items():
+                outcomes[name][begin:end] = values
+
+        frame = pd.DataFrame(dict({'amount': amount, 'start': start, 'stop': stop}, **outcomes))
+        best = frame.iloc[np.argsort(self._score(outcomes, objective), kind='stable')[:top]].reset_index(drop=True)
+        return SearchResult(best, self.baseline(), num_candidates, len(amount), time.perf_counter() - started)
+
+    def search_refinance(self, offers, months=None, extra_payment=0.0, objective='total_interest', top=10):
+        """
+        Search refinance month x offer combinations. The remaining balance is refinanced into a new fixed-rate loan,
+        and the closing costs are paid in cash that month
+
+        Args:
+            offers (DataFrame or iterable of tuples): 'rate', 'closing_cost' as a fraction of the refinanced balance and
+                'term' in months, where a term of 0 keeps the remaining term. See offer_grid
+            months (iterable of ints): months to try refinancing in. If None, every month of the horizon after the first
+            extra_payment (float or iterable of floats): extra principal paid every month, before and after refinancing
+            objective (str): one of OBJECTIVES
+            top (int): how many of the best strategies to return
+
+        Returns: SearchResult, best strategies with columns 'month', 'rate', 'closing_cost', 'term', 'payment',
+            'total_interest', 'closing_costs', 'net_position'
+        """
+        assert objective in OBJECTIVES, "objective must be one of {}".format(OBJECTIVES)
+        started = time.perf_counter()
+        offers = pd.DataFrame(offers, columns=['rate', 'closing_cost', 'term']) if not isinstance(offers, pd.DataFrame) else offers
+        months = np.arange(1, self.horizon) if months is None else np.asarray(months, dtype=int)
+        extra_payment = np.resize(np.asarray(extra_payment, dtype=float), self.horizon)
+        num_candidates = len(offers) * len(months)
+
+        # The mortgage as it is, which every refinance follows until its month
+        base_principal, base_extra, base_interest, base_balance = amortize(
+            self.loan_amount, self.interest_rate / 12, self.payment, extra_payment
+        )
+        baseline = self._outcomes(base_principal, base_extra, base_interest, 0.0)
+
+        rate, closing_cost, term = [offers[name].to_numpy(dtype=float) for name in ('rate', 'closing_cost', 'term')]
+        keep = ~_dominated_offers(rate, closing_cost, term, by_rate=objective == 'total_interest' and not extra_payment.any())
+        rate, closing_cost, term = rate[keep], closing_cost[keep], term[keep]
+
+        # Every (month, offer), skipping months after the loan is paid off
+        month, offer = [axis.ravel() for axis in np.meshgrid(months, np.arange(len(rate)), indexing='ij')]
+        balance = base_balance[month - 1]
+        keep = balance >= PAID_OFF_BALANCE
+        month, offer, balance = month[keep], offer[keep], balance[keep]
+        rate, closing_cost, term = rate[offer], closing_cost[offer], term[offer]
+        term = np.where(term > 0, term, self.loan_period_months - month)
+        costs = closing_cost * balance
+
+        order = np.arange(len(month))
+        bound = None
+        if objective == 'total_interest':
+            # No refinance can pay less than the interest paid before it, its closing costs and one month of interest
+            bound = np.cumsum(base_interest)[month - 1] + costs + balance * rate / 12
+            order = np.argsort(bound, kind='stable')
+
+        best_score = float(self._score(baseline, objective))
+        results = []
+        evaluated = 0
+        for begin in range(0, len(order), self.chunk_size):
+            chunk = order[begin:begin + self.chunk_size]
+            if bound is not None:
+                chunk = chunk[bound[chunk] < best_score]
+                if len(chunk) == 0:
+                    break
+            outcomes, payment = self._refinance(chunk, month, rate, term, balance, costs, extra_payment,
+                                                base_principal, base_extra, base_interest)
+            best_score = min(best_score, float(self._score(outcomes, objective).min()))
+            evaluated += len(chunk)
+            results.append(pd.DataFrame(dict({
+                'month': month[chunk],
+                'rate': rate[chunk],
+                'closing_cost': closing_cost[chunk],
+                'term': term[chunk].astype(int),
+                'payment': payment,
+            }, **outcomes)))
+
+        frame = pd.concat(results, ignore_index=True) if results else pd.DataFrame(
+            columns=['month', 'rate', 'closing_cost', 'term', 'payment', 'total_interest', 'closing_costs', 'net_position'])
+        scores = self._score({name: frame[name].to_numpy() for name in ('total_interest', 'closing_costs', 'net_position')}, objective)
+        best = frame.iloc[np.argsort(scores, kind='stable')[:top]].reset_index(drop=True)
+        return SearchResult(best, {name: float(value) for name, value in baseline.items()}, num_candidates, evaluated,
+                            time.perf_counter() - started)
+
+    def _refinance(self, chunk, month, rate, term, balance, costs, extra_payment, base_principal, base_extra, base_interest):
+        """
+        Amortize a chunk of refinance candidates over the horizon
+
+        Returns: (outcomes, new monthly payments)
+        """
+        month, rate, term, balance, costs = month[chunk], rate[chunk], term[chunk], balance[chunk], costs[chunk]
+        months = np.arange(self.horizon)
+        # Months since refinancing, negative before it
+        since = months - month[:, np.newaxis]
+        after = since >= 0
+        new_index = np.clip(since, 0, None)
+
+        payment = fixed_payment(balance, rate / 12, term)
+        # The extra payments still to come, from the new loan's first month
+        shifted = months + month[:, np.newaxis]
+        new_extra = np.where(shifted < self.horizon, extra_payment[np.minimum(shifted, self.horizon - 1)], 0.0)
+        new_principal, new_extra_principal, new_interest, _ = amortize(balance, rate / 12, payment, new_extra)
+
+        def combine(base, new):
+            return np.where(after, np.take_along_axis(new, new_index, axis=-1), base)
+
+        outcomes = self._outcomes(
+            combine(base_principal, new_principal),
+            combine(base_extra, new_extra_principal),
+            combine(base_interest, new_interest),
+            extra_payment, costs, month
+        )
+        return outcomes, payment
+
+
+def offer_grid(rates, closing_costs, terms=(0,)):
+    """
+    Every combination of refinance rate, closing cost and term, as offers for StrategyOptimizer.search_refinance
+
+    Returns: DataFrame with columns 'rate', 'closing_cost', 'term'
+    """
+    return pd.DataFrame(list(itertools.product(rates, closing_costs, terms)), columns=['rate', 'closing_cost', 'term'])
+
+
+def _dominated_steps(amount, start, stop):
+    """
+    Mask of step schedules paying no more, no earlier and for no longer than another one, with at least one difference
+
+    Works on a table of the largest stop for every (amount, start), cumulated towards larger amounts and earlier
+    starts, so it is linear in the number of schedules rather than quadratic.
+    """
+    amount_levels, amount_index = np.unique(amount, return_inverse=True)
+    start_levels, start_index = np.unique(start, return_inverse=True)
+    largest_stop = np.full((len(amount_levels), len(start_levels)), -1)
+    np.maximum.at(largest_stop, (amount_index, start_index), stop)
+    # Largest stop of any schedule paying at least as much, from no later
+    reach = np.maximum.accumulate(largest_stop[::-1], axis=0)[::-1]
+    reach = np.maximum.accumulate(reach, axis=1)
+
+    # ...paying strictly more, or starting strictly earlier
+    padded = np.pad(reach, ((0, 1), (1, 0)), constant_values=-1)
+    more = padded[amount_index + 1, start_index + 1]
+    earlier = padded[amount_index, start_index]
+    same_cell_longer = largest_stop[amount_index, start_index] > stop
+    return (more >= stop) | (earlier >= stop) | same_cell_longer
+
+
+def _dominated_offers(rate, closing_cost, term, by_rate):
+    """
+    Mask of offers with the same term as another, the same rate (or, if {by_rate}, no lower rate), and no lower
+    closing cost, with at least one difference
+    """
+    # Rows are the offers tested, columns the offers they are compared with
+    other_rate, other_cost = rate[np.newaxis, :], closing_cost[np.newaxis, :]
+    rate, closing_cost = rate[:, np.newaxis], closing_cost[:, np.newaxis]
+    better_rate = other_rate <= rate if by_rate else other_rate == rate
+    better = (term[:, np.newaxis] == term[np.newaxis, :]) & better_rate & (other_cost <= closing_cost)
+    strictly = (other_rate < rate) | (other_cost < closing_cost)
+    return (better & strictly).any(axis=1)
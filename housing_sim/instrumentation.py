@@ -0,0 +1,200 @@
+import contextlib
+import json
+import threading
+import time
+
+import pandas as pd
+
+# Opt-in timing spans and counters for the simulation pipeline.
+#
+# Nothing is recorded unless a collect() block is active. Outside of one, span() hands back a shared no-op
+# context manager and count() returns immediately, so the hooks left in the models cost next to nothing.
+#
+# Example:
+#     >> with instrumentation.collect() as report:
+#     ..     SimpleHome(300000, mortgage).get_data()
+#     >> report.to_frame()
+#     >> report.to_csv('sweep_profile.csv')
+
+_lock = threading.Lock()
+_reports = []  # active reports, innermost last. Every active report records everything
+
+
+class Report(object):
+    """
+    What was recorded during a collect() block
+
+    Attributes:
+        spans (dict): span name -> {'calls', 'total', 'min', 'max'} in seconds
+        counters (dict): counter name -> total amount
+        profile (pstats.Stats): cProfile statistics if collect(profile=True), else None
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self.profile = None
+        self.wall_time = None
+
+    def add_span(self, name, seconds):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = {'calls': 1, 'total': seconds, 'min': seconds, 'max': seconds}
+        else:
+            span['calls'] += 1
+            span['total'] += seconds
+            span['min'] = min(span['min'], seconds)
+            span['max'] = max(span['max'], seconds)
+
+    def add(self, name, amount):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self):
+        return {'wall_time': self.wall_time, 'spans': self.spans, 'counters': self.counters}
+
+    def to_frame(self):
+        """
+        One row per span (sorted by total time) followed by one row per counter
+
+        Columns: 'kind', 'name', 'calls', 'total_s', 'mean_s', 'min_s', 'max_s', 'value'
+        """
+        rows = [
+            ('span', name, span['calls'], span['total'], span['total'] / span['calls'], span['min'], span['max'], None)
+            for name, span in sorted(self.spans.items(), key=lambda item: -item[1]['total'])
+        ]
+        rows += [('counter', name, None, None, None, None, None, value) for name, value in sorted(self.counters.items())]
+        return pd.DataFrame(rows, columns=['kind', 'name', 'calls', 'total_s', 'mean_s', 'min_s', 'max_s', 'value'])
+
+    def to_json(self, path=None):
+        """
+        The report as JSON, written to {path} if given
+
+        Returns: JSON str
+        """
+        text = json.dumps(self.to_dict(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as json_file:
+                json_file.write(text)
+        return text
+
+    def to_csv(self, path=None):
+        """
+        The to_frame table as CSV, written to {path} if given
+
+        Returns: CSV str
+        """
+        text = self.to_frame().to_csv(index=False)
+        if path is not None:
+            with open(path, 'w', newline='') as csv_file:
+                csv_file.write(text)
+        return text
+
+    def print_profile(self, sort='cumulative', limit=25):
+        """
+        Print the cProfile statistics of a collect(profile=True) block
+        """
+        assert self.profile is not None, "collect(profile=True) to capture a profile"
+        self.profile.sort_stats(sort).print_stats(limit)
+
+
+class _Span(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        with _lock:
+            for report in _reports:
+                report.add_span(self.name, seconds)
+        return False
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def enabled():
+    """
+    Whether anything is being recorded, to skip measurements that are expensive to take
+    """
+    return bool(_reports)
+
+
+def span(name):
+    """
+    Context manager that times the code inside it as one call of span {name}
+    """
+    if not _reports:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def count(name, amount=1):
+    """
+    Add {amount} to counter {name}
+    """
+    if not _reports:
+        return
+    with _lock:
+        for report in _reports:
+            report.add(name, amount)
+
+
+@contextlib.contextmanager
+def collect(profile=False):
+    """
+    Record every span and counter, from any thread, while the block runs
+
+    Blocks can be nested, every active report records everything.
+
+    Args:
+        profile (bool): also run cProfile over the block, see Report.print_profile
+
+    Yields: Report, filled in as the block runs
+    """
+    report = Report()
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    with _lock:
+        _reports.append(report)
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            import pstats
+            report.profile = pstats.Stats(profiler)
+        report.wall_time = time.perf_counter() - start
+        with _lock:
+            _reports.remove(report)
+
+
+def profile(func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) under collect(profile=True), e.g. profile(home.get_data)
+
+    Returns: (func's result, Report)
+    """
+    with collect(profile=True) as report:
+        result = func(*args, **kwargs)
+    return result, report
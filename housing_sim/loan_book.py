@@ -0,0 +1,350 @@
+import os
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from housing_sim import instrumentation
+from housing_sim.mortgage.batch import FixedRateMortgageBatch
+from housing_sim.timeline import first_month, get_timeline
+
+# Columns of a loan book file. Only the required ones must be present
+REQUIRED_COLUMNS = ('interest_rate', 'purchase_price', 'down_payment_pct')
+OPTIONAL_COLUMNS = ('loan_id', 'loan_period_months', 'start_date', 'extra_payment')
+
+# Monthly (loans x months) outputs, one .npy file each
+SCHEDULE_COLUMNS = ('principal', 'extra_principal', 'interest', 'balance')
+SUMMARY_COLUMNS = ('loan_amount', 'monthly_payment', 'total_interest', 'total_paid', 'payoff_month')
+# Book-wide monthly totals by calendar month
+CASH_FLOW_COLUMNS = ('principal', 'extra_principal', 'interest', 'balance', 'active_loans')
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def count_loans(path):
+    """
+    Number of loans in a CSV or Parquet loan book, without reading it into memory
+
+    CSV rows are counted by parsing the first column with the same reader as read_loan_chunks, so quoted newlines
+    and blank lines count the same way they are read
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetFile(path).metadata.num_rows
+    return sum(len(chunk) for chunk in _read_csv_chunks(path, DEFAULT_CHUNK_SIZE, usecols=[0]))
+
+
+def read_loan_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a CSV or Parquet loan book {chunk_size} loans at a time
+
+    Yields: DataFrame of up to {chunk_size} loans
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        for chunk in _read_csv_chunks(path, chunk_size):
+            yield chunk
+
+
+def _read_csv_chunks(path, chunk_size, **kwargs):
+    # An empty file has no loans rather than no columns
+    try:
+        chunks = pd.read_csv(path, chunksize=chunk_size, **kwargs)
+    except pd.errors.EmptyDataError:
+        return
+    with chunks:
+        for chunk in chunks:
+            yield chunk
+
+
+class LoanBookSimulation(object):
+    """
+    Projects every loan of a loan book too big for memory, streaming it through in chunks.
+
+    Each chunk of loans is amortized in one vectorized pass (see FixedRateMortgageBatch) on a worker process, which
+    writes the monthly schedules straight into memory-mapped .npy files and returns only per-loan summaries and the
+    chunk's monthly cash flow totals. At most 2 chunks per worker are in flight, so memory stays the same no matter
+    how many loans the book has.
+
+    The loan book is a CSV or Parquet file with the columns
+        'interest_rate', 'purchase_price', 'down_payment_pct' (required)
+        'loan_id', 'loan_period_months', 'start_date', 'extra_payment' (optional, monthly extra principal)
+    Blank optional cells take the same defaults as a missing column: start_date, loan_period_months and no extra
+    payment
+
+    Outputs in {out_dir}:
+        {column}.npy: (loans x months) schedule for every column in {schedule_columns}, month 0 is each
+            loan's first month and rows are in book order
+        summary.csv or summary.parquet: one row per loan, see SUMMARY_COLUMNS
+        cash_flows.csv: book-wide totals for every calendar month, see CASH_FLOW_COLUMNS
+
+    Example:
+        >> book = LoanBookSimulation('loans.parquet', '.data/book', start_date=dt.date(2019, 1, 1))
+        >> cash_flows = book.run()
+        >> balances = np.load('.data/book/balance.npy', mmap_mode='r')
+    """
+
+    def __init__(self, path, out_dir, start_date=None, loan_period_months=360, num_months=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, dtype=np.float32, schedule_columns=SCHEDULE_COLUMNS,
+                 summary_format=None):
+        """
+        Args:
+            path (str): the loan book, .csv or .parquet
+            out_dir (str): where to write the outputs
+            start_date (datetime): start of loans without a 'start_date'. Required if the book has no such column or
+                blank cells in it
+            loan_period_months (int): term of loans without a 'loan_period_months'
+            num_months (int): months of schedule kept per loan. If None, {loan_period_months}
+            chunk_size (int): loans simulated at once
+            max_workers (int): number of worker processes, 0 to run inline and None for one per CPU
+            dtype: dtype of the schedule files, float32 halves their size
+            schedule_columns (iterable of str): schedules to write, any of SCHEDULE_COLUMNS. Empty for summaries
+                and cash flows only
+            summary_format (str): 'csv' or 'parquet'. If None, the same format as the loan book
+        """
+        assert set(schedule_columns) <= set(SCHEDULE_COLUMNS), "schedule_columns must be in {}".format(SCHEDULE_COLUMNS)
+        self.path = path
+        self.out_dir = out_dir
+        self.start_date = start_date
+        self.loan_period_months = loan_period_months
+        self.num_months = num_months or loan_period_months
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.dtype = np.dtype(dtype)
+        self.schedule_columns = tuple(schedule_columns)
+        self.summary_format = summary_format or ('parquet' if _is_parquet(path) else 'csv')
+
+    def schedule_path(self, column):
+        return os.path.join(self.out_dir, column + '.npy')
+
+    @property
+    def summary_path(self):
+        return os.path.join(self.out_dir, 'summary.' + self.summary_format)
+
+    @property
+    def cash_flow_path(self):
+        return os.path.join(self.out_dir, 'cash_flows.csv')
+
+    def run(self):
+        """
+        Simulate the whole book and write every output
+
+        Returns: DataFrame of the book's monthly cash flows, also written to cash_flows.csv
+            Columns: 'date' and CASH_FLOW_COLUMNS
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        num_loans = count_loans(self.path)
+        for column in self.schedule_columns:
+            # Allocate the files up front so workers can write their rows in place
+            np.lib.format.open_memmap(self.schedule_path(column), mode='w+', dtype=self.dtype,
+                                      shape=(num_loans, self.num_months)).flush()
+
+        cash_flows = _CashFlowAccumulator(self.num_months)
+        summary_writer = _SummaryWriter(self.summary_path, self.summary_format)
+        settings = {
+            'out_dir': self.out_dir,
+            'start_date': self.start_date,
+            'loan_period_months': self.loan_period_months,
+            'num_months': self.num_months,
+            'schedule_columns': self.schedule_columns,
+        }
+
+        def handle_result(result):
+            summary, chunk_cash_flows = result
+            summary_writer.write(summary)
+            cash_flows.add(*chunk_cash_flows)
+
+        try:
+            self._run(settings, handle_result)
+        finally:
+            summary_writer.close()
+
+        frame = cash_flows.to_frame()
+        frame.to_csv(self.cash_flow_path, index=False)
+        return frame
+
+    def _chunks(self):
+        offset = 0
+        for loans in read_loan_chunks(self.path, self.chunk_size):
+            yield offset, loans
+            offset += len(loans)
+
+    def _run(self, settings, handle_result):
+        """
+        Run every chunk, inline or on a process pool, keeping at most 2 chunks per worker in flight
+        """
+        if self.max_workers == 0:
+            for offset, loans in self._chunks():
+                handle_result(_simulate_chunk(settings, offset, loans))
+            return
+
+        max_workers = self.max_workers or os.cpu_count()
+        max_in_flight = 2 * max_workers
+        # Imported here, multiprocessing would add more to housing_sim's import time than all of its own modules
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            in_flight = set()
+            for offset, loans in self._chunks():
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        handle_result(future.result())
+                in_flight.add(pool.submit(_simulate_chunk, settings, offset, loans))
+            for future in in_flight:
+                handle_result(future.result())
+
+
+def _loan_start_months(loans, start_date):
+    """
+    First month of every loan as months since 1970-01, see housing_sim.timeline.first_month. Loans without a start
+    date start on {start_date}
+    """
+    if 'start_date' not in loans:
+        assert start_date is not None, "The loan book has no 'start_date' column, so start_date is required"
+        return np.full(len(loans), first_month(start_date).astype(np.int64))
+    dates = pd.to_datetime(loans['start_date'])
+    if dates.isna().any():
+        assert start_date is not None, "Some loans have a blank 'start_date', so start_date is required"
+        dates = dates.fillna(pd.Timestamp(start_date))
+    return dates.values.astype('datetime64[M]').astype(np.int64) + (dates.dt.day.values != 1)
+
+
+def _simulate_chunk(settings, offset, loans):
+    """
+    Amortize one chunk of loans, write its schedules into the output files and summarize it
+
+    Returns: (summary DataFrame, (start months, cash flow totals by start month))
+    """
+    missing = set(REQUIRED_COLUMNS) - set(loans.columns)
+    assert not missing, "The loan book is missing the columns {}".format(sorted(missing))
+    num_months = settings['num_months']
+    # Blank optional cells get the same defaults as missing columns
+    terms = loans['loan_period_months'].fillna(settings['loan_period_months']).to_numpy(dtype=int) \
+        if 'loan_period_months' in loans else np.full(len(loans), settings['loan_period_months'])
+    extra_payment = loans['extra_payment'].fillna(0).to_numpy(dtype=float) if 'extra_payment' in loans \
+        else np.zeros(len(loans))
+    batch_months = int(terms.max())
+
+    with instrumentation.span('loan_book.amortize'):
+        batch = FixedRateMortgageBatch(
+            loans['interest_rate'].to_numpy(dtype=float),
+            loans['purchase_price'].to_numpy(dtype=float),
+            loans['down_payment_pct'].to_numpy(dtype=float),
+            terms,
+            extra_payment=np.broadcast_to(extra_payment[:, np.newaxis], (len(loans), batch_months)),
+        )
+        data = batch.get_data()
+        summary = batch.get_summary()
+    instrumentation.count('loan_book.loans', len(loans))
+
+    # Pad loans shorter than the kept months, truncate longer ones
+    schedules = {}
+    for name in SCHEDULE_COLUMNS:
+        values = data[name]
+        if values.shape[1] < num_months:
+            values = np.pad(values, ((0, 0), (0, num_months - values.shape[1])))
+        schedules[name] = values[:, :num_months]
+    active = data['active'][:, :num_months]
+    if active.shape[1] < num_months:
+        active = np.pad(active, ((0, 0), (0, num_months - active.shape[1])))
+    schedules['active_loans'] = active
+
+    with instrumentation.span('loan_book.write'):
+        for name in settings['schedule_columns']:
+            output = np.load(os.path.join(settings['out_dir'], name + '.npy'), mmap_mode='r+')
+            output[offset:offset + len(loans)] = schedules[name]
+            output.flush()
+            del output
+
+    # Loans starting in the same month add up month by month, so only one row per start month leaves the worker
+    start_months = _loan_start_months(loans, settings['start_date'])
+    order = np.argsort(start_months, kind='stable')
+    unique_starts, group_starts = np.unique(start_months[order], return_index=True)
+    totals = {
+        name: np.add.reduceat(schedules[name][order].astype(float), group_starts, axis=0)
+        for name in CASH_FLOW_COLUMNS
+    }
+
+    summary_frame = pd.DataFrame({
+        'loan_id': loans['loan_id'].to_numpy() if 'loan_id' in loans else np.arange(offset, offset + len(loans)),
+        'row': np.arange(offset, offset + len(loans)),
+    })
+    for name in SUMMARY_COLUMNS:
+        summary_frame[name] = summary[name]
+    return summary_frame, (unique_starts, totals)
+
+
+class _CashFlowAccumulator(object):
+    """
+    Book-wide monthly totals by calendar month, grown as loans with new start months arrive
+    """
+
+    def __init__(self, num_months):
+        self.num_months = num_months
+        self.first = None
+        self.totals = {name: np.zeros(0) for name in CASH_FLOW_COLUMNS}
+
+    def add(self, start_months, totals):
+        if len(start_months) == 0:
+            return
+        first = int(start_months.min()) if self.first is None else min(self.first, int(start_months.min()))
+        end = int(start_months.max()) + self.num_months
+        if self.first is not None:
+            end = max(end, self.first + len(self.totals[CASH_FLOW_COLUMNS[0]]))
+        for name in CASH_FLOW_COLUMNS:
+            grown = np.zeros(end - first)
+            if self.first is not None:
+                current = self.totals[name]
+                grown[self.first - first:self.first - first + len(current)] = current
+            self.totals[name] = grown
+        self.first = first
+
+        for i, start in enumerate(start_months):
+            position = int(start) - self.first
+            for name in CASH_FLOW_COLUMNS:
+                self.totals[name][position:position + self.num_months] += totals[name][i]
+
+    def to_frame(self):
+        length = len(self.totals[CASH_FLOW_COLUMNS[0]])
+        dates = get_timeline(np.datetime64(0 if self.first is None else self.first, 'M'), length).dates
+        frame = pd.DataFrame({'date': dates})
+        for name in CASH_FLOW_COLUMNS:
+            frame[name] = self.totals[name]
+        frame['active_loans'] = frame['active_loans'].astype(np.int64)
+        return frame
+
+
+class _SummaryWriter(object):
+    """
+    Appends per-loan summaries to a CSV or Parquet file as chunks finish, in whatever order they finish
+    """
+
+    def __init__(self, path, summary_format):
+        assert summary_format in ('csv', 'parquet'), "summary_format must be 'csv' or 'parquet'"
+        self.path = path
+        self.summary_format = summary_format
+        self.parquet_writer = None
+        self.wrote_header = False
+
+    def write(self, summary):
+        if self.summary_format == 'csv':
+            summary.to_csv(self.path, mode='a' if self.wrote_header else 'w', header=not self.wrote_header, index=False)
+            self.wrote_header = True
+            return
+        import pyarrow
+        import pyarrow.parquet
+        table = pyarrow.Table.from_pandas(summary, preserve_index=False)
+        if self.parquet_writer is None:
+            self.parquet_writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.parquet_writer.write_table(table)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
@@ -0,0 +1,2 @@
+from .adjustable_rate import AdjustableRateMortgage
+from .batch import FixedRateMortgageBatch
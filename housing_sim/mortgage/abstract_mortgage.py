@@ -1,6 +1,8 @@
 import numpy as np
 from dateutil.relativedelta import relativedelta
 
+import housing_sim.cache
+
 class AbstractMortgage(object):
     """
     Sets the standard for Mortgage data implementations to ensure it is all in a common format
@@ -48,11 +50,42 @@ class AbstractMortgage(object):
             'pct_paid': np.nan
         }
 
-        self.data = None
+        self.schedule = None
 
-    def get_data(self):
+    def get_schedule(self):
+        """
+        Get/Generate all the data as a read-only Schedule
+
+        Equivalent mortgages share one schedule through the process-wide cache in housing_sim.cache
+        """
+        if self.schedule is None:
+            self.schedule = housing_sim.cache.get_default_cache().get_or_compute(self.cache_key(), self._compute_schedule)
+        return self.schedule
+
+    def cache_key(self):
+        """
+        Canonical hash of every parameter that determines the schedule
+        """
+        pass
+
+    def _compute_schedule(self):
         pass
 
+    def get_data(self):
+        """
+        Get/Generate all the data as a DataFrame
+        """
+        return self.get_schedule().to_frame()
+
+    @property
+    def data(self):
+        """
+        DataFrame of the generated data, or None if it hasn't been generated yet
+        """
+        if self.schedule is None:
+            return None
+        return self.schedule.to_frame()
+
     @property
     def is_paid(self):
         return self.balance < 0.01
@@ -0,0 +1,211 @@
+import copy
+
+import numpy as np
+
+import housing_sim.cache
+from housing_sim import instrumentation
+from housing_sim.precision import get_default_precision
+from housing_sim.schedule import Schedule
+from .abstract_mortgage import AbstractMortgage
+from .amortization import amortize, fixed_payment
+
+
+class AdjustableRateMortgage(AbstractMortgage):
+    """
+    Mortgage with a fixed initial rate that then resets periodically to an index rate plus a margin, e.g. a 5/1 ARM
+
+    At every reset the rate moves to index + margin, limited by the caps: it can move at most {initial_cap} at the
+    first reset and {periodic_cap} at later ones, and always stays between {floor} and initial rate + {lifetime_cap}.
+    The payment is then recomputed to pay off the remaining balance over the remaining term.
+
+    The index is given as a (paths x months) matrix of simulated or historical rate paths, and every path is
+    amortized together: the loop runs over resets, not paths or months.
+
+    get_schedule returns the same columns as SimpleFixedRateMortgage for one path, so a SimpleHome can be built
+    on any path with for_path. get_path_data returns every path at once.
+
+    Example:
+        >> arm = AdjustableRateMortgage(0.035, index_paths, 300000, 0.2, start_date, 360)
+        >> arm.get_path_data()['interest'].sum(axis=1)  # total interest on every path
+        >> SimpleHome(300000, arm.for_path(17)).get_data()
+    """
+
+    def __init__(self, initial_rate, index_rates, home_purchase_price, down_payment_pct, loan_start_date, loan_period_months,
+                 margin=0.0275, fixed_period_months=60, reset_interval_months=12, initial_cap=0.02, periodic_cap=0.02,
+                 lifetime_cap=0.05, floor=None):
+        """
+        Args:
+            initial_rate (float): yearly interest rate during the fixed period, as a decimal, e.g. 0.035
+            index_rates (iterable or np.array): yearly index rate for every month, shape (months,) for a single path
+                or (paths, months). Paths longer than the loan are truncated
+            home_purchase_price (float): price of the home
+            down_payment_pct (float): the down payment percentage
+            loan_start_date (datetime.date): the start date of the mortgage
+            loan_period_months (int): the length of the loan in months
+            margin (float): added to the index at every reset
+            fixed_period_months (int): months before the first reset, e.g. 60 for a 5/1 ARM
+            reset_interval_months (int): months between resets, e.g. 12 for a 5/1 ARM
+            initial_cap (float): largest change at the first reset
+            periodic_cap (float): largest change at every later reset
+            lifetime_cap (float): largest increase over the initial rate
+            floor (float): lowest rate. If None, the margin
+        """
+        super(AdjustableRateMortgage, self).__init__(home_purchase_price, down_payment_pct, loan_start_date, loan_period_months)
+        index_rates = np.atleast_2d(np.asarray(index_rates, dtype=float))
+        assert index_rates.ndim == 2 and index_rates.shape[1] >= loan_period_months, \
+            "index_rates must have at least {} months".format(loan_period_months)
+        assert fixed_period_months >= 0, "fixed_period_months can't be negative"
+        assert reset_interval_months >= 1, "reset_interval_months must be at least 1"
+        self.initial_rate = initial_rate
+        self.interest_rate = initial_rate
+        self.index_rates = index_rates[:, :loan_period_months]
+        # Hashed once, so keys of many single-path views don't rehash every path
+        self.index_rates_key = housing_sim.cache.cache_key('index_rates', index_rates=self.index_rates)
+        self.num_paths = len(self.index_rates)
+        self.margin = margin
+        self.fixed_period_months = fixed_period_months
+        self.reset_interval_months = reset_interval_months
+        self.initial_cap = initial_cap
+        self.periodic_cap = periodic_cap
+        self.lifetime_cap = lifetime_cap
+        self.floor = margin if floor is None else floor
+        self.path = 0
+        self.path_data = None
+
+    def cache_key(self):
+        return housing_sim.cache.cache_key(
+            type(self).__name__,
+            initial_rate=self.initial_rate,
+            index_rates=self.index_rates_key,
+            home_purchase_price=self.home_purchase_price,
+            down_payment_pct=self.down_payment_pct,
+            start_date=self.start_date,
+            loan_period_months=self.loan_period_months,
+            margin=self.margin,
+            fixed_period_months=self.fixed_period_months,
+            reset_interval_months=self.reset_interval_months,
+            initial_cap=self.initial_cap,
+            periodic_cap=self.periodic_cap,
+            lifetime_cap=self.lifetime_cap,
+            floor=self.floor,
+            path=self.path,
+        )
+
+    def for_path(self, path):
+        """
+        The same mortgage whose schedule follows rate path {path}. Every path shares this mortgage's path data
+        """
+        self.get_path_data()
+        mortgage = copy.copy(self)
+        mortgage.path = path
+        mortgage.schedule = None
+        return mortgage
+
+    @property
+    def reset_months(self):
+        """
+        Indexes of the months in which the rate resets
+        """
+        return np.arange(self.fixed_period_months, self.loan_period_months, self.reset_interval_months)
+
+    def rate_paths(self):
+        """
+        Yearly interest rate of every month on every path, after caps and floors
+
+        Returns: np.array of shape (paths, months)
+        """
+        rates = np.full(self.index_rates.shape, float(self.initial_rate))
+        ceiling = self.initial_rate + self.lifetime_cap
+        current = rates[:, 0]
+        for reset, month in enumerate(self.reset_months):
+            cap = self.initial_cap if reset == 0 else self.periodic_cap
+            target = self.index_rates[:, month] + self.margin
+            current = np.clip(np.clip(target, current - cap, current + cap), self.floor, ceiling)
+            rates[:, month:] = current[:, np.newaxis]
+        return rates
+
+    def get_path_data(self):
+        """
+        Get/Generate every path as (paths x months) arrays
+
+        Keys:
+            'interest_rate': yearly rate of every month
+            'payment': scheduled monthly payment, recomputed at every reset
+            'principal'
+            'interest'
+            'total_principal'
+            'total_interest'
+            'balance'
+            'pct_paid'
+
+        Computed in double precision and stored in the default precision, see housing_sim.precision
+        """
+        if self.path_data is not None:
+            return self.path_data
+
+        instrumentation.count('mortgage.rows', self.num_paths * self.loan_period_months)
+        with instrumentation.span('mortgage.amortize'):
+            rates = self.rate_paths()
+            monthly_rates = rates / 12
+            principal = np.zeros(rates.shape)
+            interest = np.zeros(rates.shape)
+            payment = np.zeros(rates.shape)
+
+            # Rates are constant between resets, so each period between resets is a fixed-payment loan over the
+            # remaining term, amortized for every path at once
+            starts = np.concatenate([[0], self.reset_months])
+            ends = np.append(starts[1:], self.loan_period_months)
+            balance = np.full(self.num_paths, float(self.loan_amount))
+            for start, end in zip(starts, ends):
+                period_rate = monthly_rates[:, start]
+                period_payment = fixed_payment(balance, period_rate, self.loan_period_months - start)
+                period_principal, _, period_interest, period_balance = amortize(
+                    balance, period_rate, period_payment, np.zeros(end - start)
+                )
+                principal[:, start:end] = period_principal
+                interest[:, start:end] = period_interest
+                payment[:, start:end] = period_payment[:, np.newaxis]
+                balance = period_balance[:, -1]
+
+            total_principal = np.cumsum(principal, axis=1)
+            balance = self.loan_amount - total_principal
+
+        store = get_default_precision().store
+        self.path_data = {name: store(values) for name, values in {
+            'interest_rate': rates,
+            'payment': payment,
+            'principal': principal,
+            'interest': interest,
+            'total_principal': total_principal,
+            'total_interest': np.cumsum(interest, axis=1),
+            'balance': balance,
+            'pct_paid': 1 - (balance / self.loan_amount),
+        }.items()}
+        return self.path_data
+
+    def _compute_schedule(self):
+        """
+        Generate the data of path {path}, with the same columns as SimpleFixedRateMortgage
+
+        Columns:
+            'date'
+            'month'
+            'principal'
+            'interest'
+            'total_principal'
+            'total_interest'
+            'balance'
+            'pct_paid'
+        """
+        path_data = self.get_path_data()
+        return Schedule(self.start_date, self.loan_period_months, {
+            name: path_data[name][self.path].copy() for name in
+            ('principal', 'interest', 'total_principal', 'total_interest', 'balance', 'pct_paid')
+        })
+
+    @property
+    def initial_monthly_payment_size(self):
+        """
+        The payment during the fixed period
+        """
+        return float(fixed_payment(self.loan_amount, self.initial_rate / 12, self.loan_period_months))
@@ -0,0 +1,116 @@
+import numpy as np
+
+# Balances below this are treated as paid off (see AbstractMortgage.is_paid)
+PAID_OFF_BALANCE = 0.01
+
+
+def scheduled_balances(loan_amount, monthly_interest_rate, payment, extra_payment):
+    """
+    Balance at the start of every month if the loan were never paid off, i.e. the solution of
+
+    B[k+1] = B[k] * (1 + r) - (payment + extra[k])
+
+    A constant extra payment uses the annuity closed form. Any other schedule uses the discounted
+    form B[k] = (1+r)^k * (B[0] - sum_{j<k} (payment + extra[j]) / (1+r)^(j+1)), which is a single cumsum.
+
+    Args:
+        loan_amount (float or np.array): starting balance, one per scenario
+        monthly_interest_rate (float or np.array): monthly interest rate, one per scenario
+        payment (float or np.array): fixed monthly payment, one per scenario
+        extra_payment (np.array): extra principal paid each month, shape (months,) or (scenarios, months)
+
+    Returns: np.array of shape (..., months + 1)
+    """
+    extra_payment = np.asarray(extra_payment, dtype=float)
+    num_months = extra_payment.shape[-1]
+    loan_amount = np.asarray(loan_amount, dtype=float)[..., np.newaxis]
+    rate = np.asarray(monthly_interest_rate, dtype=float)[..., np.newaxis]
+    payment = np.asarray(payment, dtype=float)[..., np.newaxis]
+
+    months = np.arange(num_months + 1)
+    growth = np.power(1 + rate, months)
+
+    if np.all(extra_payment == extra_payment[..., :1]):
+        # Constant extra payment - plain annuity
+        outflow = payment + extra_payment[..., :1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annuity_factor = np.where(rate == 0, months, (growth - 1) / rate)
+        return loan_amount * growth - outflow * annuity_factor
+
+    # Arbitrary schedule - discount every payment back to month 0, then grow the remainder forward
+    discounted_outflow = (payment + extra_payment) / growth[..., 1:]
+    paid_to_date = np.zeros(np.broadcast(loan_amount, discounted_outflow).shape[:-1] + (num_months + 1,))
+    np.cumsum(discounted_outflow, axis=-1, out=paid_to_date[..., 1:])
+    return growth * (loan_amount - paid_to_date)
+
+
+def amortize(loan_amount, monthly_interest_rate, payment, extra_payment):
+    """
+    Amortize one or many fixed-payment loans with optional extra principal payments.
+
+    Matches DownPayableFixedRateMortgage's month-by-month rules: the last payment is capped at what is
+    owed, extra principal never overpays the loan, and every month after payoff is zero.
+
+    Args:
+        loan_amount (float or np.array): starting balance, one per scenario
+        monthly_interest_rate (float or np.array): monthly interest rate, one per scenario
+        payment (float or np.array): fixed monthly payment, one per scenario
+        extra_payment (np.array): extra principal paid each month, shape (months,) or (scenarios, months)
+            e.g. the output of housing_sim.utils.fit_to_array
+
+    Returns: (principal, extra_principal, interest, balance) arrays of shape (..., months)
+        balance is the remaining balance after each month's payment
+    """
+    extra_payment = np.asarray(extra_payment, dtype=float)
+    rate = np.asarray(monthly_interest_rate, dtype=float)[..., np.newaxis]
+    payment = np.asarray(payment, dtype=float)[..., np.newaxis]
+
+    balances = scheduled_balances(loan_amount, monthly_interest_rate, payment[..., 0], extra_payment)
+    start = balances[..., :-1]
+
+    # Same rules as a single month of the loop, applied to every month at once
+    interest = rate * start
+    paid = np.minimum(payment, start + interest)
+    principal = paid - interest
+    extra_principal = np.minimum(extra_payment, start - principal)
+    end = start - principal - extra_principal
+
+    # The loan is active until (and including) the first month that leaves less than a cent
+    paid_off = end < PAID_OFF_BALANCE
+    paid_off_before = (np.cumsum(paid_off, axis=-1) - paid_off) > 0
+    active = ~paid_off_before & (start[..., :1] >= PAID_OFF_BALANCE)
+
+    # After payoff the balance stays at whatever was left on the final payment
+    payoff_index = np.argmax(paid_off, axis=-1)[..., np.newaxis]
+    residual = np.where(
+        start[..., :1] < PAID_OFF_BALANCE,
+        start[..., :1],
+        np.take_along_axis(end, payoff_index, axis=-1)
+    )
+
+    principal = np.where(active, principal, 0.0)
+    extra_principal = np.where(active, extra_principal, 0.0)
+    interest = np.where(active, interest, 0.0)
+    balance = np.where(active, end, residual)
+    return principal, extra_principal, interest, balance
+
+
+def fixed_payment(loan_amount, monthly_interest_rate, num_months):
+    """
+    Fixed monthly payment that pays off a loan in exactly {num_months} months
+
+    r * P * (1+r)^N / ((1+r)^N - 1), or P / N for interest free loans
+
+    Args:
+        loan_amount (float or np.array): the loan principal
+        monthly_interest_rate (float or np.array): the monthly interest rate
+        num_months (int or np.array): the number of months
+
+    Returns: float or np.array of payments
+    """
+    loan_amount = np.asarray(loan_amount, dtype=float)
+    rate = np.asarray(monthly_interest_rate, dtype=float)
+    growth = np.power(1 + rate, num_months)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payment = np.where(rate == 0, loan_amount / num_months, loan_amount * rate * growth / (growth - 1))
+    return np.maximum(0, payment)
@@ -0,0 +1,157 @@
+import numpy as np
+
+from housing_sim.precision import get_default_precision
+from housing_sim.utils import fit_to_array
+from .amortization import amortize, fixed_payment
+
+
+class FixedRateMortgageBatch(object):
+    """
+    Many fixed-rate mortgages amortized together in one vectorized pass.
+
+    Every scenario is one row of a (scenarios x months) block, where months is the longest loan period.
+    Shorter loans are padded: the months after their term are masked out by 'active' and hold zeros for
+    principal/interest, a zero balance and pct_paid of 1.
+
+    Example:
+        >> batch = FixedRateMortgageBatch.from_grid([0.035, 0.0425], [250000, 300000], [0.1, 0.2], [180, 360])
+        >> batch.get_data()['interest'].shape
+        (16, 360)
+        >> batch.get_summary()['total_interest'].reshape(batch.grid_shape)
+    """
+
+    def __init__(self, yearly_interest_rate, home_purchase_price, down_payment_pct, loan_period_months, extra_payment=0):
+        """
+        Args:
+            yearly_interest_rate (float or iterable of floats): interest rate as a decimal, e.g. 0.04
+            home_purchase_price (float or iterable of floats): price of the home
+            down_payment_pct (float or iterable of floats): the down payment percentage
+            loan_period_months (int or iterable of ints): the length of the loan in months
+            extra_payment (float or np.array): extra principal paid each month, as in DownPayableFixedRateMortgage.
+                Either a single amount, a schedule shared by every scenario or a (scenarios, months) block. A shared
+                schedule that is too short is repeated, one that is too long is truncated.
+
+        All scenario parameters are broadcast against each other, so scalars apply to every scenario.
+        """
+        rate, price, down_payment, months = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(yearly_interest_rate, dtype=float)),
+            np.atleast_1d(np.asarray(home_purchase_price, dtype=float)),
+            np.atleast_1d(np.asarray(down_payment_pct, dtype=float)),
+            np.atleast_1d(np.asarray(loan_period_months, dtype=int)),
+        )
+        self.interest_rate = rate
+        self.home_purchase_price = price
+        self.down_payment_pct = down_payment
+        self.loan_period_months = months
+        self.loan_amount = price * (1 - down_payment)
+        self.num_scenarios = len(rate)
+        self.num_months = int(months.max())
+        self.grid_shape = (self.num_scenarios,)
+
+        extra_payment = np.asarray(extra_payment, dtype=float)
+        if extra_payment.ndim <= 1:
+            # Repeated or truncated to the loan period, like DownPayableFixedRateMortgage
+            extra_payment = fit_to_array(np.atleast_1d(extra_payment), self.num_months).astype(float)
+        self.extra_payment = extra_payment
+
+        self.data = None
+        self.summary = None
+
+    @classmethod
+    def from_grid(cls, yearly_interest_rate, home_purchase_price, down_payment_pct, loan_period_months, extra_payment=0):
+        """
+        Build a batch from the Cartesian product of every parameter
+
+        Scenarios are ordered like np.meshgrid(..., indexing='ij'), so any per-scenario result can be reshaped
+        with .reshape(batch.grid_shape) to index it as [rate, price, down payment, term].
+        """
+        axes = [np.atleast_1d(yearly_interest_rate), np.atleast_1d(home_purchase_price),
+                np.atleast_1d(down_payment_pct), np.atleast_1d(loan_period_months)]
+        grid = np.meshgrid(*axes, indexing='ij')
+        batch = cls(*[axis.ravel() for axis in grid], extra_payment=extra_payment)
+        batch.grid_shape = tuple(len(axis) for axis in axes)
+        return batch
+
+    @property
+    def fixed_monthly_payment_size(self):
+        """
+        The fixed monthly payment of every scenario
+        """
+        return fixed_payment(self.loan_amount, self.interest_rate / 12, self.loan_period_months)
+
+    def get_data(self):
+        """
+        Get/Generate all the data as (scenarios x months) arrays
+
+        Keys:
+            'principal'
+            'extra_principal'
+            'interest'
+            'total_principal': sum of the scheduled principal from start, without extra principal
+            'total_extra_principal'
+            'total_interest'
+            'balance': remaining balance after each month's payment, extra principal included. Unlike
+                DownPayableFixedRateMortgage's 'balance' column, which only subtracts the scheduled principal
+            'pct_paid'
+            'active': False for months after the loan's term or after it was paid off early
+
+        Everything is computed in double precision and stored in the default precision, see housing_sim.precision
+        """
+        if self.data is not None:
+            return self.data
+
+        principal, extra_principal, interest, balance = amortize(
+            self.loan_amount, self.interest_rate / 12, self.fixed_monthly_payment_size, self.extra_payment
+        )
+
+        # Mask the padding months of shorter loans
+        in_term = np.arange(self.num_months) < self.loan_period_months[:, np.newaxis]
+        principal = np.where(in_term, principal, 0.0)
+        extra_principal = np.where(in_term, extra_principal, 0.0)
+        interest = np.where(in_term, interest, 0.0)
+        balance = np.where(in_term, balance, 0.0)
+
+        loan_amount = self.loan_amount[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_paid = np.where(loan_amount > 0, 1 - balance / loan_amount, 1.0)
+
+        store = get_default_precision().store
+        self.data = {name: store(values) for name, values in {
+            'principal': principal,
+            'extra_principal': extra_principal,
+            'interest': interest,
+            'total_principal': np.cumsum(principal, axis=1),
+            'total_extra_principal': np.cumsum(extra_principal, axis=1),
+            'total_interest': np.cumsum(interest, axis=1),
+            'balance': balance,
+            'pct_paid': pct_paid,
+            'active': in_term & ((principal + extra_principal + interest) > 0),
+        }.items()}
+        return self.data
+
+    def get_summary(self):
+        """
+        Per-scenario summary, one entry per scenario
+
+        Keys:
+            'loan_amount'
+            'monthly_payment'
+            'total_interest': interest paid over the life of the loan
+            'total_paid': principal + interest paid over the life of the loan
+            'payoff_month': index of the month with the final payment
+        """
+        if self.summary is not None:
+            return self.summary
+
+        data = self.get_data()
+        total_interest = data['total_interest'][:, -1]
+        active = data['active']
+        last_active = self.num_months - 1 - np.argmax(active[:, ::-1], axis=1)
+        self.summary = {
+            'loan_amount': self.loan_amount,
+            'monthly_payment': self.fixed_monthly_payment_size,
+            'total_interest': total_interest,
+            'total_paid': data['total_principal'][:, -1] + data['total_extra_principal'][:, -1] + total_interest,
+            'payoff_month': np.where(active.any(axis=1), last_active, -1),
+        }
+        return self.summary
@@ -1,10 +1,11 @@
 import numpy as np
-import math
-from dateutil.relativedelta import relativedelta
 
+import housing_sim.cache
 import housing_sim.utils
-import utils
+from housing_sim import instrumentation
+from housing_sim.schedule import Schedule
 from .abstract_mortgage import AbstractMortgage
+from .amortization import amortize, fixed_payment
 
 class SimpleFixedRateMortgage(AbstractMortgage):
     """
@@ -15,9 +16,19 @@ class SimpleFixedRateMortgage(AbstractMortgage):
         super(SimpleFixedRateMortgage, self).__init__(*args, **kwargs)
         self.interest_rate = yearly_interest_rate
 
-    def get_data(self):
+    def cache_key(self):
+        return housing_sim.cache.cache_key(
+            type(self).__name__,
+            interest_rate=self.interest_rate,
+            home_purchase_price=self.home_purchase_price,
+            down_payment_pct=self.down_payment_pct,
+            start_date=self.start_date,
+            loan_period_months=self.loan_period_months,
+        )
+
+    def _compute_schedule(self):
         """
-        Get/Generate all the data
+        Generate all the data
 
         Columns:
             'date'
@@ -29,20 +40,20 @@ class SimpleFixedRateMortgage(AbstractMortgage):
             'balance'
             'pct_paid'
         """
-        if self.data is not None:
-            return self.data
-
-        self.data = housing_sim.utils.blank_monthly_df(self.start_date, self.loan_period_months, self.base_row_format)
-        rate = self.interest_rate / 12
-        calc_principal = lambda month: np.ppmt(rate, month+1, self.loan_period_months, self.loan_amount)
-        calc_interest = lambda month: np.ipmt(rate, month+1, self.loan_period_months, self.loan_amount)
-        self.data['principal'] = self.data['month'].apply(calc_principal) * -1
-        self.data['interest'] = self.data['month'].apply(calc_interest) * -1
-        self.data['total_principal'] = self.data['principal'].expanding(min_periods=1).sum()
-        self.data['total_interest'] = self.data['interest'].expanding(min_periods=1).sum()
-        self.data['balance'] = self.loan_amount - self.data['total_principal']
-        self.data['pct_paid'] = 1 - (self.data.balance / self.loan_amount)
-        return self.data
+        instrumentation.count('mortgage.rows', self.loan_period_months)
+        with instrumentation.span('mortgage.amortize'):
+            no_extra_payment = np.zeros(self.loan_period_months)
+            principal, _, interest, _ = amortize(self.loan_amount, self.interest_rate / 12, self.fixed_monthly_payment_size, no_extra_payment)
+        total_principal = np.cumsum(principal)
+        balance = self.loan_amount - total_principal
+        return Schedule(self.start_date, self.loan_period_months, {
+            'principal': principal,
+            'interest': interest,
+            'total_principal': total_principal,
+            'total_interest': np.cumsum(interest),
+            'balance': balance,
+            'pct_paid': 1 - (balance / self.loan_amount),
+        })
 
     @property
     def fixed_monthly_payment_size(self):
@@ -57,13 +68,7 @@ class SimpleFixedRateMortgage(AbstractMortgage):
         P: the loan principal
         N: the number of months
         """
-        r = self.interest_rate / 12
-        P = self.loan_amount
-        N = self.loan_period_months
-
-        top = r * pow(1 + r, N)
-        bottom = pow(1 + r, N) - 1
-        return max(0, P * top / bottom)
+        return float(fixed_payment(self.loan_amount, self.interest_rate / 12, self.loan_period_months))
 
 class DownPayableFixedRateMortgage(SimpleFixedRateMortgage):
     """
@@ -86,14 +91,32 @@ class DownPayableFixedRateMortgage(SimpleFixedRateMortgage):
         """
         super(DownPayableFixedRateMortgage, self).__init__(yearly_interest_rate, home_purchase_price, down_payment_pct, loan_start_date, loan_period_months)
         self.interest_rate = yearly_interest_rate
-        self.extra_payment = utils.fit_to_array(extra_payment, loan_period_months)
-
-    def get_data(self):
+        self.extra_payment = housing_sim.utils.fit_to_array(extra_payment, loan_period_months)
+
+    def cache_key(self):
+        return housing_sim.cache.cache_key(
+            type(self).__name__,
+            interest_rate=self.interest_rate,
+            home_purchase_price=self.home_purchase_price,
+            down_payment_pct=self.down_payment_pct,
+            start_date=self.start_date,
+            loan_period_months=self.loan_period_months,
+            extra_payment=self.extra_payment,
+        )
+
+    def get_schedule(self):
+        schedule = super(DownPayableFixedRateMortgage, self).get_schedule()
+        # The remaining balance after the last payment, including extra principal
+        self.balance = self.loan_amount - schedule['total_principal'][-1] - schedule['total_extra_principal'][-1]
+        return schedule
+
+    def _compute_schedule(self):
         """
-        Get/Generate all the data
+        Generate all the data
 
         Columns:
-            'date'
+            'date': first day of every month, from the first month starting on or after the start date, as for
+                SimpleFixedRateMortgage and the homes
             'month'
             'principal'
             'interest'
@@ -101,51 +124,30 @@ class DownPayableFixedRateMortgage(SimpleFixedRateMortgage):
             'total_interest'
             'balance'
             'pct_paid'
+            'extra_principal'
+            'total_extra_principal'
         """
-        if self.data is not None:
-            return self.data
-        row_format = self.base_row_format.copy()
-        row_format['extra_principal'] = np.nan
-
-        self.data = housing_sim.utils.blank_monthly_df(self.start_date, self.loan_period_months, row_format)
-        self._amortize()
-        self.data['total_principal'] = self.data['principal'].expanding(min_periods=1).sum()
-        self.data['total_extra_principal'] = self.data['extra_principal'].expanding(min_periods=1).sum()
-        self.data['total_interest'] = self.data['interest'].expanding(min_periods=1).sum()
-        self.data['balance'] = self.loan_amount - self.data['total_principal']
-        self.data['pct_paid'] = 1 - (self.data['balance'] / self.loan_amount)
-        return self.data
-
+        instrumentation.count('mortgage.rows', self.loan_period_months)
+        with instrumentation.span('mortgage.amortize'):
+            principal, extra_principal, interest, _ = self._amortize()
+
+        total_principal = np.cumsum(principal)
+        balance = self.loan_amount - total_principal
+        return Schedule(self.start_date, self.loan_period_months, {
+            'principal': principal,
+            'interest': interest,
+            'total_principal': total_principal,
+            'total_interest': np.cumsum(interest),
+            'balance': balance,
+            'pct_paid': 1 - (balance / self.loan_amount),
+            'extra_principal': extra_principal,
+            'total_extra_principal': np.cumsum(extra_principal),
+        })
 
     def _amortize(self):
-        payment = self.fixed_monthly_payment_size
-        month = 0
-        monthly_interest_rate = self.interest_rate/12
-
-        while month < self.loan_period_months:
-            if not self.is_paid:
-                # Get the (principal, interest) components for the next payment after months_passed
-                interest = monthly_interest_rate * self.balance
-                payment = min(payment, self.balance + interest)
-                principal = payment - interest
-
-                # Adjust for extra principal
-                extra_principal = min(self.extra_payment[month], self.balance - principal)
-                self.balance = self.balance - principal - extra_principal
-            else:
-                # Mortgage is paid off early
-                interest = 0
-                payment = 0,
-                principal = 0
-                extra_principal = 0
-
-            # Add data point
-            self.data.at[month, 'date'] = self.start_date + relativedelta(months=month)
-            self.data.at[month, 'month'] = month
-            self.data.at[month, 'principal'] = principal
-            self.data.at[month, 'extra_principal'] = extra_principal
-            self.data.at[month, 'interest'] = interest
-            self.data.at[month, 'balance'] = self.balance
-
-            # Increment for next iteration
-            month += 1
+        """
+        Amortize the loan, paying it off early if the extra payments allow it
+
+        Returns: (principal, extra_principal, interest, balance) arrays, one entry per month
+        """
+        return amortize(self.loan_amount, self.interest_rate / 12, self.fixed_monthly_payment_size, self.extra_payment)
@@ -0,0 +1,161 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class Panel(object):
+    """
+    Dense areas x indicators x dates cube of market data with label indexes.
+
+    Values are one NumPy array, NaN where an area has no observation. Selecting single labels, label slices or date
+    ranges returns views of the same memory, so slicing a panel loaded with mmap=True never reads the whole file.
+
+    Example:
+        >> panel = utils.load_panel(metros, 'M', ['ZHVISF', 'MRP1B'], start_date, end_date)
+        >> panel.sel(indicator='ZHVISF', start='2010-01-01').values  # (areas, dates) view
+        >> panel.frame('MRP1B')  # dates x areas DataFrame, like compare_areas
+    """
+
+    def __init__(self, values, areas, indicators, dates):
+        """
+        Args:
+            values (np.array): shape (len(areas), len(indicators), len(dates))
+            areas (iterable): area labels
+            indicators (iterable of str): indicator labels
+            dates (iterable): sorted dates
+        """
+        self.values = values
+        self.areas = list(areas)
+        self.indicators = list(indicators)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        assert values.shape == (len(self.areas), len(self.indicators), len(self.dates)), \
+            "values must have shape (areas, indicators, dates)"
+        self._area_index = {area: i for i, area in enumerate(self.areas)}
+        self._indicator_index = {indicator: i for i, indicator in enumerate(self.indicators)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def __repr__(self):
+        return "Panel({} areas x {} indicators x {} dates, {})".format(*self.shape, self.values.dtype)
+
+    @classmethod
+    def empty(cls, areas, indicators, dates, dtype=np.float64):
+        """
+        NaN-filled panel to be filled in place
+        """
+        values = np.full((len(areas), len(indicators), len(dates)), np.nan, dtype=dtype)
+        return cls(values, areas, indicators, dates)
+
+    @classmethod
+    def from_frames(cls, frames, dtype=np.float64):
+        """
+        Build a panel from compare_areas-style DataFrames
+
+        Args:
+            frames (dict): indicator -> DataFrame indexed by date with one column per area
+        """
+        areas = list(dict.fromkeys(area for frame in frames.values() for area in frame.columns))
+        dates = np.unique(np.concatenate([frame.index.values.astype('datetime64[D]') for frame in frames.values()]))
+        panel = cls.empty(areas, list(frames), dates, dtype)
+        for indicator, frame in frames.items():
+            for area in frame.columns:
+                panel.set_series(area, indicator, frame.index.values, frame[area].to_numpy())
+        return panel
+
+    def set_series(self, area, indicator, dates, values):
+        """
+        Write one series into the panel in place. Dates must be part of the panel's dates
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        positions = np.searchsorted(self.dates, dates)
+        assert np.all(positions < len(self.dates)) and np.array_equal(self.dates[np.minimum(positions, len(self.dates) - 1)], dates), \
+            "Every date of the series must be one of the panel's dates."
+        self.values[self._area_index[area], self._indicator_index[indicator], positions] = values
+
+    def _label_selector(self, index, labels, selection):
+        if selection is None:
+            return slice(None), labels
+        if isinstance(selection, slice):
+            start = None if selection.start is None else index[selection.start]
+            stop = None if selection.stop is None else index[selection.stop] + 1
+            return slice(start, stop), labels[start:stop]
+        if isinstance(selection, (list, tuple, np.ndarray)):
+            positions = [index[label] for label in selection]
+            # Consecutive labels are still a view
+            if positions and positions == list(range(positions[0], positions[-1] + 1)):
+                return slice(positions[0], positions[-1] + 1), list(selection)
+            return positions, list(selection)
+        position = index[selection]
+        return slice(position, position + 1), [selection]
+
+    def sel(self, area=None, indicator=None, start=None, end=None):
+        """
+        Select part of the panel
+
+        Args:
+            area, indicator: a label, a list of labels, or a slice of labels (inclusive on both ends). None for all.
+                Single labels, slices and consecutive labels are zero-copy; other lists copy.
+            start, end: date range, inclusive. None for open-ended
+
+        Returns: Panel
+        """
+        area_selector, areas = self._label_selector(self._area_index, self.areas, area)
+        indicator_selector, indicators = self._label_selector(self._indicator_index, self.indicators, indicator)
+        first = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'D'), side='left')
+        last = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'D'), side='right')
+
+        values = self.values[area_selector]
+        values = values[:, indicator_selector]
+        values = values[:, :, first:last]
+        return Panel(values, areas, indicators, self.dates[first:last])
+
+    def series(self, area, indicator):
+        """
+        One series as a 1-D view over dates
+        """
+        return self.values[self._area_index[area], self._indicator_index[indicator]]
+
+    def frame(self, indicator):
+        """
+        One indicator as a dates x areas DataFrame, in the same layout as compare_areas
+        """
+        values = self.values[:, self._indicator_index[indicator]].T
+        return pd.DataFrame(values, index=pd.DatetimeIndex(self.dates, name='Date'), columns=self.areas)
+
+    def save(self, path):
+        """
+        Save to {path}.npy and {path}.json, so the values can later be memory-mapped by load
+        """
+        np.save(path + '.npy', self.values)
+        with open(path + '.json', 'w') as labels_file:
+            json.dump({
+                'areas': self.areas,
+                'indicators': self.indicators,
+                'dates': [str(date) for date in self.dates],
+            }, labels_file)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a panel saved with save
+
+        Args:
+            path (str): same path passed to save
+            mmap (bool): memory-map the values read-only instead of reading them into memory
+        """
+        with open(path + '.json') as labels_file:
+            labels = json.load(labels_file)
+        values = np.load(path + '.npy', mmap_mode='r' if mmap else None)
+        return cls(values, labels['areas'], labels['indicators'], labels['dates'])
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path + '.npy') and os.path.exists(path + '.json')
@@ -0,0 +1,44 @@
+_UNSET = object()
+
+
+class Parameter(object):
+    """
+    Model attribute whose changes are tracked, so a model can bring results that depend on it up to date
+    instead of returning stale ones.
+
+    Setting a parameter to a different value, after it was first set, calls model._parameter_changed(name).
+
+    Example:
+        >> class Apartment(object):
+        ..     base_rent = Parameter()
+        ..
+        ..     def _parameter_changed(self, name):
+        ..         ...
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, model, owner=None):
+        if model is None:
+            return self
+        try:
+            return model.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, model, value):
+        previous = model.__dict__.get(self.name, _UNSET)
+        model.__dict__[self.name] = value
+        if previous is not _UNSET and not _same(previous, value):
+            model._parameter_changed(self.name)
+
+
+def _same(previous, value):
+    if previous is value:
+        return True
+    try:
+        return bool(previous == value)
+    except (TypeError, ValueError):
+        # e.g. arrays, which are treated as changed unless they are the same object
+        return False
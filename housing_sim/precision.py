@@ -0,0 +1,175 @@
+import contextlib
+
+import numpy as np
+
+# Largest relative rounding error of one value stored in float32: half a unit in the last place
+FLOAT32_ROUNDING = 2.0 ** -24
+# Stored values are rounded once. Cumulative totals of non-negative flows derived from already-stored columns,
+# e.g. a home's total_indirect from a single precision mortgage's interest, are rounded at most twice
+SINGLE_ERROR_BOUND = 2 * FLOAT32_ROUNDING
+
+
+class Precision(object):
+    """
+    How model results are stored.
+
+    Results are always computed in float64. A precision only decides what the stored arrays hold: money and
+    fractions as {money_dtype}, and month indexes as the narrowest integer type that fits when {compact_months}.
+
+    Error bounds of 'single' against the 'double' reference, for a column whose largest magnitude is M:
+        - every stored value is within FLOAT32_ROUNDING (6e-8) of its float64 value, relatively
+        - every value, including cumulative totals over 360 months, is within SINGLE_ERROR_BOUND * M, e.g. under
+          4 cents on a $300,000 total
+    Sums taken afterwards over float32 columns, e.g. frame['interest'].sum(), add error of their own; upcast first.
+    """
+
+    def __init__(self, name, money_dtype, compact_months):
+        self.name = name
+        self.money_dtype = np.dtype(money_dtype)
+        self.compact_months = compact_months
+
+    def __repr__(self):
+        return "Precision({!r})".format(self.name)
+
+    def month_dtype(self, num_months):
+        """
+        Integer type of the month indexes of {num_months} months
+        """
+        if not self.compact_months:
+            return np.dtype(np.int64)
+        for dtype in (np.int16, np.int32):
+            if num_months <= np.iinfo(dtype).max:
+                return np.dtype(dtype)
+        return np.dtype(np.int64)
+
+    def store(self, values):
+        """
+        {values} as stored under this precision: floats become {money_dtype}, anything else is unchanged
+        """
+        values = np.asarray(values)
+        if values.dtype.kind == 'f' and values.dtype != self.money_dtype:
+            return values.astype(self.money_dtype)
+        return values
+
+
+DOUBLE = Precision('double', np.float64, compact_months=False)
+SINGLE = Precision('single', np.float32, compact_months=True)
+PRECISIONS = {precision.name: precision for precision in (DOUBLE, SINGLE)}
+
+_default_precision = DOUBLE
+
+
+def get_default_precision():
+    """
+    The precision every model in this process stores its results in
+    """
+    return _default_precision
+
+
+def set_default_precision(precision):
+    """
+    Store every model's results in {precision}, 'double' or 'single'. Results already computed and cached are
+    kept apart, since housing_sim.cache keys include the precision
+    """
+    global _default_precision
+    _default_precision = PRECISIONS[precision] if isinstance(precision, str) else precision
+
+
+@contextlib.contextmanager
+def using_precision(precision):
+    """
+    Store results in {precision} inside a with block
+
+    Example:
+        >> with using_precision('single'):
+        ..     batch = FixedRateMortgageBatch.from_grid(rates, prices, down_payments, terms)
+        ..     data = batch.get_data()
+    """
+    previous = get_default_precision()
+    set_default_precision(precision)
+    try:
+        yield get_default_precision()
+    finally:
+        set_default_precision(previous)
+
+
+def measure_drift(num_scenarios=1000, num_months=360, num_paths=1000, seed=0):
+    """
+    Compare every model's stored results in single precision against the double precision reference
+
+    Covers a single SimpleHome, its mortgage and an Apartment, a FixedRateMortgageBatch grid of {num_scenarios}
+    and a MonteCarloSimulation of {num_paths}, all over {num_months} months.
+
+    Returns: DataFrame with one row per (model, column)
+        'max_abs_error': largest absolute difference
+        'final_abs_error': largest absolute difference in the last month, e.g. of a cumulative total
+        'max_rel_error': largest difference relative to the largest magnitude in the column
+        'bound': SINGLE_ERROR_BOUND
+        'within_bound': whether max_rel_error is within the bound
+        'bytes_ratio': single precision bytes over double precision bytes
+    """
+    import datetime
+
+    import pandas as pd
+
+    import housing_sim.cache
+    from housing_sim.housing.apartment import Apartment
+    from housing_sim.housing.monte_carlo import MonteCarloSimulation
+    from housing_sim.housing.simple_home import SimpleHome
+    from housing_sim.mortgage.batch import FixedRateMortgageBatch
+    from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+
+    start_date = datetime.date(2020, 1, 1)
+    rng = np.random.default_rng(seed)
+    rates = rng.uniform(0.02, 0.08, num_scenarios)
+    prices = rng.uniform(100000, 1500000, num_scenarios)
+    down_payments = rng.choice([0.035, 0.1, 0.2], num_scenarios)
+
+    def run():
+        mortgage = SimpleFixedRateMortgage(0.0425, 300000, 0.2, start_date, num_months)
+        home = SimpleHome(300000, mortgage)
+        apartment = Apartment(1500, start_date, num_months)
+        results = {
+            'SimpleFixedRateMortgage': _schedule_columns(mortgage.get_schedule()),
+            'SimpleHome': _schedule_columns(home.get_schedule()),
+            'SimpleHome.indirect_costs': _schedule_columns(home.get_indirect_cost_schedule()),
+            'Apartment': _schedule_columns(apartment.get_schedule()),
+        }
+        data = FixedRateMortgageBatch(rates, prices, down_payments, num_months).get_data()
+        results['FixedRateMortgageBatch'] = {name: values for name, values in data.items() if name != 'active'}
+        results['MonteCarloSimulation'] = MonteCarloSimulation(home, apartment).simulate(num_paths, seed=seed, max_workers=0)
+        return results
+
+    previous_cache = housing_sim.cache.get_default_cache()
+    housing_sim.cache.set_default_cache(housing_sim.cache.SimulationCache(max_entries=0))
+    try:
+        with using_precision(DOUBLE):
+            reference = run()
+        with using_precision(SINGLE):
+            single = run()
+    finally:
+        housing_sim.cache.set_default_cache(previous_cache)
+
+    rows = []
+    for model, columns in reference.items():
+        for name, expected in columns.items():
+            actual = single[model][name]
+            error = np.abs(actual.astype(np.float64) - expected)
+            scale = np.max(np.abs(expected), axis=-1, keepdims=True)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                relative = np.where(scale > 0, error / scale, 0.0)
+            rows.append({
+                'model': model,
+                'column': name,
+                'max_abs_error': float(error.max()),
+                'final_abs_error': float(error[..., -1].max()),
+                'max_rel_error': float(relative.max()),
+                'bound': SINGLE_ERROR_BOUND,
+                'within_bound': bool(relative.max() <= SINGLE_ERROR_BOUND),
+                'bytes_ratio': actual.nbytes / expected.nbytes,
+            })
+    return pd.DataFrame(rows)
+
+
+def _schedule_columns(schedule):
+    return {name: schedule[name] for name in schedule.columns if name != 'date'}
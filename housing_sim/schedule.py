@@ -0,0 +1,88 @@
+import pandas as pd
+
+from housing_sim.precision import get_default_precision
+from housing_sim.timeline import get_timeline
+from housing_sim import instrumentation
+
+
+class Schedule(object):
+    """
+    Compact, read-only monthly results of a model: one NumPy array per column.
+
+    The 'date' and 'month' columns are not stored, they are generated from the start date when asked for.
+    Columns are returned as read-only arrays, so a schedule can be handed out and shared without defensive copies.
+    A pandas DataFrame is only built by to_frame().
+    Float columns are stored in the schedule's precision, see housing_sim.precision.
+
+    Example:
+        >> schedule = my_mortgage.get_schedule()
+        >> schedule['interest'].sum()
+        >> schedule.to_frame().plot(x='date', y='balance')
+    """
+    __slots__ = ('start_date', 'num_months', 'precision', '_columns')
+
+    def __init__(self, start_date, num_months, columns, precision=None):
+        """
+        Args:
+            start_date (datetime): date of the first month
+            num_months (int): number of months (rows)
+            columns (dict): mapping of column names to arrays of length {num_months}, in display order.
+                The schedule takes ownership of the arrays and marks them read-only
+            precision (Precision): how columns are stored. If None, uses the default precision
+        """
+        self.start_date = start_date
+        self.num_months = num_months
+        self.precision = get_default_precision() if precision is None else precision
+        self._columns = {}
+        for name, values in columns.items():
+            values = self.precision.store(values)
+            assert values.shape == (num_months,), "Column '{}' must have {} rows.".format(name, num_months)
+            values.flags.writeable = False
+            self._columns[name] = values
+
+    def __len__(self):
+        return self.num_months
+
+    def __contains__(self, name):
+        return name in ('date', 'month') or name in self._columns
+
+    def __getitem__(self, name):
+        if name == 'date':
+            return get_timeline(self.start_date, self.num_months).dates
+        if name == 'month':
+            return get_timeline(self.start_date, self.num_months).month_index(self.precision.month_dtype(self.num_months))
+        return self._columns[name]
+
+    @property
+    def columns(self):
+        return ['date', 'month'] + list(self._columns)
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the stored columns
+        """
+        return sum(values.nbytes for values in self._columns.values())
+
+    def replace(self, **columns):
+        """
+        New schedule with some columns replaced or added. Unchanged columns are shared, not copied
+        """
+        new_columns = dict(self._columns)
+        new_columns.update(columns)
+        return Schedule(self.start_date, self.num_months, new_columns, self.precision)
+
+    def to_frame(self, columns=None):
+        """
+        Materialize the schedule as a new pandas DataFrame
+
+        Args:
+            columns (iterable of str): the columns to include. If None, includes all columns
+
+        Returns: DataFrame that the caller is free to modify
+        """
+        if columns is None:
+            columns = self.columns
+        instrumentation.count('schedule.frame_rows', self.num_months)
+        with instrumentation.span('schedule.to_frame'):
+            return pd.DataFrame({name: self[name] for name in columns})
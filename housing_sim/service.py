@@ -0,0 +1,532 @@
+"""
+Local HTTP/JSON service that evaluates home vs rent scenarios in micro-batches
+
+Concurrent requests are collected for a short window and evaluated together in one vectorized pass of
+housing_sim.housing.cost_curves, so no model objects or DataFrames are built per request. Responses only hold the
+requested columns at the requested months.
+
+Endpoints:
+    POST /evaluate  one scenario object, or {"scenarios": [...]}. See parse_scenario for the fields
+    GET /metrics    throughput, latency and batch size statistics
+    GET /health
+
+Usage:
+    python -m housing_sim.service --port 8787 --window-ms 5
+    curl -d '{"purchase_price": 300000, "interest_rate": 0.04, "down_payment_pct": 0.2,
+              "start_date": "2020-01-01", "base_rent": 1500, "columns": ["equity", "total_rent"], "months_out": [59, 119]}' \\
+        localhost:8787/evaluate
+"""
+import argparse
+import collections
+import json
+import math
+import numbers
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from housing_sim.housing.cost_curves import home_cost_curves, rent_schedule
+
+# asyncio is imported where it's used. It takes longer to import than the rest of housing_sim put together, and
+# only the running service needs it
+
+REQUIRED_FIELDS = ('purchase_price', 'interest_rate', 'down_payment_pct', 'start_date')
+# Same defaults as SimpleHome and Apartment
+OPTIONAL_FIELDS = {
+    'months': 360,
+    'appreciation_rate': 0.02,
+    'homeowners_insurance_rate': 0.01,
+    'property_tax_rate': 0.02,
+    'closing_cost_rate': 0.05,
+    'title_insurance_rate': 0.01,
+    'base_rent': 0.0,
+    'rent_increase_rate': 0.02,
+}
+HOME_RATES = ('appreciation_rate', 'homeowners_insurance_rate', 'property_tax_rate', 'closing_cost_rate',
+              'title_insurance_rate')
+
+HOME_COLUMNS = ('home_value', 'home_ownership_pct', 'direct', 'indirect', 'total_direct', 'total_indirect', 'equity',
+                'homeowners_insurance', 'property_tax', 'interest', 'fees')
+RENT_COLUMNS = ('rent', 'total_rent')
+COLUMNS = HOME_COLUMNS + RENT_COLUMNS
+DEFAULT_COLUMNS = ('total_direct', 'total_indirect', 'equity', 'total_rent')
+
+# Longest scenario accepted, a 100 year timeline
+MAX_MONTHS = 1200
+
+DEFAULT_PORT = 8787
+DEFAULT_BATCH_WINDOW = 0.005
+DEFAULT_MAX_BATCH_SIZE = 1024
+LATENCY_WINDOW = 10000
+MAX_BODY_BYTES = 2**24
+
+
+class Scenario(object):
+    """
+    One parsed scenario request: its parameters and the slice of the results to return
+    """
+
+    def __init__(self, params, columns, months):
+        self.params = params
+        self.columns = columns
+        self.months = months
+
+    @property
+    def group(self):
+        """
+        Scenarios in the same group share a timeline and are evaluated in one batch
+        """
+        return self.params['start_date'], self.params['months']
+
+
+def _integer(value, name):
+    """
+    {value} as an int, if it's a whole number. JSON booleans aren't numbers here
+
+    Raises: ValueError otherwise
+    """
+    if isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise ValueError("{} must be a whole number, got {!r}".format(name, value))
+
+
+def _finite(value, name):
+    """
+    {value} as a float, if it's a finite number
+
+    Raises: ValueError otherwise
+    """
+    if isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(value):
+        return float(value)
+    raise ValueError("{} must be a finite number, got {!r}".format(name, value))
+
+
+def parse_scenario(payload):
+    """
+    Validate a scenario request
+
+    Fields:
+        purchase_price, interest_rate, down_payment_pct, start_date ('YYYY-MM-DD'): required
+        months (int, at most MAX_MONTHS), base_rent, rent_increase_rate and the SimpleHome rates: optional, see
+            OPTIONAL_FIELDS
+        columns (list of str): columns to return, any of COLUMNS. Defaults to DEFAULT_COLUMNS
+        months_out (list of int or "all"): month indexes to return. Defaults to the last month
+
+    Raises: ValueError if the request is invalid
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("A scenario must be a JSON object")
+    missing = [name for name in REQUIRED_FIELDS if name not in payload]
+    if missing:
+        raise ValueError("Missing fields: {}".format(missing))
+    unknown = set(payload) - set(REQUIRED_FIELDS) - set(OPTIONAL_FIELDS) - {'columns', 'months_out'}
+    if unknown:
+        raise ValueError("Unknown fields: {}".format(sorted(unknown)))
+
+    params = dict(OPTIONAL_FIELDS)
+    params.update({name: payload[name] for name in payload if name not in ('columns', 'months_out')})
+    try:
+        params['start_date'] = pd.Timestamp(params['start_date']).date()
+    except (TypeError, ValueError) as error:
+        raise ValueError("Invalid field: {}".format(error))
+    params['months'] = _integer(params['months'], 'months')
+    for name in set(params) - {'start_date', 'months'}:
+        params[name] = _finite(params[name], name)
+    if not 0 < params['months'] <= MAX_MONTHS:
+        raise ValueError("months must be between 1 and {}".format(MAX_MONTHS))
+
+    columns = payload.get('columns', DEFAULT_COLUMNS)
+    if not isinstance(columns, (list, tuple)) or not all(isinstance(column, str) for column in columns):
+        raise ValueError("columns must be a list of column names")
+    columns = tuple(columns)
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError("Unknown columns: {}".format(sorted(unknown)))
+
+    months = payload.get('months_out', [params['months'] - 1])
+    if months == 'all':
+        months = slice(None)
+    else:
+        if not isinstance(months, (list, tuple)):
+            raise ValueError("months_out must be a list of month indexes or \"all\"")
+        months = np.array([_integer(month, 'months_out') for month in months], dtype=int)
+        if (months < 0).any() or (months >= params['months']).any():
+            raise ValueError("months_out must be a list of month indexes below {}".format(params['months']))
+    return Scenario(params, columns, months)
+
+
+def evaluate_batch(scenarios):
+    """
+    Evaluate scenarios in one vectorized pass per (start date, months) group. A group that fails doesn't affect the
+    others
+
+    Args:
+        scenarios (list of Scenario)
+
+    Returns: list of dicts of column -> list of values, in the order of {scenarios}. Scenarios in a group that failed
+        get the exception instead
+    """
+    results = [None] * len(scenarios)
+    groups = collections.defaultdict(list)
+    for i, scenario in enumerate(scenarios):
+        groups[scenario.group].append(i)
+
+    for (start_date, num_months), indexes in groups.items():
+        try:
+            group_results = _evaluate_group([scenarios[i] for i in indexes], start_date, num_months)
+        except Exception as error:
+            group_results = [error] * len(indexes)
+        for i, result in zip(indexes, group_results):
+            results[i] = result
+    return results
+
+
+def _evaluate_group(scenarios, start_date, num_months):
+    """
+    Evaluate scenarios sharing a start date and length together
+
+    Returns: list of dicts of column -> list of values, in the order of {scenarios}
+    """
+    params = {name: np.array([scenario.params[name] for scenario in scenarios])
+              for name in REQUIRED_FIELDS + tuple(OPTIONAL_FIELDS) if name not in ('start_date', 'months')}
+
+    needed = set(column for scenario in scenarios for column in scenario.columns)
+    curves = {}
+    if needed & set(HOME_COLUMNS):
+        curves = home_cost_curves(
+            params['purchase_price'], params['interest_rate'], params['down_payment_pct'], start_date, num_months,
+            **{name: params[name] for name in HOME_RATES}
+        )
+    if needed & set(RENT_COLUMNS):
+        curves['rent'] = rent_schedule(params['base_rent'], params['rent_increase_rate'], num_months)
+        curves['total_rent'] = np.cumsum(curves['rent'], axis=-1)
+
+    return [{column: curves[column][row, scenario.months].tolist() for column in scenario.columns}
+            for row, scenario in enumerate(scenarios)]
+
+
+class ServiceMetrics(object):
+    """
+    Throughput, latency and batching statistics since the service started
+    """
+
+    def __init__(self, latency_window=LATENCY_WINDOW):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.scenarios = 0
+        self.batches = 0
+        self.max_batch_size = 0
+        self.batch_seconds = 0.0
+        self.latencies = collections.deque(maxlen=latency_window)
+
+    def record_batch(self, size, seconds):
+        self.batches += 1
+        self.scenarios += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.batch_seconds += seconds
+
+    def to_dict(self):
+        uptime = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1e3
+        percentiles = np.percentile(latencies, [50, 90, 99]).tolist() if len(latencies) else [None] * 3
+        return {
+            'uptime_seconds': uptime,
+            'requests': self.requests,
+            'errors': self.errors,
+            'scenarios': self.scenarios,
+            'scenarios_per_second': self.scenarios / uptime if uptime > 0 else 0.0,
+            'batches': self.batches,
+            'mean_batch_size': self.scenarios / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'mean_batch_ms': self.batch_seconds / self.batches * 1e3 if self.batches else 0.0,
+            # Time from a scenario being queued to its result, over the last {latency_window} scenarios
+            'latency_ms': {
+                'p50': percentiles[0],
+                'p90': percentiles[1],
+                'p99': percentiles[2],
+                'max': float(latencies.max()) if len(latencies) else None,
+            },
+        }
+
+
+class MicroBatcher(object):
+    """
+    Collects items submitted within {window} seconds of each other, up to {max_batch_size}, and evaluates them
+    together with {evaluate} on a worker thread, so the event loop keeps accepting requests meanwhile
+
+    {evaluate} returns one result per item, and an exception in place of the result of an item that failed. Anything
+    it raises fails the whole batch
+    """
+
+    def __init__(self, evaluate, window=DEFAULT_BATCH_WINDOW, max_batch_size=DEFAULT_MAX_BATCH_SIZE, metrics=None):
+        self.evaluate = evaluate
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.metrics = metrics or ServiceMetrics()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+        self.flush_handle = None
+        self.running = set()
+
+    async def submit(self, item):
+        import asyncio
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        import asyncio
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch):
+        import asyncio
+        started = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.evaluate, [item for item, _, _ in batch]
+            )
+        except Exception as error:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finished = time.perf_counter()
+        self.metrics.record_batch(len(batch), finished - started)
+        for (_, future, queued), result in zip(batch, results):
+            self.metrics.latencies.append(finished - queued)
+            if future.done():
+                continue
+            # {evaluate} returns the exception in place of the results of items that failed
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        self._flush()
+        self.executor.shutdown(wait=True)
+
+
+class ScenarioService(object):
+    """
+    asyncio HTTP/1.1 server for scenario evaluation, with keep-alive connections
+
+    Example:
+        >> service = ScenarioService(port=0)
+        >> await service.start()
+        >> client = ServiceClient(port=service.port)
+        >> await client.request('POST', '/evaluate', {...})
+        >> await service.close()
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+        """
+        Args:
+            host (str): interface to listen on, localhost by default
+            port (int): port to listen on, 0 for any free port
+            batch_window (float): seconds to wait for more requests before evaluating a batch
+            max_batch_size (int): evaluate a batch as soon as it has this many scenarios
+        """
+        self.host = host
+        self.port = port
+        self.metrics = ServiceMetrics()
+        self.batcher = MicroBatcher(evaluate_batch, batch_window, max_batch_size, self.metrics)
+        self.server = None
+        self.connections = set()
+
+    async def start(self):
+        import asyncio
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.metrics.started = time.perf_counter()
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        import asyncio
+        self.server.close()
+        # Idle keep-alive connections would otherwise stay open
+        for connection in self.connections:
+            connection.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        self.batcher.close()
+
+    async def _handle_connection(self, reader, writer):
+        import asyncio
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length', '0')
+                if not length.isdigit():
+                    # Without a valid length the body can't be skipped, so the connection can't be reused
+                    _write_response(writer, *self._error(400, "Invalid Content-Length"), keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    _write_response(writer, 413, {'error': "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length)
+
+                status, payload = await self._dispatch(method, target.split('?')[0], body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections.discard(connection)
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        import asyncio
+        self.metrics.requests += 1
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok'}
+        if path == '/metrics' and method == 'GET':
+            return 200, self.metrics.to_dict()
+        if path != '/evaluate':
+            return self._error(404, "Unknown path {}".format(path))
+        if method != 'POST':
+            return self._error(405, "Use POST")
+
+        try:
+            payload = json.loads(body)
+            if isinstance(payload, dict) and 'scenarios' in payload:
+                if not isinstance(payload['scenarios'], list):
+                    raise ValueError("scenarios must be a list")
+                scenarios = [parse_scenario(scenario) for scenario in payload['scenarios']]
+            else:
+                scenarios = [parse_scenario(payload)]
+        except ValueError as error:
+            return self._error(400, str(error))
+
+        try:
+            results = await asyncio.gather(*[self.batcher.submit(scenario) for scenario in scenarios])
+        except Exception as error:
+            # Every request in the failed group gets this response, not a dropped connection
+            return self._error(500, "Evaluation failed: {}".format(error))
+        if isinstance(payload, dict) and 'scenarios' in payload:
+            return 200, {'results': results}
+        return 200, results[0]
+
+    def _error(self, status, message):
+        self.metrics.errors += 1
+        return status, {'error': message}
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+            500: 'Internal Server Error'}
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    writer.write(
+        'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+            status, _REASONS.get(status, ''), len(body), 'keep-alive' if keep_alive else 'close'
+        ).encode('latin-1') + body
+    )
+
+
+class ServiceClient(object):
+    """
+    Minimal keep-alive client for ScenarioService, e.g. for tools and load tests on localhost
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """
+        Returns: (status, decoded JSON body)
+        """
+        import asyncio
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b'' if payload is None else json.dumps(payload).encode()
+        self.writer.write('{} {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+            method, path, self.host, len(body)
+        ).encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        response = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, json.loads(response)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+
+def main(argv=None):
+    import asyncio
+    parser = argparse.ArgumentParser(description="Serve scenario evaluations over HTTP on localhost")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--window-ms', type=float, default=DEFAULT_BATCH_WINDOW * 1e3,
+                        help="how long to collect requests before evaluating a batch")
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    service = ScenarioService(args.host, args.port, args.window_ms / 1e3, args.max_batch)
+    print("Serving on http://{}:{}".format(args.host, args.port))
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+
+TIMELINE_CACHE_SIZE = 256
+
+
+class MonthlyTimeline(object):
+    """
+    The calendar of a run of consecutive months, computed once as read-only arrays.
+
+    Every model over the same months shares one timeline through get_timeline, so calendar work happens once
+    per (start, length) rather than once per model, row or scenario.
+
+    Attributes:
+        first_month (np.datetime64): the first month, datetime64[M]
+        num_months (int): number of months
+        months (np.array): months since the start, 0..num_months-1
+        dates (np.array): the first day of every month, datetime64[ns]
+        calendar_months (np.array): calendar month of every month, 1-12
+        years (np.array): calendar year of every month
+        years_passed (np.array): whole years since the start, months // 12
+        is_january (np.array): bool mask of January months
+        is_anniversary (np.array): bool mask of the months a whole number of years after the start, excluding the start
+        property_tax_factors (np.array): fraction of the yearly property tax due every month. Taxes are paid
+            every January, and the first payment is prorated by the months owned in the previous calendar year
+    """
+
+    def __init__(self, first_month, num_months):
+        self.first_month = np.datetime64(first_month, 'M')
+        self.num_months = num_months
+
+        self.months = np.arange(num_months)
+        month_index = self.first_month + self.months
+        self.dates = month_index.astype('datetime64[ns]')
+        months_since_epoch = month_index.astype(np.int64)
+        self.calendar_months = months_since_epoch % 12 + 1
+        self.years = months_since_epoch // 12 + 1970
+        self.years_passed = self.months // 12
+        self.is_january = self.calendar_months == 1
+        self.is_anniversary = (self.months % 12 == 0) & (self.months > 0)
+
+        self.property_tax_factors = self.is_january.astype(float)
+        if self.is_january.any():
+            first_payment_index = np.argmax(self.is_january)
+            self.property_tax_factors[first_payment_index] *= (first_payment_index + 1) / 12
+
+        self._month_indexes = {self.months.dtype: self.months}
+
+        for values in (self.months, self.dates, self.calendar_months, self.years, self.years_passed,
+                       self.is_january, self.is_anniversary, self.property_tax_factors):
+            values.flags.writeable = False
+
+    def __len__(self):
+        return self.num_months
+
+    def month_index(self, dtype):
+        """
+        The months since the start as {dtype}, e.g. np.int16 for compact results. Shared like every other array
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in self._month_indexes:
+            months = self.months.astype(dtype)
+            months.flags.writeable = False
+            self._month_indexes[dtype] = months
+        return self._month_indexes[dtype]
+
+    def __repr__(self):
+        return "MonthlyTimeline({}, {} months)".format(self.first_month, self.num_months)
+
+
+def first_month(start_date):
+    """
+    The first whole month starting on or after {start_date}: its own month if it is the 1st, otherwise the next
+
+    Returns: np.datetime64[M]
+    """
+    if not isinstance(start_date, datetime.date):
+        start_date = pd.Timestamp(start_date)
+    month = np.datetime64('{:04d}-{:02d}'.format(start_date.year, start_date.month), 'M')
+    if start_date.day != 1:
+        month += 1
+    return month
+
+
+def get_timeline(start_date, num_months):
+    """
+    The shared MonthlyTimeline of {num_months} months from {start_date}, see first_month
+    """
+    return _get_timeline(first_month(start_date).astype(np.int64).item(), int(num_months))
+
+
+@functools.lru_cache(maxsize=TIMELINE_CACHE_SIZE)
+def _get_timeline(months_since_epoch, num_months):
+    return MonthlyTimeline(np.datetime64(months_since_epoch, 'M'), num_months)
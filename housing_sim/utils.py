@@ -1,14 +1,19 @@
+import math
+
+import numpy as np
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 
+from housing_sim import instrumentation
+from housing_sim.timeline import get_timeline
+
 # Utility functions
 def months_passed(stop, start):
     """
     Calculates the total number of months passed from start -> stop
     """
-    years = relativedelta(stop, start).years
-    months_in_year = relativedelta(stop, start).months
-    return months_in_year + years * 12
+    delta = relativedelta(stop, start)
+    return delta.months + delta.years * 12
 
 
 def allocate_empty_df(number_rows, blank_row_format):
@@ -46,7 +51,44 @@ def blank_monthly_df(start_date, number_rows, blank_row_format, date_colname='da
 
     :return: empty dataframe with prepopulated date and month rows
     """
-    df = allocate_empty_df(number_rows, blank_row_format)
-    df[date_colname] = pd.date_range(start_date, periods=number_rows, freq='MS')
-    df[month_colname] = range(0, number_rows)
+    instrumentation.count('blank_monthly_df.rows', number_rows)
+    with instrumentation.span('blank_monthly_df'):
+        df = allocate_empty_df(number_rows, blank_row_format)
+        timeline = get_timeline(start_date, number_rows)
+        df[date_colname] = timeline.dates
+        df[month_colname] = timeline.months
     return df
+
+def monthly_dates(start_date, number_rows):
+    """
+    The first day of every month from start -> end, like pd.date_range(start_date, periods=number_rows, freq='MS')
+    but taken from the shared MonthlyTimeline
+
+    :param start_date: Start datetime (inclusive). Dates after the 1st of a month begin at the next month
+    :param number_rows: Number of months
+
+    :return: new np.array of datetime64[ns]
+    """
+    return get_timeline(start_date, number_rows).dates.copy()
+
+def fit_to_array(single_or_iterable, desired_length):
+    """
+    Get a numpy array of the desired length by repeating/truncating either a single item or iterable of items
+
+    Examples:
+        >> fit_to_array(0, 4)
+        np.array([0,0,0,0])
+
+        >> fit_to_array([1,2,3], 7)
+        np.array([1,2,3,1,2,3,1])
+    """
+    if not hasattr(single_or_iterable, '__iter__'):
+        arr = np.array([single_or_iterable])
+    else:
+        arr = np.array(single_or_iterable)
+
+    if len(arr) < desired_length:
+        numberOfTilesNeeded = math.ceil(desired_length / float(len(arr)))
+        arr = np.tile(arr, numberOfTilesNeeded)
+
+    return arr[:desired_length]
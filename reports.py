@@ -0,0 +1,576 @@
+"""
+Headless report pipeline: one single-home analysis report per scenario, rendered straight from the library
+
+Scenarios are read from a JSON config file. Reports fan out across a process pool, and a report is only rendered
+again when its inputs or the code that produces it change: every report's content hash is kept in a manifest next
+to the reports, by file name. Workers share a disk-backed housing_sim.cache, so mortgages, homes and apartments that several
+reports have in common are computed once, and area series are fetched once per run through the local Quandl store.
+
+Config:
+    {
+        "output_dir": "reports",
+        "format": "pdf",
+        "defaults": {"interest_rate": 0.0425, "base_rent": 1000},
+        "scenarios": [
+            {"name": "smith", "purchase_price": 250000},
+            {"name": "jones", "purchase_price": 320000, "area": {"category": "M", "code": 31, "indicator": "ZHVIAH"}}
+        ]
+    }
+
+    Every scenario field not given falls back to "defaults", then to SCENARIO_DEFAULTS. "area" is optional, either a
+    Quandl code or the arguments of utils.get_quandl_code.
+
+Usage:
+    python reports.py run reports.json                    # render new and changed reports
+    python reports.py run reports.json --force --workers 8
+    python reports.py list reports.json                   # show which reports are up to date
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+import constants
+import housing_sim.cache
+from housing_sim.housing.apartment import Apartment
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage, DownPayableFixedRateMortgage
+
+# Inputs of single_home_analysis.ipynb
+SCENARIO_DEFAULTS = {
+    'interest_rate': 0.0425,
+    'purchase_price': 250000,
+    'down_payment_pct': 0.20,
+    'months': 360,
+    'start_date': '2020-01-01',
+    'base_rent': 1000,
+    'rent_increase_rate': 0.02,
+    'appreciation_rate': 0.02,
+    'homeowners_insurance_rate': 0.01,
+    'property_tax_rate': 0.02,
+    'closing_cost_rate': 0.05,
+    'title_insurance_rate': 0.01,
+    'extra_payment': 200,
+    'room_rents': [500, 600, 700, 800, 900, 1000],
+    'room_rental_years': 7,
+    'area': None,
+}
+
+REPORT_FORMATS = ('pdf', 'html')
+DEFAULT_OUTPUT_DIR = 'reports'
+DEFAULT_CACHE_DIR = os.path.join(constants.DATA_DIR, 'report_cache')
+MANIFEST_FILENAME = 'manifest.json'
+
+# Source whose changes invalidate every report
+CODE_PATHS = ('housing_sim', 'reports.py')
+
+
+class Section(object):
+    """
+    One chart of a report, and the summary statistics printed under it
+    """
+
+    def __init__(self, title, data, x, y, labels=None, kind='line', stacked=False):
+        """
+        Args:
+            title (str): chart title
+            data (DataFrame): the data to plot
+            x (str): column on the x axis
+            y (list of str): columns to plot
+            labels (list of str): legend labels for {y}. If None, the column names
+            kind (str): 'line' or 'bar'
+            stacked (bool): whether bars are stacked
+        """
+        self.title = title
+        self.data = data
+        self.x = x
+        self.y = list(y)
+        self.labels = list(labels) if labels is not None else self.y
+        self.kind = kind
+        self.stacked = stacked
+
+    def describe(self):
+        return self.data[self.y].describe()
+
+
+def load_config(path):
+    """
+    Read a config file and resolve every scenario against the defaults
+
+    Returns: (config dict, list of scenario dicts)
+    """
+    with open(path) as config_file:
+        config = json.load(config_file)
+    defaults = dict(SCENARIO_DEFAULTS, **config.get('defaults', {}))
+    scenarios = []
+    for scenario in config.get('scenarios', []):
+        assert 'name' in scenario, "Every scenario needs a name"
+        unknown = set(scenario) - set(SCENARIO_DEFAULTS) - {'name'}
+        assert not unknown, "Unknown fields in scenario {}: {}".format(scenario['name'], sorted(unknown))
+        scenarios.append(dict(defaults, **scenario))
+    names = [scenario['name'] for scenario in scenarios]
+    assert len(names) == len(set(names)), "Scenario names must be unique"
+    report_format = config.get('format', 'pdf')
+    assert report_format in REPORT_FORMATS, "format must be one of {}".format(REPORT_FORMATS)
+    return config, scenarios
+
+
+def area_code(area):
+    """
+    The Quandl code of a scenario's area, or None
+    """
+    if area is None or isinstance(area, str):
+        return area
+    import utils
+    return utils.get_quandl_code(area['category'], area['code'], area['indicator'])
+
+
+def code_version(root=None):
+    """
+    Hash of the source of every module a report depends on
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    paths = []
+    for code_path in CODE_PATHS:
+        full_path = os.path.join(root, code_path)
+        if os.path.isfile(full_path):
+            paths.append(full_path)
+        for directory, _, filenames in os.walk(full_path):
+            paths.extend(os.path.join(directory, filename) for filename in filenames if filename.endswith('.py'))
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, 'rb') as source:
+            digest.update(hashlib.sha256(source.read()).digest())
+    return digest.hexdigest()
+
+
+def _frame_hash(frame):
+    if frame is None:
+        return None
+    return hashlib.sha256(pd.util.hash_pandas_object(frame, index=True).values.tobytes()).hexdigest()
+
+
+def report_key(scenario, report_format, version, area_data=None):
+    """
+    Content hash of everything that determines a report: its inputs, the code, the area data and the format
+    """
+    params = {name: scenario[name] for name in SCENARIO_DEFAULTS if name not in ('area', 'room_rents')}
+    return housing_sim.cache.cache_key(
+        'report',
+        name=scenario['name'],
+        format=report_format,
+        code=version,
+        room_rents=list(scenario['room_rents']),
+        area=area_code(scenario['area']),
+        area_data=_frame_hash(area_data),
+        **params
+    )
+
+
+def _start_date(scenario):
+    return pd.Timestamp(scenario['start_date']).date()
+
+
+def build_models(scenario):
+    """
+    The mortgage, home, apartment and extra-payment mortgage of a scenario
+
+    Returns: dict of 'mortgage', 'home', 'apartment', 'extra_pay_mortgage'
+    """
+    start = _start_date(scenario)
+    mortgage = SimpleFixedRateMortgage(
+        scenario['interest_rate'], scenario['purchase_price'], scenario['down_payment_pct'], start, scenario['months']
+    )
+    home = SimpleHome(scenario['purchase_price'], mortgage)
+    for name in ('appreciation_rate', 'homeowners_insurance_rate', 'property_tax_rate', 'closing_cost_rate',
+                 'title_insurance_rate'):
+        setattr(home, name, scenario[name])
+    apartment = Apartment(scenario['base_rent'], start, scenario['months'])
+    apartment.yearly_increase_rate = scenario['rent_increase_rate']
+    extra_pay_mortgage = DownPayableFixedRateMortgage(
+        scenario['interest_rate'], scenario['purchase_price'], scenario['down_payment_pct'], start, scenario['months'],
+        extra_payment=scenario['extra_payment']
+    )
+    return {'mortgage': mortgage, 'home': home, 'apartment': apartment, 'extra_pay_mortgage': extra_pay_mortgage}
+
+
+def _yearly(data, how='sum'):
+    """
+    Monthly data grouped by calendar year, with the year in 'date'
+    """
+    years = data['date'].dt.year.rename('date')
+    return getattr(data.drop(columns='date').groupby(years), how)().reset_index()
+
+
+def report_summary(models):
+    """
+    The report's opening text, as in single_home_analysis.ipynb
+    """
+    home, mortgage, apartment = models['home'], models['mortgage'], models['apartment']
+    return "\n".join([
+        "Home",
+        "Purchase price ${:.2f}.".format(home.purchase_price),
+        "Yearly appreciation rate: {:.2f}%".format(home.appreciation_rate * 100),
+        "",
+        "Mortgage",
+        "${:.2f} fixed payment.".format(mortgage.fixed_monthly_payment_size),
+        "Yearly interest rate: {:.2f}%.".format(mortgage.interest_rate * 100),
+        "Down payment: {:.2f}%".format(mortgage.down_payment_pct * 100),
+        "",
+        "Rent:",
+        "${}/month.".format(apartment.base_rent),
+        "Yearly increase rate: {:.2f}%".format(apartment.yearly_increase_rate * 100),
+    ])
+
+
+def report_sections(scenario, models=None, area_data=None):
+    """
+    Every chart of a scenario's report, the same analysis as single_home_analysis.ipynb
+
+    Args:
+        scenario (dict): resolved scenario, see load_config
+        models (dict): the scenario's models. If None, built with build_models
+        area_data (DataFrame): the area's home value series, if the scenario has an area
+
+    Returns: list of Section
+    """
+    models = models or build_models(scenario)
+    sections = []
+
+    # Mortgage
+    mortgage = models['mortgage'].get_data()
+    mortgage['total_paid'] = mortgage['total_principal'] + mortgage['total_interest']
+    mortgage['payment'] = mortgage['principal'] + mortgage['interest']
+    mortgage['% Interest'] = mortgage['interest'] / mortgage['payment']
+    mortgage['% Principal'] = mortgage['principal'] / mortgage['payment']
+    sections.append(Section('Total Cost of a Mortgage', mortgage, 'date', ['total_paid', 'total_principal', 'total_interest'],
+                            ['Total paid', 'Principal', 'Interest']))
+    sections.append(Section('Where Does the Money Go Each Month?', mortgage, 'date', ['% Interest', '% Principal']))
+
+    # Paying down a mortgage early
+    if np.any(scenario['extra_payment']):
+        extra = models['extra_pay_mortgage'].get_data()
+        label = '+${:.0f}/mo'.format(np.mean(scenario['extra_payment']))
+        early = pd.DataFrame({
+            'date': mortgage['date'],
+            'Paid (No extra)': mortgage['total_paid'],
+            'Principal (No extra)': mortgage['total_principal'],
+            'Interest (No extra)': mortgage['total_interest'],
+            'Paid ({})'.format(label): extra['total_principal'] + extra['total_extra_principal'] + extra['total_interest'],
+            'Principal ({})'.format(label): extra['total_principal'] + extra['total_extra_principal'],
+            'Interest ({})'.format(label): extra['total_interest'],
+        })
+        sections.append(Section('Paying Down a Mortgage Early', early, 'date', early.columns[1:]))
+
+    # Home ownership
+    home = models['home'].get_data()
+    home['total'] = home['total_direct'] + home['total_indirect']
+    home['equity'] = home['home_value'] * home['home_ownership_pct']
+    sections.append(Section('How Much Does Home Ownership Cost?', home, 'date', ['total', 'equity', 'home_value'],
+                            ['Total Paid', 'Equity Built', 'Value of Home']))
+    yearly_home = _yearly(home[['date', 'direct', 'indirect']])
+    sections.append(Section('Direct vs Indirect Costs (Yearly)', yearly_home, 'date', ['indirect', 'direct'],
+                            ['Indirect Costs', 'Direct Costs'], kind='bar', stacked=True))
+    indirect = models['home'].get_indirect_cost_data()
+    indirect['date'] = home['date']
+    sections.append(Section('Where Do I Lose Money each Year?', _yearly(indirect),
+                            'date', ['interest', 'property_tax', 'homeowners_insurance', 'fees'],
+                            ['Mortgage Interest', 'Property Tax', 'Insurance', 'Fees'], kind='bar', stacked=True))
+
+    # Comparing rent vs home ownership
+    rent = models['apartment'].get_data()
+    both = home.join(rent[['rent', 'total_rent']])
+    sections.append(Section('Rent vs Indirect Costs (Cumulative) - lower is better', both, 'date',
+                            ['total_rent', 'total_indirect'], ['Rent', 'Home Indirect']))
+    yearly = _yearly(both[['date', 'rent', 'direct', 'indirect']])
+    yearly['total'] = yearly['direct'] + yearly['indirect']
+    sections.append(Section('Rent vs Total Costs (Yearly) - lower is better', yearly, 'date', ['rent', 'total'],
+                            ['Rent', 'Home Total'], kind='bar'))
+    both['rent_vs_indirect'] = both['total_rent'] - both['total_indirect']
+    both['rent_vs_net_loss'] = both['total_rent'] - (both['total'] - both['equity'])
+    both['oop_diff'] = both['total_rent'] - both['total']
+    year_end = _yearly(both, how='max')
+    sections.append(Section('Different Ways of Looking at Rent vs Home Ownership - higher is better', year_end, 'date',
+                            ['rent_vs_indirect', 'oop_diff', 'rent_vs_net_loss'],
+                            ['Money Lost - Rent above Indirect Costs',
+                             'Out of pocket difference - Rent above Home Total Cost',
+                             'Money Lost Adjusted for Home Appreciation - Rent above (Home Total-Equity)']))
+
+    # Renting out a room for the first few years
+    if len(scenario['room_rents']):
+        rental_years = min(scenario['room_rental_years'], len(year_end))
+        net_loss = pd.DataFrame({'date': year_end['date'], 'No room rental': year_end['total'] - year_end['equity']})
+        for room_rent in scenario['room_rents']:
+            yearly_income = np.zeros(len(year_end))
+            yearly_income[:rental_years] = room_rent * 12
+            column = 'Rent room at ${:.0f}/mo for first {} years'.format(room_rent, rental_years)
+            net_loss[column] = net_loss['No room rental'] - np.cumsum(yearly_income)
+        net_loss['Being the renter starting at ${:.0f}/mo'.format(scenario['base_rent'])] = year_end['total_rent']
+        sections.append(Section('Net Loss - lower is better', net_loss, 'date', net_loss.columns[1:]))
+
+    # Area home values
+    if area_data is not None and len(area_data):
+        area = area_data.reset_index()
+        area.columns = ['date', 'value']
+        sections.append(Section('Home Values in {}'.format(area_code(scenario['area'])), area, 'date', ['value'],
+                                ['Home value index']))
+
+    return sections
+
+
+def render_pdf(summary, sections, path):
+    """
+    Write a report as a PDF, one page per chart with its summary statistics
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    with PdfPages(path) as pdf:
+        figure = plt.figure(figsize=(11, 8.5))
+        figure.text(0.1, 0.9, summary, va='top', family='monospace', fontsize=14)
+        pdf.savefig(figure)
+        plt.close(figure)
+
+        for section in sections:
+            figure, (chart, table) = plt.subplots(2, 1, figsize=(11, 8.5), gridspec_kw={'height_ratios': [3, 1]})
+            section.data.plot(kind=section.kind, x=section.x, y=section.y, stacked=section.stacked, title=section.title,
+                              ax=chart)
+            chart.legend(section.labels)
+            table.axis('off')
+            stats = section.describe().round(2)
+            table.table(cellText=stats.values, rowLabels=stats.index, colLabels=section.labels, loc='center')
+            pdf.savefig(figure)
+            plt.close(figure)
+
+
+def render_html(summary, sections, path):
+    """
+    Write a report as HTML with the summary statistics of every chart, without needing matplotlib
+    """
+    parts = ['<html><body>', '<pre>{}</pre>'.format(html.escape(summary))]
+    for section in sections:
+        parts.append('<h2>{}</h2>'.format(html.escape(section.title)))
+        stats = section.describe()
+        stats.columns = section.labels
+        parts.append(stats.to_html(float_format='{:,.2f}'.format))
+    parts.append('</body></html>')
+    with open(path, 'w') as report_file:
+        report_file.write('\n'.join(parts))
+
+
+RENDERERS = {'pdf': render_pdf, 'html': render_html}
+
+
+def render_report(scenario, path, report_format='pdf', area_data=None):
+    """
+    Compute and write one scenario's report
+
+    Returns: seconds taken
+    """
+    started = time.perf_counter()
+    models = build_models(scenario)
+    sections = report_sections(scenario, models, area_data)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        RENDERERS[report_format](report_summary(models), sections, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return time.perf_counter() - started
+
+
+def _init_worker(cache_dir):
+    housing_sim.cache.set_default_cache(housing_sim.cache.SimulationCache(disk_dir=cache_dir))
+
+
+def _render_task(scenario, path, report_format, area_data):
+    try:
+        return scenario['name'], render_report(scenario, path, report_format, area_data), None
+    except Exception as error:
+        return scenario['name'], None, '{}: {}'.format(type(error).__name__, error)
+
+
+def fetch_areas(scenarios, refresh=None, fetch=None):
+    """
+    Every area series the scenarios need, each fetched once through utils.bulk_quandl_get and the local store
+
+    Returns: dict of Quandl code -> DataFrame
+    """
+    codes = sorted(set(area_code(scenario['area']) for scenario in scenarios) - {None})
+    if not codes:
+        return {}
+    import utils
+    report = utils.bulk_quandl_get(codes, refresh=refresh, fetch=fetch)
+    for code, error in report.failures.items():
+        print("Could not fetch area {}: {}".format(code, error), file=sys.stderr)
+    return report.results
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILENAME)
+    with open(path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def plan(scenarios, output_dir, report_format='pdf', areas=None, force=False, version=None):
+    """
+    Which reports need rendering
+
+    Returns: list of (scenario, path, key, up_to_date)
+    """
+    areas = areas or {}
+    version = version or code_version()
+    manifest = load_manifest(output_dir)
+    planned = []
+    for scenario in scenarios:
+        path = os.path.join(output_dir, '{}.{}'.format(scenario['name'], report_format))
+        key = report_key(scenario, report_format, version, areas.get(area_code(scenario['area'])))
+        up_to_date = not force and manifest.get(os.path.basename(path)) == key and os.path.exists(path)
+        planned.append((scenario, path, key, up_to_date))
+    return planned
+
+
+def run(config_path, output_dir=None, report_format=None, max_workers=None, cache_dir=None, force=False,
+        refresh=None, fetch=None, out=sys.stdout):
+    """
+    Render every new or changed report of a config file
+
+    Args:
+        config_path (str): the JSON config, see the module docstring
+        output_dir (str): where to write reports. If None, the config's "output_dir"
+        report_format (str): 'pdf' or 'html'. If None, the config's "format"
+        max_workers (int): number of worker processes, 0 to run inline and None for one per CPU
+        cache_dir (str): disk tier of the schedule cache shared by the workers. If None, the config's "cache_dir"
+        force (bool): render every report, even up-to-date ones
+        refresh, fetch: see utils.cached_quandl_get, for the area series
+        out: where to print progress, or None
+
+    Returns: dict with the names of the 'rendered', 'skipped' and 'failed' reports
+    """
+    config, scenarios = load_config(config_path)
+    output_dir = output_dir or config.get('output_dir', DEFAULT_OUTPUT_DIR)
+    report_format = report_format or config.get('format', 'pdf')
+    cache_dir = cache_dir or config.get('cache_dir', DEFAULT_CACHE_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    areas = fetch_areas(scenarios, refresh, fetch)
+    manifest = load_manifest(output_dir)
+    results = {'rendered': [], 'skipped': [], 'failed': []}
+    tasks = []
+    keys = {}
+    for scenario, path, key, up_to_date in plan(scenarios, output_dir, report_format, areas, force):
+        if up_to_date:
+            results['skipped'].append(scenario['name'])
+            continue
+        keys[scenario['name']] = (key, path)
+        tasks.append((scenario, path, report_format, areas.get(area_code(scenario['area']))))
+    _print(out, "{} reports, {} up to date".format(len(scenarios), len(results['skipped'])))
+
+    def handle_result(name, seconds, error):
+        key, path = keys[name]
+        if error is not None:
+            results['failed'].append(name)
+            manifest.pop(os.path.basename(path), None)
+            _print(out, "{:<40} failed: {}".format(name, error))
+            return
+        manifest[os.path.basename(path)] = key
+        results['rendered'].append(name)
+        _print(out, "{:<40} {:>8.2f} s".format(name, seconds))
+
+    try:
+        _run(tasks, max_workers, cache_dir, handle_result)
+    finally:
+        save_manifest(output_dir, manifest)
+    return results
+
+
+def _run(tasks, max_workers, cache_dir, handle_result):
+    """
+    Render every task, inline or on a process pool, keeping at most 2 tasks per worker in flight
+    """
+    if max_workers == 0:
+        previous_cache = housing_sim.cache.get_default_cache()
+        _init_worker(cache_dir)
+        try:
+            for task in tasks:
+                handle_result(*_render_task(*task))
+        finally:
+            housing_sim.cache.set_default_cache(previous_cache)
+        return
+
+    max_workers = max_workers or os.cpu_count()
+    max_in_flight = 2 * max_workers
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(cache_dir,)) as pool:
+        in_flight = set()
+        for task in tasks:
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle_result(*future.result())
+            in_flight.add(pool.submit(_render_task, *task))
+        for future in in_flight:
+            handle_result(*future.result())
+
+
+def _print(out, line):
+    if out is not None:
+        print(line, file=out)
+        out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render one single-home analysis report per scenario")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="render new and changed reports")
+    run_parser.add_argument('config', help="JSON config file")
+    run_parser.add_argument('--output-dir', help="overrides the config's output_dir")
+    run_parser.add_argument('--format', choices=REPORT_FORMATS, help="overrides the config's format")
+    run_parser.add_argument('--workers', type=int, default=None, help="worker processes, 0 to run inline")
+    run_parser.add_argument('--cache-dir', help="overrides the config's cache_dir")
+    run_parser.add_argument('--force', action='store_true', help="render every report, even up-to-date ones")
+    run_parser.add_argument('--refresh', choices=('never', 'if_stale', 'always'), help="when to refresh area series")
+
+    list_parser = commands.add_parser('list', help="show which reports are up to date")
+    list_parser.add_argument('config', help="JSON config file")
+    list_parser.add_argument('--output-dir', help="overrides the config's output_dir")
+    list_parser.add_argument('--format', choices=REPORT_FORMATS, help="overrides the config's format")
+
+    args = parser.parse_args(argv)
+    if args.command == 'list':
+        config, scenarios = load_config(args.config)
+        output_dir = args.output_dir or config.get('output_dir', DEFAULT_OUTPUT_DIR)
+        report_format = args.format or config.get('format', 'pdf')
+        areas = fetch_areas(scenarios, refresh='never')
+        for scenario, path, _, up_to_date in plan(scenarios, output_dir, report_format, areas):
+            print("{:<40} {}".format(scenario['name'], 'up to date' if up_to_date else 'to render'))
+        return 0
+
+    results = run(args.config, args.output_dir, args.format, args.workers, args.cache_dir, args.force, args.refresh)
+    print("{} rendered, {} up to date, {} failed".format(
+        len(results['rendered']), len(results['skipped']), len(results['failed'])))
+    return 1 if results['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.mortgage.adjustable_rate import AdjustableRateMortgage
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+
+START = datetime.date(2020, 1, 1)
+
+
+def test_constant_index_without_resets_is_a_fixed_rate_mortgage():
+    arm = AdjustableRateMortgage(0.04, np.full((3, 360), 0.01), 300000, 0.2, START, 360, fixed_period_months=360)
+    fixed = SimpleFixedRateMortgage(0.04, 300000, 0.2, START, 360).get_schedule()
+    data = arm.get_path_data()
+    for path in range(3):
+        np.testing.assert_allclose(data['interest'][path], fixed['interest'])
+        np.testing.assert_allclose(data['principal'][path], fixed['principal'])
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'reset_interval_months': 0},
+    {'reset_interval_months': -12},
+    {'fixed_period_months': -1},
+])
+def test_invalid_reset_schedule(kwargs):
+    with pytest.raises(AssertionError):
+        AdjustableRateMortgage(0.035, np.full(360, 0.01), 300000, 0.2, START, 360, **kwargs)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_sim import analytics
+from housing_sim.panel import Panel
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2015-01-01', periods=60, freq='MS', name='Date')
+    values = 100 * np.cumprod(1 + rng.normal(0.003, 0.01, size=(60, 5)), axis=0)
+    values[:7, 1] = np.nan
+    values[30, 2] = np.nan
+    values[-4:, 3] = np.nan
+    # Ties, to check they share their rank
+    values[:, 4] = values[:, 0]
+    return pd.DataFrame(values, index=dates, columns=['a', 'b', 'c', 'd', 'e'])
+
+
+@pytest.fixture
+def shuffled(frame):
+    return frame.iloc[np.random.default_rng(1).permutation(len(frame))]
+
+
+def test_normalize(frame):
+    expected = frame / frame.apply(lambda column: column.dropna().iloc[0])
+    pd.testing.assert_frame_equal(analytics.normalize(frame), expected)
+
+
+@pytest.mark.parametrize('order', ['sorted', 'shuffled'])
+def test_yearly_mean(frame, shuffled, order):
+    data = frame if order == 'sorted' else shuffled
+    expected = frame.groupby(frame.index.year).mean()
+    result = analytics.yearly_mean(data)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+    assert list(result.index) == list(expected.index)
+
+
+@pytest.mark.parametrize('order', ['sorted', 'shuffled'])
+def test_yoy_growth(frame, shuffled, order):
+    data = frame if order == 'sorted' else shuffled
+    expected = frame.groupby(frame.index.year).mean().pct_change(fill_method=None)
+    np.testing.assert_allclose(analytics.yoy_growth(data).to_numpy(), expected.to_numpy())
+
+
+def test_yearly_mean_of_arrays_and_panels(frame, shuffled):
+    expected = frame.groupby(frame.index.year).mean().to_numpy().T
+    np.testing.assert_allclose(analytics.yearly_mean(shuffled.to_numpy().T, dates=shuffled.index.values), expected)
+    panel = Panel(frame.to_numpy().T[:, np.newaxis], frame.columns, ['ZHVISF'], frame.index)
+    np.testing.assert_allclose(analytics.yearly_mean(panel).values[:, 0], expected)
+
+
+@pytest.mark.parametrize('order', ['sorted', 'shuffled'])
+def test_cagr(frame, shuffled, order):
+    data = frame if order == 'sorted' else shuffled
+    expected = {}
+    for name, column in frame.items():
+        column = column.dropna()
+        years = (column.index[-1] - column.index[0]).days / 365.25
+        expected[name] = (column.iloc[-1] / column.iloc[0]) ** (1 / years) - 1
+    pd.testing.assert_series_equal(analytics.cagr(data), pd.Series(expected))
+
+
+def test_rolling_returns(frame):
+    expected = frame / frame.shift(12) - 1
+    pd.testing.assert_frame_equal(analytics.rolling_returns(frame, 12), expected)
+
+
+def test_percentile_rank(frame):
+    ranks = frame.rank(axis=1, method='average')
+    expected = (ranks - 1).div(frame.count(axis=1) - 1, axis=0)
+    result = analytics.percentile_rank(frame.T.to_numpy())
+    np.testing.assert_allclose(result.T, expected.to_numpy())
+    np.testing.assert_allclose(analytics.percentile_rank(frame.to_numpy(), axis=1), expected.to_numpy())
+    # Tied areas share their rank
+    np.testing.assert_array_equal(result[0], result[4])
+
+
+def test_quantile_select(frame):
+    last = frame.iloc[-1]
+    assert analytics.quantile_select(frame, q=0.5) == list(last.index[last >= last.quantile(0.5)])
+    assert analytics.quantile_select(frame, q=0.5, top=False) == list(last.index[last <= last.quantile(0.5)])
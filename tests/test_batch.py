@@ -0,0 +1,66 @@
+import datetime
+
+import numpy as np
+
+from housing_sim.mortgage.batch import FixedRateMortgageBatch
+from housing_sim.mortgage.fixed_rate import DownPayableFixedRateMortgage, SimpleFixedRateMortgage
+
+START = datetime.date(2020, 1, 1)
+RATES = [0.04, 0.035, 0.06, 0.0]
+PRICES = [300000, 250000, 400000, 120000]
+DOWN_PAYMENTS = [0.2, 0.1, 0.25, 0.2]
+TERMS = [360, 120, 60, 180]
+
+
+def assert_rows_match(data, row, schedule, term, extra=True):
+    for name in ('principal', 'interest', 'total_principal', 'total_interest'):
+        np.testing.assert_allclose(data[name][row, :term], schedule[name], atol=1e-6, err_msg=name)
+    if extra:
+        for name in ('extra_principal', 'total_extra_principal'):
+            np.testing.assert_allclose(data[name][row, :term], schedule[name], atol=1e-6, err_msg=name)
+        balance = schedule['balance'] - schedule['total_extra_principal']
+    else:
+        balance = schedule['balance']
+    np.testing.assert_allclose(data['balance'][row, :term], np.maximum(balance, 0), atol=1e-6)
+    # Padding after the term
+    for name in ('principal', 'extra_principal', 'interest', 'balance'):
+        assert not data[name][row, term:].any()
+    np.testing.assert_array_equal(data['pct_paid'][row, term:], 1.0)
+    assert not data['active'][row, term:].any()
+
+
+def test_rows_match_scalar_mortgages_with_mixed_terms():
+    batch = FixedRateMortgageBatch(RATES, PRICES, DOWN_PAYMENTS, TERMS)
+    data = batch.get_data()
+    assert data['principal'].shape == (4, 360)
+    for row, (rate, price, down_payment, term) in enumerate(zip(RATES, PRICES, DOWN_PAYMENTS, TERMS)):
+        mortgage = SimpleFixedRateMortgage(rate, price, down_payment, START, term)
+        assert_rows_match(data, row, mortgage.get_schedule(), term, extra=False)
+        assert data['active'][row, :term].all()
+    np.testing.assert_array_equal(batch.get_summary()['payoff_month'], np.array(TERMS) - 1)
+
+
+def test_rows_match_down_payable_mortgages():
+    extra = np.tile([0, 500, 1500], 120)
+    batch = FixedRateMortgageBatch(RATES, PRICES, DOWN_PAYMENTS, TERMS, extra_payment=extra)
+    data = batch.get_data()
+    summary = batch.get_summary()
+    for row, (rate, price, down_payment, term) in enumerate(zip(RATES, PRICES, DOWN_PAYMENTS, TERMS)):
+        mortgage = DownPayableFixedRateMortgage(rate, price, down_payment, START, term, extra_payment=extra)
+        schedule = mortgage.get_schedule()
+        assert_rows_match(data, row, schedule, term)
+
+        # Paid off early by the extra payments
+        payments = schedule['principal'] + schedule['extra_principal'] + schedule['interest']
+        payoff_month = np.nonzero(payments)[0][-1]
+        assert payoff_month < term - 1
+        assert summary['payoff_month'][row] == payoff_month
+        np.testing.assert_allclose(summary['total_interest'][row], schedule['total_interest'][-1])
+
+
+def test_grid_order():
+    batch = FixedRateMortgageBatch.from_grid([0.03, 0.05], [200000, 300000], [0.2], [180, 360])
+    assert batch.grid_shape == (2, 2, 1, 2)
+    interest = batch.get_summary()['total_interest'].reshape(batch.grid_shape)
+    expected = SimpleFixedRateMortgage(0.05, 200000, 0.2, START, 180).get_schedule()['total_interest'][-1]
+    np.testing.assert_allclose(interest[1, 0, 0, 0], expected)
@@ -0,0 +1,35 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.housing.apartment import Apartment
+from housing_sim.housing.breakeven import BreakevenSolver
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+
+START = datetime.date(2020, 1, 1)
+
+
+@pytest.fixture
+def solver():
+    home = SimpleHome(300000, SimpleFixedRateMortgage(0.04, 300000, 0.2, START, 360))
+    return BreakevenSolver(home, Apartment(1500, START, 360))
+
+
+def test_breakeven_price_breaks_even(solver):
+    price = solver.breakeven_price(59, interest_rate=np.array([0.03, 0.05]))
+    advantage = solver.advantage(purchase_price=price, interest_rate=np.array([0.03, 0.05]))
+    np.testing.assert_allclose(advantage[..., 59], 0, atol=1e-6)
+
+
+def test_breakeven_rent_breaks_even(solver):
+    rent = solver.breakeven_rent(59, interest_rate=0.05)
+    assert solver.advantage(base_rent=rent, interest_rate=0.05)[59] == pytest.approx(0, abs=1e-6)
+
+
+def test_solved_parameter_cant_be_overridden(solver):
+    with pytest.raises(AssertionError):
+        solver.breakeven_price(59, purchase_price=123)
+    with pytest.raises(AssertionError):
+        solver.breakeven_rent(59, base_rent=123)
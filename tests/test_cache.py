@@ -0,0 +1,111 @@
+import datetime
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from housing_sim.cache import SimulationCache, cache_key
+from housing_sim.mortgage.adjustable_rate import AdjustableRateMortgage
+from housing_sim.mortgage.fixed_rate import DownPayableFixedRateMortgage, SimpleFixedRateMortgage
+from housing_sim.schedule import Schedule
+
+START = datetime.date(2020, 1, 1)
+
+
+def schedule(value, num_months=12):
+    # 8 bytes per month
+    return Schedule(START, num_months, {'value': np.full(num_months, float(value))})
+
+
+def test_least_recently_used_is_evicted_first():
+    cache = SimulationCache(max_entries=2)
+    cache.put('a', schedule(1))
+    cache.put('b', schedule(2))
+    cache.get('a')
+    cache.put('c', schedule(3))
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_bound():
+    cache = SimulationCache(max_bytes=3 * 8 * 12)
+    for i in range(5):
+        cache.put(str(i), schedule(i))
+    assert len(cache) == 3
+    assert cache.stats()['bytes'] == 3 * 8 * 12
+    # A single entry larger than the bound is still kept
+    cache.put('big', schedule(0, num_months=100))
+    assert list(cache._entries) == ['big']
+
+
+def test_disabled_memory_tier():
+    cache = SimulationCache(max_entries=0)
+    cache.put('a', schedule(1))
+    assert cache.get('a') is None
+
+
+def test_disk_round_trip(tmp_path):
+    cache = SimulationCache(max_entries=1, disk_dir=str(tmp_path))
+    cache.put('a', schedule(1))
+    cache.put('b', schedule(2))
+    assert 'a' not in cache
+
+    restored = cache.get('a')
+    assert cache.stats()['disk_hits'] == 1
+    assert restored.start_date == START and len(restored) == 12
+    np.testing.assert_array_equal(restored['value'], np.ones(12))
+    # Survives a restart
+    assert SimulationCache(disk_dir=str(tmp_path)).get('b') is not None
+
+
+def test_equal_parameters_share_a_key():
+    assert cache_key('x', rate=4, start=START) == cache_key('x', start=START, rate=4.0)
+    assert cache_key('x', start=START) == cache_key('x', start=np.datetime64('2020-01-01'))
+    assert cache_key('x', values=[1, 2]) == cache_key('x', values=np.array([1.0, 2.0]))
+    assert cache_key('x', values=[1, 2]) != cache_key('x', values=[[1, 2]])
+    assert cache_key('x', rate=4) != cache_key('y', rate=4)
+
+
+def test_different_models_get_different_keys():
+    index = np.linspace(0.01, 0.05, 2 * 360).reshape(2, 360)
+    arm = AdjustableRateMortgage(0.035, index, 300000, 0.2, START, 360)
+    assert arm.for_path(0).cache_key() != arm.for_path(1).cache_key()
+
+    keys = {
+        SimpleFixedRateMortgage(0.04, 300000, 0.2, START, 360).cache_key(),
+        DownPayableFixedRateMortgage(0.04, 300000, 0.2, START, 360).cache_key(),
+        DownPayableFixedRateMortgage(0.04, 300000, 0.2, START, 360, extra_payment=100).cache_key(),
+        DownPayableFixedRateMortgage(0.04, 300000, 0.2, START, 360, extra_payment=[100, 0]).cache_key(),
+    }
+    assert len(keys) == 4
+
+
+def test_concurrent_callers_compute_once():
+    cache = SimulationCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return schedule(1)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('a', compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_failed_compute_is_not_cached():
+    cache = SimulationCache()
+
+    def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('a', fail)
+    assert cache.get_or_compute('a', lambda: schedule(1)) is not None
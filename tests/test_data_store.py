@@ -0,0 +1,103 @@
+import time
+
+import pandas as pd
+import pytest
+
+import constants
+import data_store
+import utils
+from data_store import OPEN_END, OPEN_START, SeriesStore
+
+
+def monthly(start, end):
+    dates = pd.date_range(start, end, freq='ME', name='Date')
+    return pd.DataFrame({'Value': range(len(dates))}, index=dates, dtype=float)
+
+
+def set_age(store, code, days):
+    with store._connection:
+        store._connection.execute("UPDATE coverage SET fetched_at = ? WHERE code = ?", (time.time() - days * 86400, code))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SeriesStore(str(tmp_path / 'quandl.sqlite'), max_age_days=30)
+    # Covers 2005-2019, last observation 2019-12-31
+    store.write('A', monthly('2005-01-01', '2019-12-31'), '2005-01-01', '2019-12-31')
+    yield store
+    store.close()
+
+
+def test_nothing_stored(store):
+    assert store.missing_ranges('B', '2010-01-01', None) == [('2010-01-01', OPEN_END)]
+
+
+@pytest.mark.parametrize('refresh', data_store.REFRESH_POLICIES)
+def test_earlier_and_later_ranges_are_missing(store, refresh):
+    expected = [('2000-01-01', '2005-01-01'), ('2019-12-31', '2021-12-31')]
+    assert store.missing_ranges('A', '2000-01-01', '2021-12-31', refresh=refresh) == expected
+
+
+@pytest.mark.parametrize('refresh, age, expected', [
+    ('never', 0, []),
+    ('never', 90, []),
+    ('if_stale', 0, []),
+    ('if_stale', 90, [('2019-12-31', '2019-12-31')]),
+    ('always', 0, [('2019-12-31', '2019-12-31')]),
+])
+def test_covered_request(store, refresh, age, expected):
+    set_age(store, 'A', age)
+    assert store.missing_ranges('A', '2010-01-01', '2019-12-31', refresh=refresh) == expected
+
+
+def test_open_ended_request_refreshes_from_the_last_date(store):
+    set_age(store, 'A', 90)
+    assert store.missing_ranges('A', None, None, refresh='if_stale') == [
+        (OPEN_START, '2005-01-01'), ('2019-12-31', OPEN_END)
+    ]
+
+
+@pytest.mark.parametrize('refresh, expected', [
+    ('never', []),
+    ('if_stale', []),
+    ('always', [('2019-12-31', '2019-12-31')]),
+])
+def test_historical_request(store, refresh, expected):
+    # Ends before the last stored observation, so newer data can't change it even if the series is stale
+    set_age(store, 'A', 90)
+    assert store.missing_ranges('A', '2010-01-01', '2015-12-31', refresh=refresh) == expected
+
+
+def test_refresh_keeps_the_coverage_start(store):
+    store.write('A', monthly('2019-12-01', '2020-06-30'), '2019-12-31', OPEN_END)
+    start, end, _ = store.coverage('A')
+    assert (start, end) == ('2005-01-01', OPEN_END)
+    assert store.read('A', '2020-01-01', None).index[-1] == pd.Timestamp('2020-06-30')
+
+
+def test_expire(store):
+    store.write('B', monthly('2010-01-01', '2019-12-31'), '2010-01-01', '2019-12-31')
+    set_age(store, 'B', 400)
+    assert store.expire(365) == 1
+    assert store.coverage('B') is None
+    assert store.read('B').empty
+    assert store.coverage('A') is not None
+
+
+def test_series_store_expires_on_open(tmp_path, monkeypatch):
+    monkeypatch.setattr(constants, 'DATA_DIR', str(tmp_path))
+    path = str(tmp_path / constants.QUANDL_STORE_FILENAME)
+    store = SeriesStore(path)
+    store.write('old', monthly('2010-01-01', '2010-12-31'), '2010-01-01', '2010-12-31')
+    store.write('new', monthly('2010-01-01', '2010-12-31'), '2010-01-01', '2010-12-31')
+    set_age(store, 'old', constants.QUANDL_CACHE_EXPIRE_DAYS + 1)
+    store.close()
+
+    previous = utils.set_series_store(None)
+    try:
+        opened = utils.get_series_store()
+        assert opened.coverage('old') is None
+        assert opened.coverage('new') is not None
+    finally:
+        utils.set_series_store(previous)
+        opened.close()
@@ -0,0 +1,80 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.mortgage.amortization import fixed_payment
+from housing_sim.mortgage.fixed_rate import DownPayableFixedRateMortgage
+from housing_sim.utils import fit_to_array
+
+START = datetime.date(2020, 1, 1)
+
+
+def loop_amortize(loan_amount, yearly_interest_rate, loan_period_months, extra_payment):
+    """
+    The month-by-month loop DownPayableFixedRateMortgage used before it was vectorized
+    """
+    payment = float(fixed_payment(loan_amount, yearly_interest_rate / 12, loan_period_months))
+    extra_payment = fit_to_array(extra_payment, loan_period_months)
+    rate = yearly_interest_rate / 12
+    balance = loan_amount
+    rows = []
+    for month in range(loan_period_months):
+        if balance >= 0.01:
+            interest = rate * balance
+            payment = min(payment, balance + interest)
+            principal = payment - interest
+            extra_principal = min(extra_payment[month], balance - principal)
+            balance = balance - principal - extra_principal
+        else:
+            interest = principal = extra_principal = 0
+        rows.append((principal, extra_principal, interest))
+    principal, extra_principal, interest = [np.array(column) for column in zip(*rows)]
+    total_principal = np.cumsum(principal)
+    return {
+        'principal': principal,
+        'extra_principal': extra_principal,
+        'interest': interest,
+        'total_principal': total_principal,
+        'total_extra_principal': np.cumsum(extra_principal),
+        'total_interest': np.cumsum(interest),
+        'balance': loan_amount - total_principal,
+        'pct_paid': total_principal / loan_amount,
+    }, balance
+
+
+@pytest.mark.parametrize('rate, months, extra_payment', [
+    (0.04, 360, 0),
+    (0.0, 360, 0),
+    (0.0, 120, 500),
+    (0.04, 360, 1500),  # early payoff
+    (0.04, 360, 10**6),  # paid off in the first month
+    (0.065, 12, 0),
+    (0.065, 1, 0),
+    (0.05, 24, 2000),
+    (0.04, 360, [0, 0, 250, 5000, 0]),  # repeated array
+    (0.04, 60, np.linspace(0, 4000, 80)),  # truncated array
+])
+def test_matches_loop(rate, months, extra_payment):
+    mortgage = DownPayableFixedRateMortgage(rate, 250000, 0.2, START, months, extra_payment=extra_payment)
+    schedule = mortgage.get_schedule()
+    expected, balance = loop_amortize(mortgage.loan_amount, rate, months, extra_payment)
+    for name, values in expected.items():
+        np.testing.assert_allclose(schedule[name], values, rtol=1e-9, atol=1e-6, err_msg=name)
+    assert mortgage.balance == pytest.approx(balance, abs=1e-6)
+
+
+def test_zeroed_after_payoff():
+    mortgage = DownPayableFixedRateMortgage(0.04, 250000, 0.2, START, 360, extra_payment=3000)
+    schedule = mortgage.get_schedule()
+    paid_off = np.argmax(schedule['principal'] == 0)
+    assert 0 < paid_off < 360
+    for name in ('principal', 'extra_principal', 'interest'):
+        assert not schedule[name][paid_off:].any()
+    assert mortgage.is_paid
+
+
+def test_dates_start_on_the_first_whole_month():
+    mortgage = DownPayableFixedRateMortgage(0.04, 250000, 0.2, datetime.date(2020, 1, 15), 3)
+    dates = mortgage.get_data()['date']
+    assert list(dates.dt.strftime('%Y-%m-%d')) == ['2020-02-01', '2020-03-01', '2020-04-01']
@@ -0,0 +1,22 @@
+import pytest
+
+import benchmarking
+
+
+@pytest.fixture(scope='module')
+def imports():
+    return benchmarking.measure_imports(benchmarking.housing_sim_modules())
+
+
+def test_every_module_is_measured():
+    assert set(benchmarking.IMPORT_MODULES) == set(benchmarking.housing_sim_modules())
+    assert 'housing_sim.service' in benchmarking.IMPORT_MODULES
+
+
+def test_no_forbidden_imports(imports):
+    assert not imports['forbidden'], "housing_sim must import these lazily: {}".format(imports['forbidden'])
+
+
+def test_import_time_within_budget(imports):
+    assert imports['own_ms'] <= benchmarking.IMPORT_BUDGET_MS, \
+        "housing_sim takes {:.1f} ms to import, the budget is {} ms".format(imports['own_ms'], benchmarking.IMPORT_BUDGET_MS)
@@ -0,0 +1,73 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from housing_sim import instrumentation
+
+
+def work():
+    with instrumentation.span('outer'):
+        instrumentation.count('rows', 10)
+        for _ in range(3):
+            with instrumentation.span('inner'):
+                instrumentation.count('rows')
+    return 'done'
+
+
+def test_nothing_is_recorded_outside_collect():
+    assert not instrumentation.enabled()
+    assert instrumentation.span('outer') is instrumentation._NO_SPAN
+    work()
+    with instrumentation.collect() as report:
+        pass
+    assert report.spans == {} and report.counters == {}
+    assert instrumentation._reports == []
+
+
+def test_nested_spans_and_counts():
+    with instrumentation.collect() as outer:
+        assert instrumentation.enabled()
+        work()
+        with instrumentation.collect() as inner:
+            work()
+    work()
+    assert not instrumentation.enabled()
+
+    assert outer.counters == {'rows': 26}
+    assert inner.counters == {'rows': 13}
+    assert outer.spans['outer']['calls'] == 2 and outer.spans['inner']['calls'] == 6
+    assert inner.spans['outer']['calls'] == 1 and inner.spans['inner']['calls'] == 3
+    for span in outer.spans.values():
+        assert 0 <= span['min'] <= span['max'] <= span['total']
+    assert outer.spans['inner']['total'] <= outer.spans['outer']['total']
+    assert outer.wall_time >= outer.spans['outer']['total']
+
+
+def test_collect_stops_recording_on_an_exception():
+    with pytest.raises(ValueError):
+        with instrumentation.collect() as report:
+            work()
+            raise ValueError
+    assert report.counters == {'rows': 13} and report.wall_time is not None
+    assert not instrumentation.enabled()
+
+
+def test_profile_and_exports(tmp_path):
+    result, report = instrumentation.profile(work)
+    assert result == 'done'
+    assert report.profile is not None
+    assert report.counters == {'rows': 13}
+
+    text = report.to_json(str(tmp_path / 'report.json'))
+    assert (tmp_path / 'report.json').read_text() == text
+    assert json.loads(text)['counters'] == {'rows': 13}
+
+    text = report.to_csv(str(tmp_path / 'report.csv'))
+    assert (tmp_path / 'report.csv').read_text() == text
+    frame = pd.read_csv(io.StringIO(text))
+    assert list(frame['kind']) == ['span', 'span', 'counter']
+    assert list(frame['name']) == ['outer', 'inner', 'rows']
+    assert list(frame['calls'][:2]) == [1, 3]
+    assert frame['value'][2] == 13
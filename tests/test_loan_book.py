@@ -0,0 +1,114 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_sim.loan_book import CASH_FLOW_COLUMNS, SCHEDULE_COLUMNS, SUMMARY_COLUMNS, LoanBookSimulation
+from housing_sim.mortgage.fixed_rate import DownPayableFixedRateMortgage, SimpleFixedRateMortgage
+from housing_sim.timeline import first_month
+
+DEFAULT_START = datetime.date(2020, 2, 1)
+NUM_MONTHS = 120
+
+# Loan c has blank start_date, term and extra payment, loan e a blank extra payment, loan d starts mid-month
+BOOK = """loan_id,interest_rate,purchase_price,down_payment_pct,loan_period_months,start_date,extra_payment
+a,0.04,300000,0.2,120,2020-01-01,0
+b,0.05,200000,0.1,60,2020-03-01,500
+c,0.03,250000,0.2,,,
+d,0.045,400000,0.25,120,2020-01-15,2000
+e,0.06,150000,0.2,36,2021-01-01,
+"""
+LOANS = [
+    # (rate, price, down payment, term, start, extra payment)
+    (0.04, 300000, 0.2, 120, datetime.date(2020, 1, 1), 0),
+    (0.05, 200000, 0.1, 60, datetime.date(2020, 3, 1), 500),
+    (0.03, 250000, 0.2, 120, DEFAULT_START, 0),
+    (0.045, 400000, 0.25, 120, datetime.date(2020, 1, 15), 2000),
+    (0.06, 150000, 0.2, 36, datetime.date(2021, 1, 1), 0),
+]
+
+
+def pad(values):
+    return np.pad(np.asarray(values, dtype=float), (0, NUM_MONTHS - len(values)))
+
+
+def expected_schedules(rate, price, down_payment, term, start, extra):
+    if extra:
+        schedule = DownPayableFixedRateMortgage(rate, price, down_payment, start, term, extra_payment=extra).get_schedule()
+        extra_principal = schedule['extra_principal']
+        balance = schedule['balance'] - schedule['total_extra_principal']
+    else:
+        schedule = SimpleFixedRateMortgage(rate, price, down_payment, start, term).get_schedule()
+        extra_principal = np.zeros(term)
+        balance = schedule['balance']
+    return {
+        'principal': pad(schedule['principal']),
+        'extra_principal': pad(extra_principal),
+        'interest': pad(schedule['interest']),
+        'balance': pad(np.maximum(balance, 0)),
+    }
+
+
+@pytest.fixture(scope='module')
+def book(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('book')
+    path = directory / 'loans.csv'
+    path.write_text(BOOK)
+    simulation = LoanBookSimulation(str(path), str(directory / 'out'), start_date=DEFAULT_START,
+                                    loan_period_months=NUM_MONTHS, chunk_size=2, max_workers=0, dtype=np.float64)
+    cash_flows = simulation.run()
+    return simulation, cash_flows
+
+
+def test_schedules_match_mortgages(book):
+    simulation, _ = book
+    outputs = {name: np.load(simulation.schedule_path(name)) for name in SCHEDULE_COLUMNS}
+    for row, loan in enumerate(LOANS):
+        for name, values in expected_schedules(*loan).items():
+            np.testing.assert_allclose(outputs[name][row], values, atol=1e-6, err_msg="{} of loan {}".format(name, row))
+
+
+def test_summary(book):
+    simulation, _ = book
+    summary = pd.read_csv(simulation.summary_path)
+    assert list(summary.columns) == ['loan_id', 'row'] + list(SUMMARY_COLUMNS)
+    assert list(summary['loan_id']) == ['a', 'b', 'c', 'd', 'e']
+    assert list(summary['row']) == [0, 1, 2, 3, 4]
+    interest = np.load(simulation.schedule_path('interest'))
+    np.testing.assert_allclose(summary['total_interest'], interest.sum(axis=1))
+    assert summary['total_interest'].notna().all()
+    # Extra payments pay loans b and d off early
+    assert 0 < summary['payoff_month'][1] < 59
+    assert 0 < summary['payoff_month'][3] < 119
+    assert summary['payoff_month'][4] == 35
+
+
+def test_cash_flows_add_up_by_calendar_month(book):
+    simulation, cash_flows = book
+    assert list(cash_flows.columns) == ['date'] + list(CASH_FLOW_COLUMNS)
+    pd.testing.assert_frame_equal(pd.read_csv(simulation.cash_flow_path, parse_dates=['date']), cash_flows,
+                                  check_dtype=False)
+
+    starts = np.array([first_month(loan[4]).astype(np.int64) for loan in LOANS])
+    assert cash_flows['date'][0] == pd.Timestamp('2020-01-01')
+    assert len(cash_flows) == starts.max() - starts.min() + NUM_MONTHS
+
+    expected = {name: np.zeros(len(cash_flows)) for name in CASH_FLOW_COLUMNS}
+    for loan, start in zip(LOANS, starts):
+        offset = start - starts.min()
+        schedules = expected_schedules(*loan)
+        for name in SCHEDULE_COLUMNS:
+            expected[name][offset:offset + NUM_MONTHS] += schedules[name]
+        active = (schedules['principal'] + schedules['extra_principal'] + schedules['interest']) > 0
+        expected['active_loans'][offset:offset + NUM_MONTHS] += active
+    for name in CASH_FLOW_COLUMNS:
+        np.testing.assert_allclose(cash_flows[name], expected[name], atol=1e-5, err_msg=name)
+
+
+def test_blank_start_date_needs_a_default(tmp_path):
+    path = tmp_path / 'loans.csv'
+    path.write_text(BOOK)
+    simulation = LoanBookSimulation(str(path), str(tmp_path / 'out'), max_workers=0, loan_period_months=NUM_MONTHS)
+    with pytest.raises(AssertionError):
+        simulation.run()
@@ -0,0 +1,35 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.housing.apartment import Apartment
+from housing_sim.housing.monte_carlo import MonteCarloSimulation, percentile_bands
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+
+START = datetime.date(2020, 1, 1)
+
+
+@pytest.fixture
+def simulation():
+    home = SimpleHome(300000, SimpleFixedRateMortgage(0.04, 300000, 0.2, START, 120))
+    return MonteCarloSimulation(home, Apartment(1500, START, 120))
+
+
+def test_bands_match_percentiles_of_every_path(simulation):
+    kwargs = dict(seed=42, chunk_size=100, max_workers=0)
+    bands = simulation.simulate_bands(450, **kwargs)
+    expected = percentile_bands(simulation.simulate(450, **kwargs))
+    np.testing.assert_array_equal(bands['percentiles'], [5, 25, 50, 75, 95])
+    for name in ('home_value', 'homeowners_insurance', 'property_tax', 'equity', 'total_rent'):
+        np.testing.assert_allclose(bands[name], expected[name], rtol=1e-6, err_msg=name)
+
+
+def test_seeded_paths_are_reproducible(simulation):
+    first = simulation.simulate(50, seed=7, chunk_size=20, max_workers=0)
+    second = simulation.simulate(50, seed=7, chunk_size=20, max_workers=0)
+    for name, values in first.items():
+        assert values.shape == (50, 120)
+        np.testing.assert_array_equal(values, second[name])
+    np.testing.assert_allclose(first['home_value'][:, 0], 300000)
@@ -0,0 +1,31 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+from housing_sim.precision import DOUBLE, SINGLE, get_default_precision, measure_drift, using_precision
+
+
+def test_single_precision_drift_is_within_bound():
+    drift = measure_drift(num_scenarios=50, num_months=60, num_paths=50)
+    assert set(drift['model']) >= {'SimpleFixedRateMortgage', 'SimpleHome', 'Apartment', 'FixedRateMortgageBatch',
+                                   'MonteCarloSimulation'}
+    assert drift['within_bound'].all(), drift[~drift['within_bound']]
+    # Money halves, month indexes shrink to int16
+    assert (drift['bytes_ratio'] <= 0.5).all()
+
+
+def test_using_precision_restores_the_previous_one():
+    assert get_default_precision() is DOUBLE
+    with using_precision('single') as precision:
+        assert precision is SINGLE and get_default_precision() is SINGLE
+        schedule = SimpleFixedRateMortgage(0.04, 300000, 0.2, datetime.date(2020, 1, 1), 24)._compute_schedule()
+        assert schedule['interest'].dtype == np.float32
+        assert schedule['month'].dtype == np.int16
+    assert get_default_precision() is DOUBLE
+
+    with pytest.raises(ValueError):
+        with using_precision('single'):
+            raise ValueError("failed")
+    assert get_default_precision() is DOUBLE
@@ -0,0 +1,56 @@
+import json
+
+import pandas as pd
+import pytest
+
+import reports
+
+SCENARIOS = [
+    {'name': 'small', 'purchase_price': 200000},
+    {'name': 'large', 'purchase_price': 400000, 'base_rent': 2000},
+]
+
+
+def write_config(path, scenarios):
+    config = {'format': 'html', 'defaults': {'months': 60, 'room_rental_years': 2}, 'scenarios': scenarios}
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+@pytest.mark.parametrize('max_workers', [2, 0])
+def test_only_new_and_changed_reports_are_rendered(tmp_path, max_workers):
+    config = tmp_path / 'reports.json'
+    kwargs = dict(output_dir=str(tmp_path / 'reports'), max_workers=max_workers, cache_dir=str(tmp_path / 'cache'),
+                  out=None)
+
+    first = reports.run(write_config(config, SCENARIOS), **kwargs)
+    assert sorted(first['rendered']) == ['large', 'small'] and not first['failed']
+    assert (tmp_path / 'reports' / 'small.html').exists()
+
+    second = reports.run(str(config), **kwargs)
+    assert second['rendered'] == [] and sorted(second['skipped']) == ['large', 'small']
+
+    changed = [SCENARIOS[0], dict(SCENARIOS[1], interest_rate=0.05)]
+    third = reports.run(write_config(config, changed), **kwargs)
+    assert third['rendered'] == ['large'] and third['skipped'] == ['small']
+
+    forced = reports.run(str(config), force=True, **kwargs)
+    assert sorted(forced['rendered']) == ['large', 'small']
+
+
+def test_deleted_report_is_rendered_again(tmp_path):
+    config = write_config(tmp_path / 'reports.json', SCENARIOS[:1])
+    kwargs = dict(output_dir=str(tmp_path / 'reports'), max_workers=0, cache_dir=str(tmp_path / 'cache'), out=None)
+    reports.run(config, **kwargs)
+    (tmp_path / 'reports' / 'small.html').unlink()
+    assert reports.run(config, **kwargs)['rendered'] == ['small']
+
+
+def test_html_is_escaped(tmp_path):
+    section = reports.Section('Rent < Total & more', pd.DataFrame({'date': [1, 2], 'a': [1.0, 2.0]}), 'date', ['a'])
+    path = tmp_path / 'report.html'
+    reports.render_html('Price <b>$1</b>', [section], str(path))
+    text = path.read_text()
+    assert '<b>' not in text
+    assert 'Price &lt;b&gt;$1&lt;/b&gt;' in text
+    assert '<h2>Rent &lt; Total &amp; more</h2>' in text
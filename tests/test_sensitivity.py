@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.housing.sensitivity import OUTPUTS, SensitivityAnalysis
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+
+START = datetime.date(2020, 1, 1)
+MONTHS = [59, 119, 359]
+
+
+@pytest.fixture
+def analysis():
+    home = SimpleHome(300000, SimpleFixedRateMortgage(0.04, 300000, 0.2, START, 360))
+    return SensitivityAnalysis(home, months=MONTHS)
+
+
+def test_partial_effects_are_central_differences(analysis):
+    params, effects = analysis.partial_effects(['interest_rate', 'appreciation_rate'], relative_step=0.01)
+    assert params == ['interest_rate', 'appreciation_rate']
+    for i, name in enumerate(params):
+        value = float(analysis.params[name])
+        step = value * 0.01
+        low = analysis.evaluate(**{name: value - step})
+        high = analysis.evaluate(**{name: value + step})
+        for output in OUTPUTS:
+            assert effects[output].shape == (2, len(MONTHS))
+            np.testing.assert_allclose(effects[output][i], (high[output] - low[output]) / (2 * step), rtol=1e-9)
+    # A higher rate costs more
+    assert (effects['total_cost'][0] > 0).all()
+
+
+def test_tornado_is_ordered_by_swing(analysis):
+    frame = analysis.tornado('net_position', month=119, ranges={'interest_rate': (0.03, 0.05)})
+    assert sorted(frame['param']) == sorted(analysis.params)
+    assert (np.diff(frame['swing']) <= 0).all()
+
+    row = frame.set_index('param').loc['interest_rate']
+    assert (row['low_value'], row['high_value']) == (0.03, 0.05)
+    assert row['low'] == pytest.approx(analysis.evaluate(interest_rate=0.03)['net_position'][1])
+    assert row['high'] == pytest.approx(analysis.evaluate(interest_rate=0.05)['net_position'][1])
+    assert row['swing'] == pytest.approx(abs(row['high'] - row['low']))
+
+    with pytest.raises(AssertionError):
+        analysis.tornado(month=60)
+
+
+def test_sweeps(analysis):
+    rates = np.linspace(0.03, 0.06, 4)
+    appreciation = np.array([0.0, 0.02, 0.04])
+    one_way = analysis.one_way('interest_rate', rates)['total_cost']
+    assert one_way.shape == (4, len(MONTHS))
+    np.testing.assert_allclose(one_way[2], analysis.evaluate(interest_rate=rates[2])['total_cost'])
+
+    two_way = analysis.two_way('interest_rate', rates, 'appreciation_rate', appreciation)['net_position']
+    assert two_way.shape == (4, 3, len(MONTHS))
+    np.testing.assert_allclose(
+        two_way[1, 2], analysis.evaluate(interest_rate=rates[1], appreciation_rate=appreciation[2])['net_position'])
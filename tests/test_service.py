@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from housing_sim.service import MAX_MONTHS, ScenarioService, ServiceClient, evaluate_batch, parse_scenario
+
+SCENARIO = {'purchase_price': 300000, 'interest_rate': 0.04, 'down_payment_pct': 0.2, 'start_date': '2020-01-01',
+            'base_rent': 1500, 'months': 120}
+
+
+def scenario(**fields):
+    return dict(SCENARIO, **fields)
+
+
+@pytest.mark.parametrize('fields', [
+    {'months': 12.7},
+    {'months': True},
+    {'months': '360'},
+    {'months': 0},
+    {'months': MAX_MONTHS + 1},
+    {'months_out': [1.5]},
+    {'months_out': [True]},
+    {'months_out': 5},
+    {'months_out': [120]},
+    {'interest_rate': float('nan')},
+    {'interest_rate': float('inf')},
+    {'interest_rate': False},
+    {'base_rent': '1500'},
+])
+def test_parse_scenario_rejects(fields):
+    with pytest.raises(ValueError):
+        parse_scenario(scenario(**fields))
+
+
+def test_parse_scenario_accepts_whole_floats():
+    parsed = parse_scenario(scenario(months=12.0, months_out=[0, 11.0]))
+    assert parsed.params['months'] == 12
+    assert parsed.months.tolist() == [0, 11]
+
+
+def test_failed_group_does_not_fail_others():
+    good = parse_scenario(scenario())
+    bad = parse_scenario(scenario(months=60))
+    bad.columns = ('not_a_column',)
+    results = evaluate_batch([good, bad, good])
+    assert isinstance(results[1], Exception)
+    assert results[0] == results[2]
+    assert set(results[0]) == {'total_direct', 'total_indirect', 'equity', 'total_rent'}
+
+
+def test_invalid_request_does_not_fail_its_batch():
+    async def run():
+        service = ScenarioService(port=0, batch_window=0.05)
+        await service.start()
+        clients = [ServiceClient(port=service.port) for _ in range(4)]
+        try:
+            payloads = [scenario(), scenario(months=360), scenario(months=10**12), scenario(interest_rate=0.05)]
+            return await asyncio.gather(*[
+                client.request('POST', '/evaluate', payload) for client, payload in zip(clients, payloads)
+            ])
+        finally:
+            for client in clients:
+                await client.close()
+            await service.close()
+
+    statuses = [status for status, _ in asyncio.run(run())]
+    assert statuses == [200, 200, 400, 200]
@@ -0,0 +1,104 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import housing_sim.cache
+from housing_sim import instrumentation
+from housing_sim.housing.apartment import Apartment
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.mortgage.fixed_rate import SimpleFixedRateMortgage
+from housing_sim.parameter import Parameter
+
+START = datetime.date(2020, 3, 1)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    previous = housing_sim.cache.get_default_cache()
+    housing_sim.cache.set_default_cache(housing_sim.cache.SimulationCache())
+    yield
+    housing_sim.cache.set_default_cache(previous)
+
+
+def make_home(**parameters):
+    home = SimpleHome(300000, SimpleFixedRateMortgage(0.04, 300000, 0.2, START, 120))
+    for name, value in parameters.items():
+        setattr(home, name, value)
+    return home
+
+
+@pytest.mark.parametrize('name, value, incremental', [
+    ('property_tax_rate', 0.015, True),
+    ('homeowners_insurance_rate', 0.005, True),
+    ('appreciation_rate', 0.035, True),
+    ('closing_cost_rate', 0.03, True),
+    ('purchase_price', 320000, False),
+])
+def test_changed_parameter_matches_a_fresh_home(name, value, incremental):
+    home = make_home()
+    home.get_data()
+    home.get_indirect_cost_data()
+
+    setattr(home, name, value)
+    with instrumentation.collect() as report:
+        data = home.get_data()
+        indirect = home.get_indirect_cost_data()
+    # The mortgage is never amortized again, and only the affected columns are recomputed when possible
+    assert 'mortgage.rows' not in report.counters
+    assert ('home.updated_columns' in report.counters) == incremental
+    assert ('home.rows' in report.counters) != incremental
+
+    housing_sim.cache.get_default_cache().clear()
+    fresh = make_home(**{name: value})
+    pd.testing.assert_frame_equal(data, fresh.get_data())
+    pd.testing.assert_frame_equal(indirect, fresh.get_indirect_cost_data())
+
+
+def test_several_changes_at_once():
+    home = make_home()
+    home.get_data()
+    home.property_tax_rate = 0.015
+    home.appreciation_rate = 0.01
+    housing_sim.cache.get_default_cache().clear()
+    pd.testing.assert_frame_equal(home.get_data(), make_home(property_tax_rate=0.015, appreciation_rate=0.01).get_data())
+
+
+def test_setting_the_same_value_keeps_the_schedule():
+    home = make_home()
+    schedule = home.get_schedule()
+    home.property_tax_rate = 0.02
+    assert home.get_schedule() is schedule
+
+
+def test_apartment_base_rent():
+    apartment = Apartment(1500, START, 120)
+    apartment.get_data()
+    apartment.base_rent = 1800
+    np.testing.assert_allclose(apartment.get_data()['total_rent'], Apartment(1800, START, 120).get_data()['total_rent'])
+
+
+class Model(object):
+    rate = Parameter()
+
+    def __init__(self, rate):
+        self.changed = []
+        self.rate = rate
+
+    def _parameter_changed(self, name):
+        self.changed.append(name)
+
+
+def test_array_parameters_count_as_changed():
+    rates = np.array([0.01, 0.02])
+    model = Model(rates)
+    assert model.changed == []
+    model.rate = rates
+    assert model.changed == []
+    # Equal values in another array still count as a change
+    model.rate = rates.copy()
+    assert model.changed == ['rate']
+    model.rate = 0.01
+    model.rate = 0.01
+    assert model.changed == ['rate', 'rate']
@@ -0,0 +1,88 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from housing_sim.housing.simple_home import SimpleHome
+from housing_sim.housing.strategy import StrategyOptimizer, _dominated_offers
+from housing_sim.mortgage.amortization import amortize
+from housing_sim.mortgage.fixed_rate import DownPayableFixedRateMortgage
+
+START = datetime.date(2020, 1, 1)
+MONTHS = 120
+
+
+def make_home(extra_payment=0):
+    mortgage = DownPayableFixedRateMortgage(0.04, 300000, 0.2, START, MONTHS, extra_payment=extra_payment)
+    return SimpleHome(300000, mortgage)
+
+
+def prepay(optimizer, extra):
+    principal, extra_principal, interest, _ = amortize(
+        optimizer.loan_amount, optimizer.interest_rate / 12, optimizer.payment, extra
+    )
+    return optimizer._outcomes(principal, extra_principal, interest, 0.0)
+
+
+@pytest.mark.parametrize('extra_month', [None, 0, 1, 30])
+def test_outcomes_match_simple_home(extra_month):
+    extra = np.zeros(MONTHS)
+    if extra_month is not None:
+        extra[extra_month] = 1000.0
+    home = make_home(extra)
+    schedule = home.get_schedule()
+    indirect = home.get_indirect_cost_schedule()
+    optimizer = StrategyOptimizer(home)
+    outcomes = prepay(optimizer, extra)
+
+    # SimpleHome leaves extra principal out of both its direct costs and its ownership, the optimizer counts both
+    extra_equity = schedule['home_value'][-1] * (1 - home.mortgage.down_payment_pct) * extra.sum() / optimizer.loan_amount
+    net_position = (schedule['home_value'][-1] * schedule['home_ownership_pct'][-1] - schedule['total_direct'][-1]
+                    - schedule['total_indirect'][-1] + extra_equity - extra.sum())
+
+    assert outcomes['total_interest'] == pytest.approx(indirect['interest'].sum())
+    assert outcomes['net_position'] == pytest.approx(net_position)
+
+
+def test_first_month_prepayment_is_not_free():
+    optimizer = StrategyOptimizer(make_home())
+    first, second = np.zeros(MONTHS), np.zeros(MONTHS)
+    first[0] = second[1] = 1000.0
+    # Paying a month earlier only saves that month's interest on the prepayment
+    gained = prepay(optimizer, first)['net_position'] - prepay(optimizer, second)['net_position']
+    assert 0 < gained < 1000.0 * 0.04
+
+
+def test_pruned_prepayment_search_matches_brute_force():
+    optimizer = StrategyOptimizer(make_home(), investment_return=0.02)
+    kwargs = dict(budget=500, amounts=[0, 250, 500], starts=[0, 12, 60], stops=[24, 60, MONTHS])
+    for objective in ('net_position', 'total_interest'):
+        result = optimizer.search_prepayments(objective=objective, **kwargs)
+        assert result.pruned > 0
+
+        best = None
+        for amount in kwargs['amounts']:
+            for start in kwargs['starts']:
+                for stop in kwargs['stops']:
+                    extra = np.where((np.arange(MONTHS) >= start) & (np.arange(MONTHS) < stop), float(amount), 0.0)
+                    principal, extra_principal, interest, _ = amortize(
+                        optimizer.loan_amount, optimizer.interest_rate / 12, optimizer.payment, extra
+                    )
+                    score = float(optimizer._score(optimizer._outcomes(principal, extra_principal, interest, 500), objective))
+                    best = score if best is None else min(best, score)
+        assert float(optimizer._score(result.best.iloc[0], objective)) == pytest.approx(best)
+
+
+@pytest.mark.parametrize('by_rate', [True, False])
+def test_dominated_offers(by_rate):
+    rng = np.random.default_rng(0)
+    rate = rng.choice([0.03, 0.035, 0.04], 40)
+    closing_cost = rng.choice([0.0, 0.01, 0.02], 40)
+    term = rng.choice([0, 180, 360], 40)
+    expected = [
+        any(term[j] == term[i] and (rate[j] <= rate[i] if by_rate else rate[j] == rate[i]) and
+            closing_cost[j] <= closing_cost[i] and (rate[j] < rate[i] or closing_cost[j] < closing_cost[i])
+            for j in range(len(rate)))
+        for i in range(len(rate))
+    ]
+    np.testing.assert_array_equal(_dominated_offers(rate, closing_cost, term, by_rate), expected)
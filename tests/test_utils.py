@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import data_store
+import utils
+
+
+class StubError(Exception):
+    """
+    Stands in for quandl's errors, which carry the response's http_status
+    """
+
+    def __init__(self, http_status):
+        super(StubError, self).__init__("HTTP {}".format(http_status))
+        self.http_status = http_status
+
+
+class StubFetch(object):
+    """
+    Local stand-in for quandl.get that raises {errors} in order, then returns a small series
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, code, *args, **kwargs):
+        with self.lock:
+            self.calls.append(code)
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return pd.DataFrame({'Value': [1.0, 2.0, 3.0]},
+                            index=pd.DatetimeIndex(['2020-01-31', '2020-02-29', '2020-03-31'], name='Date'))
+
+
+@pytest.fixture(autouse=True)
+def series_store(tmp_path):
+    store = data_store.SeriesStore(str(tmp_path / 'quandl.sqlite'))
+    previous = utils.set_series_store(store)
+    yield store
+    utils.set_series_store(previous)
+    store.close()
+
+
+def test_server_error_is_retried():
+    fetch = StubFetch(StubError(503))
+    report = utils.bulk_quandl_get(['ZILLOW/M1_ZHVISF'], retries=2, backoff=0, fetch=fetch)
+    assert report.ok
+    assert report.attempts == {'ZILLOW/M1_ZHVISF': 2}
+    assert list(report.results['ZILLOW/M1_ZHVISF']['Value']) == [1.0, 2.0, 3.0]
+
+
+def test_client_error_is_not_retried():
+    fetch = StubFetch(StubError(404))
+    report = utils.bulk_quandl_get(['ZILLOW/M1_ZHVISF'], retries=2, backoff=0, fetch=fetch)
+    assert report.attempts == {'ZILLOW/M1_ZHVISF': 1}
+    assert report.failures['ZILLOW/M1_ZHVISF'].http_status == 404
+    assert len(fetch.calls) == 1
+
+
+def test_connection_error_is_retried_then_reported():
+    fetch = StubFetch(*[ConnectionError("connection reset")] * 3)
+    report = utils.bulk_quandl_get(['ZILLOW/M1_ZHVISF'], retries=2, backoff=0, fetch=fetch)
+    assert not report.ok
+    assert report.attempts == {'ZILLOW/M1_ZHVISF': 3}
+    assert isinstance(report.failures['ZILLOW/M1_ZHVISF'], ConnectionError)
+
+
+def test_concurrent_callers_share_one_fetch():
+    release = threading.Event()
+    fetch = StubFetch()
+
+    def slow_fetch(*args, **kwargs):
+        release.wait(5)
+        return fetch(*args, **kwargs)
+
+    reports = []
+    callers = [
+        threading.Thread(target=lambda: reports.append(
+            utils.bulk_quandl_get(['ZILLOW/M1_ZHVISF'] * 2, refresh='always', fetch=slow_fetch)
+        )) for _ in range(3)
+    ]
+    for caller in callers:
+        caller.start()
+    # Let every caller find the download in flight before it finishes
+    time.sleep(0.2)
+    release.set()
+    for caller in callers:
+        caller.join()
+
+    assert fetch.calls == ['ZILLOW/M1_ZHVISF']
+    assert all(report.ok for report in reports)
+
+
+def test_different_fetch_functions_dont_share_a_fetch():
+    release = threading.Event()
+    slow = StubFetch()
+    fast = StubFetch()
+
+    def slow_fetch(*args, **kwargs):
+        release.wait(5)
+        return slow(*args, **kwargs)
+
+    caller = threading.Thread(target=lambda: utils.bulk_quandl_get(['ZILLOW/M1_ZHVISF'], refresh='always', fetch=slow_fetch))
+    caller.start()
+    time.sleep(0.2)
+    try:
+        report = utils.bulk_quandl_get(['ZILLOW/M1_ZHVISF'], refresh='always', fetch=fast)
+    finally:
+        release.set()
+        caller.join()
+
+    assert report.ok
+    assert fast.calls == ['ZILLOW/M1_ZHVISF']
+    assert slow.calls == ['ZILLOW/M1_ZHVISF']
+
+
+def test_compare_areas_failure_table():
+    def fetch(code, *args, **kwargs):
+        if code == 'ZILLOW/M2_ZHVISF':
+            raise StubError(404)
+        return StubFetch()(code)
+
+    data, report = utils.compare_areas({'Austin': 1, 'Nowhere': 2}, 'M', 'ZHVISF', retries=1, return_report=True,
+                                       fetch=fetch)
+    assert list(data.columns) == ['Austin']
+    assert report.summary() == "1 fetched, 1 failed"
+    table = report.failure_table()
+    assert table.to_dict('records') == [
+        {'code': 'ZILLOW/M2_ZHVISF', 'attempts': 1, 'error': 'StubError', 'message': 'HTTP 404'}
+    ]
@@ -1,10 +1,32 @@
+import hashlib
 import os
-import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-import quandl
 import constants
-quandl.ApiConfig.api_key = constants.QUANDL_API_KEY
+import data_store
+from housing_sim import instrumentation
+from housing_sim.panel import Panel
+from housing_sim.utils import fit_to_array # moved to housing_sim.utils, still importable from here
+
+def get_quandl():
+    """
+    The quandl client, imported on first use so that importing this module needs neither quandl nor an API key.
+    The API key is read from constants when the first request is made, unless one was already set
+    """
+    import quandl
+    if quandl.ApiConfig.api_key is None:
+        quandl.ApiConfig.api_key = constants.get_quandl_api_key()
+    return quandl
+
+def quandl_get(*args, **kwargs):
+    """
+    quandl.get through the lazily imported client
+    """
+    return get_quandl().get(*args, **kwargs)
 
 def get_quandl_code(area_category, area_code, indicator_code):
     return "ZILLOW/{area_category}{area_code}_{indicator_code}".format(
@@ -13,68 +35,292 @@ def get_quandl_code(area_category, area_code, indicator_code):
         indicator_code=indicator_code
     )
 
-def _cached_quandl_filename(quandl_code, method, *args, **kwargs):
-    quandl_code_component = quandl_code.replace('/','_')
+def _quandl_variant(*args, **kwargs):
+    """
+    Canonical string for the arguments that change what Quandl returns, other than the date range
+    """
     args_component = "_".join(str(arg) for arg in args)
-    kwarg_key_order = sorted(kwargs.keys())
-    kwarg_data = []
-    for key in kwarg_key_order:
-        kwarg_str = "{}_{}".format(key, kwargs[key])
-        kwarg_data.append(kwarg_str)
-    kwargs_component = "__".join(kwarg_data)
-
-    filename_format = "{method}_{quandl_code}__{args}__{kwargs}.pickle"
-    filename = filename_format.format(
-        method=method,
-        quandl_code=quandl_code_component,
-        args=args_component,
-        kwargs=kwargs_component
-    )
-    return os.path.join(constants.DATA_DIR, filename)
-
-def cached_quandl_get(quandl_code, *args, **kwargs):
-    # generate file name
-    filename = _cached_quandl_filename(quandl_code, 'GET', *args, **kwargs)
-    # read file if it exists
-    if (os.path.exists(filename)):
-        return pd.read_pickle(filename)
-    # fetch data
-    data = quandl.get(quandl_code, *args, **kwargs)
-    # save data
-    data.to_pickle(filename)
+    kwargs_component = "__".join("{}_{}".format(key, kwargs[key]) for key in sorted(kwargs.keys()))
+    return "{}__{}".format(args_component, kwargs_component)
+
+_series_store = None
+_series_store_lock = threading.Lock()
+
+def get_series_store():
+    """
+    The local store shared by all cached Quandl requests. Opened once, even when first used from several threads.
+    Series that haven't been refreshed in constants.QUANDL_CACHE_EXPIRE_DAYS are deleted when it's opened
+    """
+    global _series_store
+    with _series_store_lock:
+        if _series_store is None:
+            path = os.path.join(constants.DATA_DIR, constants.QUANDL_STORE_FILENAME)
+            _series_store = data_store.SeriesStore(path, max_age_days=constants.QUANDL_CACHE_MAX_AGE_DAYS)
+            if constants.QUANDL_CACHE_EXPIRE_DAYS is not None:
+                _series_store.expire(constants.QUANDL_CACHE_EXPIRE_DAYS)
+        return _series_store
+
+def set_series_store(store):
+    """
+    Replace the local store shared by all cached Quandl requests, e.g. with one at another path
+
+    Returns: the store that was replaced, or None if none was opened yet
+    """
+    global _series_store
+    with _series_store_lock:
+        previous, _series_store = _series_store, store
+    return previous
+
+def cached_quandl_get(quandl_code, *args, refresh=None, fetch=None, **kwargs):
+    """
+    quandl.get, answered from the local store whenever the requested date range has already been downloaded.
+    Only the parts of the range that aren't stored yet are fetched.
+
+    refresh: 'never', 'if_stale' or 'always' - when to fetch observations newer than the last stored date and
+        append them to the store. Defaults to constants.QUANDL_REFRESH_POLICY
+    fetch: stand-in for quandl.get with the same signature, e.g. a local stub for offline use
+    """
+    refresh = refresh or constants.QUANDL_REFRESH_POLICY
+    fetch = fetch or quandl_get
+    start_date = kwargs.pop('start_date', None)
+    end_date = kwargs.pop('end_date', None)
+    variant = _quandl_variant(*args, **kwargs)
+    store = get_series_store()
+
+    # fetch and save whatever isn't stored yet
+    missing_ranges = store.missing_ranges(quandl_code, start_date, end_date, variant, refresh)
+    instrumentation.count('quandl.store_misses' if missing_ranges else 'quandl.store_hits')
+    for missing_start, missing_end in missing_ranges:
+        with instrumentation.span('quandl.fetch'):
+            data = fetch(
+                quandl_code, *args,
+                start_date=None if missing_start == data_store.OPEN_START else missing_start,
+                end_date=None if missing_end == data_store.OPEN_END else missing_end,
+                **kwargs
+            )
+        instrumentation.count('quandl.fetches')
+        instrumentation.count('quandl.rows_written', len(data))
+        with instrumentation.span('quandl.store_write'):
+            store.write(quandl_code, data, missing_start, missing_end, variant)
+
     # return data
+    with instrumentation.span('quandl.store_read'):
+        data = store.read(quandl_code, start_date, end_date, variant)
+    instrumentation.count('quandl.rows_read', len(data))
+    if instrumentation.enabled():
+        instrumentation.count('quandl.bytes_read', int(data.memory_usage(index=True).sum()))
     return data
 
-def compare_areas(areas, area_category_code, indicator_code, args_iterable=(), kwargs_iterable={}):
-    dataframes = []
-    for area_name, area_code in areas.items():
-        code = get_quandl_code(area_category_code, area_code, indicator_code)
+class FetchReport(object):
+    """
+    Outcome of a bulk fetch
+
+    Attributes:
+        results (dict): code -> DataFrame for every code that was fetched
+        failures (dict): code -> the last exception raised for every code that could not be fetched
+        attempts (dict): code -> number of attempts made
+    """
+    def __init__(self):
+        self.results = {}
+        self.failures = {}
+        self.attempts = {}
+
+    @property
+    def ok(self):
+        return not self.failures
+
+    def summary(self):
+        return "{} fetched, {} failed".format(len(self.results), len(self.failures))
+
+    def failure_table(self):
+        """
+        DataFrame with one row per failed code: the code, number of attempts, error type and message
+        """
+        return pd.DataFrame(
+            [(code, self.attempts[code], type(error).__name__, str(error)) for code, error in self.failures.items()],
+            columns=['code', 'attempts', 'error', 'message']
+        )
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def _is_retryable(error):
+    """
+    Only retry rate limits, server errors and network errors. Client errors (e.g. an unknown code) and programming
+    errors (e.g. a TypeError) will fail again.
+
+    Quandl's errors carry the response's http_status. Network errors are OSErrors, which includes ConnectionError,
+    timeouts and the requests library's exceptions
+    """
+    status = getattr(error, 'http_status', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, OSError)
+
+def _fetch_with_retry(code, args, kwargs, retries, backoff, refresh, fetch):
+    """
+    cached_quandl_get with exponential backoff.
+
+    Returns: (data or None, exception or None, number of attempts)
+    """
+    for attempt in range(1, retries + 2):
         try:
-            data = cached_quandl_get(code, *args_iterable, **kwargs_iterable)
-            data = data.rename(columns={'Value': area_name})
-            dataframes.append(data)
-        except Exception:
-            print('unable to fetch {}|{}'.format(area_name, area_code))
-    return pd.concat(dataframes, axis=1)
+            return cached_quandl_get(code, *args, refresh=refresh, fetch=fetch, **kwargs), None, attempt
+        except Exception as error:
+            if attempt > retries or not _is_retryable(error):
+                return None, error, attempt
+            time.sleep(backoff * 2 ** (attempt - 1) * (1 + random.random()))
+
+def bulk_quandl_get(codes, args_iterable=(), kwargs_iterable={}, max_workers=8, retries=3, backoff=0.5, refresh=None, fetch=None):
+    """
+    Fetch many Quandl codes concurrently through cached_quandl_get
+
+    Codes that are already being fetched with the same arguments and fetch function, by this call or by another
+    thread, share that download instead of starting a second one.
+
+    Args:
+        codes (iterable of str): the Quandl codes
+        args_iterable, kwargs_iterable: extra arguments for every request, e.g. {'start_date': ..., 'end_date': ...}
+        max_workers (int): maximum number of concurrent requests
+        retries (int): how many times to retry a failed request
+        backoff (float): seconds to wait before the first retry, doubling on every retry
+        refresh, fetch: see cached_quandl_get
+
+    Returns: FetchReport
+    """
+    request_key = (_quandl_variant(*args_iterable, refresh=refresh, **kwargs_iterable), fetch or quandl_get)
+    report = FetchReport()
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for code in dict.fromkeys(codes):
+            key = (code, request_key)
+            with _in_flight_lock:
+                future = _in_flight.get(key)
+                if future is None:
+                    future = pool.submit(_fetch_with_retry, code, args_iterable, kwargs_iterable, retries, backoff, refresh, fetch)
+                    _in_flight[key] = future
+                    future.add_done_callback(lambda _, key=key: _in_flight.pop(key, None))
+            futures[code] = future
+
+        for code, future in futures.items():
+            data, error, attempts = future.result()
+            report.attempts[code] = attempts
+            if error is None:
+                report.results[code] = data
+            else:
+                report.failures[code] = error
+    return report
+
+def compare_areas(areas, area_category_code, indicator_code, args_iterable=(), kwargs_iterable={},
+                  max_workers=8, retries=3, refresh=None, return_report=False, fetch=None):
+    """
+    One column per area for a single indicator, fetched concurrently
+
+    Args:
+        areas (dict or iterable): area name -> area code, or just area codes to use the codes as column names
+        area_category_code (str): e.g. constants.AREA_METRO
+        indicator_code (str): e.g. 'ZHVISF'
+        args_iterable, kwargs_iterable: extra arguments for every request, e.g. {'start_date': ..., 'end_date': ...}
+        max_workers, retries, refresh, fetch: see bulk_quandl_get
+        return_report (bool): also return the FetchReport instead of printing failures
+
+    Returns: DataFrame, or (DataFrame, FetchReport) if return_report
+    """
+    if not isinstance(areas, dict):
+        areas = {area: area for area in areas}
+    codes = {area_name: get_quandl_code(area_category_code, area_code, indicator_code) for area_name, area_code in areas.items()}
+    report = bulk_quandl_get(codes.values(), args_iterable, kwargs_iterable, max_workers=max_workers, retries=retries,
+                             refresh=refresh, fetch=fetch)
 
-def fit_to_array(single_or_iterable, desired_length):
+    dataframes = [
+        report.results[code].rename(columns={'Value': area_name})
+        for area_name, code in codes.items() if code in report.results
+    ]
+    data = pd.concat(dataframes, axis=1) if dataframes else pd.DataFrame()
+    if return_report:
+        return data, report
+    for code, error in report.failures.items():
+        print('unable to fetch {}: {}'.format(code, error))
+    return data
+
+def load_panel(areas, area_category_code, indicator_codes, start_date=None, end_date=None, dtype=np.float64,
+               mmap=False, max_workers=8, retries=3, refresh=None, fetch=None):
     """
-    Get a numpy array of the desired length by repeating/truncating either a single item or iterable of items
+    Load every area x indicator series into a single housing_sim.panel.Panel
 
-    Examples:
-        >> fit_to_array(0, 4)
-        np.array([0,0,0,0])
+    Series are fetched concurrently and written straight into a preallocated cube, without concatenating DataFrames.
 
-        >> fit_to_array([1,2,3], 7)
-        np.array([1,2,3,1,2,3,1])
+    Args:
+        areas (dict or iterable): area name -> area code, or just area codes to use the codes as labels
+        area_category_code (str): e.g. constants.AREA_ZIPCODE
+        indicator_codes (iterable of str): e.g. ['ZHVISF', 'MRP1B']
+        start_date, end_date: date range
+        dtype: value dtype, e.g. np.float32 to halve memory for very large panels
+        mmap (bool): save the panel under DATA_DIR and return it memory-mapped. A later call with the same
+            arguments maps the saved panel without fetching anything, as long as none of its series would be fetched
+            under {refresh} and none of them changed in the store since. Panels with failed series aren't saved
+        max_workers, retries, refresh, fetch: see bulk_quandl_get
+
+    Returns: Panel, with failed series left as NaN. Areas with no data for any indicator are dropped
     """
-    if not hasattr(single_or_iterable, '__iter__'):
-        arr = np.array([single_or_iterable])
-    else:
-        arr = np.array(single_or_iterable)
+    if not isinstance(areas, dict):
+        areas = {area: area for area in areas}
+    indicator_codes = list(indicator_codes)
+
+    codes = {
+        (area_name, indicator): get_quandl_code(area_category_code, area_code, indicator)
+        for area_name, area_code in areas.items() for indicator in indicator_codes
+    }
 
-    if len(arr) < desired_length:
-        numberOfTilesNeeded = math.ceil(desired_length / float(len(arr)))
-        arr = np.tile(arr, numberOfTilesNeeded)
+    if mmap:
+        request = _quandl_variant(area_category_code, sorted(areas.items()), indicator_codes,
+                                  start_date=start_date, end_date=end_date, dtype=np.dtype(dtype).name)
+        request_hash = hashlib.sha256(request.encode()).hexdigest()
+        store = get_series_store()
+        up_to_date = not any(
+            store.missing_ranges(code, start_date, end_date, _quandl_variant(), refresh or constants.QUANDL_REFRESH_POLICY)
+            for code in codes.values()
+        )
+        if up_to_date:
+            path = _panel_path(request_hash, store, codes.values())
+            if Panel.exists(path):
+                return Panel.load(path, mmap=True)
+    kwargs_iterable = {'start_date': start_date, 'end_date': end_date}
+    report = bulk_quandl_get(codes.values(), kwargs_iterable=kwargs_iterable, max_workers=max_workers,
+                             retries=retries, refresh=refresh, fetch=fetch)
 
-    return arr[:desired_length]
+    fetched = {key: report.results[code] for key, code in codes.items() if code in report.results}
+    area_names = [area_name for area_name in areas if any((area_name, indicator) in fetched for indicator in indicator_codes)]
+    dates = np.unique(np.concatenate(
+        [data.index.values.astype('datetime64[D]') for data in fetched.values()] or [np.array([], dtype='datetime64[D]')]
+    ))
+    panel = Panel.empty(area_names, indicator_codes, dates, dtype)
+    for (area_name, indicator), data in fetched.items():
+        panel.set_series(area_name, indicator, data.index.values, data['Value'].to_numpy())
+
+    if mmap and report.ok:
+        path = _panel_path(request_hash, get_series_store(), codes.values())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        panel.save(path)
+        _remove_panels(request_hash, keep=path)
+        return Panel.load(path, mmap=True)
+    return panel
+
+def _panel_path(request_hash, store, codes):
+    """
+    Where the panel of a request is saved. The name includes the store's coverage of every series, i.e. the
+    range stored and when it was last refreshed, so a panel is rebuilt once any of its series changes
+    """
+    stamps = [store.coverage(code, _quandl_variant()) for code in sorted(codes)]
+    stamp_hash = hashlib.sha256(repr(stamps).encode()).hexdigest()[:16]
+    return os.path.join(constants.DATA_DIR, 'panels', '{}_{}'.format(request_hash, stamp_hash))
+
+def _remove_panels(request_hash, keep):
+    """
+    Remove the outdated panels of a request. Panels already memory-mapped stay readable until they are closed
+    """
+    directory = os.path.dirname(keep)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, os.path.splitext(name)[0])
+        if name.startswith(request_hash + '_') and path != keep:
+            os.remove(os.path.join(directory, name))